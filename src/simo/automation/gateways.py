@@ -7,6 +7,7 @@ import pytz
 import json
 import time
 import multiprocessing
+import multiprocessing.connection
 import threading
 from django.conf import settings
 from django.utils import timezone
@@ -27,7 +28,8 @@ from simo.core.events import (
 from simo.core.loggers import get_gw_logger, get_component_logger
 from simo.core.service_suspension import is_service_suspended
 from simo.users.models import InstanceUser
-from .helpers import haversine_distance
+from .helpers import Geofence
+from .script_host import ScriptHostManager, is_hosted_script
 from simo.core.utils.mqtt import connect_with_retry, install_reconnect_handler
 
 
@@ -64,6 +66,9 @@ class ScriptRunHandler(multiprocessing.Process):
 
     def run(self):
         db_connection.connect()
+        self.run_script()
+
+    def run_script(self):
         self.component = Component.objects.get(id=self.component_id)
         tz = pytz.timezone(self.component.zone.instance.timezone)
         timezone.activate(tz)
@@ -150,6 +155,129 @@ class ScriptRunHandler(multiprocessing.Process):
 
 
 
+class WarmScriptRunHandler(ScriptRunHandler):
+    '''
+      Script process forked in advance. It connects to the database and
+      loads everything scripts usually need, then waits until it is
+      claimed to run a particular script. Every worker runs a single
+      script and exits afterwards, exactly like ScriptRunHandler does.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(None, multiprocessing.Event(), *args, **kwargs)
+        self.parent_pid = os.getpid()
+        self._claims, self._claim_sender = multiprocessing.Pipe(duplex=False)
+        # Seconds from claim until script code is about to be run
+        self.handoff_time = multiprocessing.Value('d', -1.0)
+
+    def claim(self, component_id):
+        self.component_id = component_id
+        self._claim_sender.send((component_id, time.time()))
+
+    def warm_up(self):
+        from django.contrib.contenttypes.models import ContentType
+        from . import controllers
+
+        db_connection.connect()
+        ContentType.objects.get_for_model(Component)
+
+    def run(self):
+        self.warm_up()
+        while not self._claims.poll(1):
+            if os.getppid() != self.parent_pid:
+                return
+        self.component_id, self.claimed_at = self._claims.recv()
+        if not db_connection.is_usable():
+            db_connection.close()
+            db_connection.connect()
+        self.run_script()
+
+    def run_code(self):
+        self.handoff_time.value = time.time() - self.claimed_at
+        self.logger.log(
+            logging.DEBUG,
+            f"Warm start, handoff took {self.handoff_time.value * 1000:.1f}ms"
+        )
+        return super().run_code()
+
+
+class WarmScriptPool:
+    '''
+      Keeps a few WarmScriptRunHandler processes ready to be claimed.
+      Claimed workers are replaced by a single long-lived refill thread
+      once refill() is called, which claimers do after releasing
+      their locks.
+    '''
+
+    def __init__(self, size):
+        self.size = size
+        self.started = False
+        self._lock = threading.Lock()
+        self._idle = []
+        self._refill = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = True
+        self.fill()
+        self._thread = threading.Thread(
+            target=self._run, name='warm-script-pool', daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while self.started:
+            self._refill.wait()
+            self._refill.clear()
+            if not self.started:
+                return
+            try:
+                self.fill()
+            except Exception:
+                print(traceback.format_exc(), file=sys.stderr)
+
+    def fill(self):
+        with self._lock:
+            self._idle = [w for w in self._idle if w.is_alive()]
+            while len(self._idle) < self.size:
+                worker = WarmScriptRunHandler(daemon=True)
+                worker.start()
+                self._idle.append(worker)
+
+    def refill(self):
+        if self.started:
+            self._refill.set()
+
+    def claim(self, component_id):
+        '''
+        Call refill() once no locks are held anymore to replace it.
+        :return: claimed worker or None if there is no warm worker available
+        '''
+        if not self.started or not self.size:
+            return
+        worker = None
+        with self._lock:
+            while self._idle:
+                candidate = self._idle.pop(0)
+                if candidate.is_alive():
+                    worker = candidate
+                    break
+        if worker:
+            worker.claim(component_id)
+        return worker
+
+    def shutdown(self):
+        self.started = False
+        self._refill.set()
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            try:
+                worker.kill()
+            except Exception:
+                pass
+
+
 class GatesHandler:
     '''
       Handles automatic gates openning
@@ -161,6 +289,9 @@ class GatesHandler:
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.gate_iusers = {}
+        self.geofences = {}
+        self._geofences_lock = threading.RLock()
+        self._geofence_events_subscribed = False
 
     def _log(self, level, message):
         logger = getattr(self, 'logger', None)
@@ -178,119 +309,164 @@ class GatesHandler:
     def _log_debug(self, message):
         self._log(logging.DEBUG, message)
 
-    def _is_out_of_geofence(self, gate, location):
+    def build_geofences(self):
         '''
-        Returns True if given location is out of geofencing zone
+        Precompute geofences of auto opening gates and person roles
+        allowed to use them, grouped by instance uid.
         '''
-
-        auto_open_distance = gate.config.get('auto_open_distance')
-        if not auto_open_distance:
-            return False
-        auto_open_distance = input_to_meters(auto_open_distance)
-
-        gate_location = gate.config.get('location')
-        try:
-            distance_meters = haversine_distance(
-                gate_location,
-                location, units_of_measure='metric'
-            )
-        except:
-            gate_location = gate.zone.instance.location
+        from simo.users.models import PermissionsRole
+        drop_current_instance()
+        geofences = {}
+        for gate in Component.objects.filter(base_type='gate').select_related(
+            'zone__instance', 'gateway'
+        ):
+            if not gate.config.get('auto_open_distance'):
+                continue
             try:
-                distance_meters = haversine_distance(
-                    gate_location,
-                    location, units_of_measure='metric'
-                )
-            except:
+                radius = input_to_meters(gate.config['auto_open_distance'])
+            except Exception:
+                self._log_warning(f"Bad auto open distance of {gate}!")
+                continue
+            geofence = None
+            for location in (
+                gate.config.get('location'), gate.zone.instance.location
+            ):
+                try:
+                    geofence = Geofence(
+                        location, radius, self.GEOFENCE_CROSS_ZONE
+                    )
+                except Exception:
+                    continue
+                break
+            if not geofence:
                 self._log_warning(f"Bad location of {gate}!")
-                return False
-        self._log_info(f"Distance from {gate} : {distance_meters}m")
-        return distance_meters > (
-            auto_open_distance + self.GEOFENCE_CROSS_ZONE
-        )
+                continue
+            geofence.gate = gate
+            geofence.auto_open_for = set(gate.config.get('auto_open_for') or [])
+            if gate.zone.instance.uid not in geofences:
+                geofences[gate.zone.instance.uid] = {
+                    'gates': [], 'person_roles': set()
+                }
+            geofences[gate.zone.instance.uid]['gates'].append(geofence)
+
+        for instance_uid, role_id in PermissionsRole.objects.filter(
+            instance__uid__in=list(geofences), is_person=True
+        ).values_list('instance__uid', 'id'):
+            geofences[instance_uid]['person_roles'].add(role_id)
+
+        with self._geofences_lock:
+            self.geofences = geofences
+            gate_ids = {
+                geofence.gate.id for instance in geofences.values()
+                for geofence in instance['gates']
+            }
+            for gate_id in list(self.gate_iusers):
+                if gate_id not in gate_ids:
+                    self.gate_iusers.pop(gate_id)
 
-    def _is_in_geofence(self, gate, location):
+    def check_gates(self, instance_uid, iuser_id, role_id, location,
+                    speed_kmh=0, initial=False):
         '''
-        Returns True if given location is within geofencing zone
+        Evaluate new location of a user against geofences of gates.
+        Makes no DB reads.
+        :param initial: only start tracking user on gates where it is not
+        tracked yet.
         '''
-        auto_open_distance = gate.config.get('auto_open_distance')
-        if not auto_open_distance:
-            return False
-        auto_open_distance = input_to_meters(auto_open_distance)
-        gate_location = gate.config.get('location')
-        try:
-            distance_meters = haversine_distance(
-                gate_location,
-                location, units_of_measure='metric'
-            )
-        except:
-            gate_location = gate.zone.instance.location
+        instance = self.geofences.get(instance_uid)
+        if not instance or role_id not in instance['person_roles']:
+            return
+        for geofence in instance['gates']:
+            if geofence.auto_open_for and role_id not in geofence.auto_open_for:
+                continue
             try:
-                distance_meters = haversine_distance(
-                    gate_location,
-                    location, units_of_measure='metric'
+                distance = geofence.distance(location)
+            except Exception:
+                self._log_warning(f"Bad location of user {iuser_id}!")
+                return
+            is_out = distance is None or \
+                distance > geofence.radius + self.GEOFENCE_CROSS_ZONE
+            gate = geofence.gate
+            came_back = False
+            with self._geofences_lock:
+                tracked = self.gate_iusers.setdefault(gate.id, {})
+                if iuser_id not in tracked:
+                    tracked[iuser_id] = int(is_out)
+                    continue
+                if initial:
+                    continue
+                if tracked[iuser_id] > 4:
+                    # user was fully out, we must check if
+                    # he is now coming back and open the gate for him
+                    if distance is not None and distance <= geofence.radius:
+                        tracked[iuser_id] = 0
+                        came_back = True
+                elif is_out:
+                    tracked[iuser_id] += 1
+                    if tracked[iuser_id] > 4:
+                        self._log_info(
+                            f"User {iuser_id} is truly out of {gate}."
+                        )
+            if came_back:
+                self._log_info(
+                    f"User {iuser_id} is back in a geofence of {gate}!"
                 )
-            except:
-                self._log_warning(f"Bad location of {gate}!")
-                return False
+                if speed_kmh > 10:
+                    gate.open()
 
-        self._log_info(f"Distance from {gate} : {distance_meters}m")
-        return distance_meters <= auto_open_distance
+    def on_geofence_event(self, client, userdata, msg):
+        try:
+            _, _, instance_uid, model, obj_id = msg.topic.split('/')
+            obj_id = int(obj_id)
+            payload = json.loads(msg.payload)
+        except Exception:
+            return
+        if getattr(msg, 'retain', False):
+            return
 
-    def check_gates(self, iuser):
-        if not iuser.last_seen_location:
-            self._log_warning("User's last seen location is unknown")
+        if model == 'Component':
+            if 'config' not in (payload.get('dirty_fields') or {}):
+                return
+            instance = self.geofences.get(instance_uid) or {'gates': []}
+            if any(
+                geofence.gate.id == obj_id for geofence in instance['gates']
+            ) or Component.objects.filter(id=obj_id, base_type='gate').exists():
+                self.build_geofences()
             return
-        for gate_id, geofence_data in self.gate_iusers.items():
-            for iu_id, is_out in geofence_data.items():
-                if iu_id != iuser.id:
-                    continue
-                gate = Component.objects.get(id=gate_id)
-                if is_out > 4:
-                    self._log_info(
-                        f"{iuser.user.name} is out, let's see if we must open the gates for him"
-                    )
-                    # user was fully out, we must check if
-                    # he is now coming back and open the gate for him
-                    if self._is_in_geofence(gate, iuser.last_seen_location):
-                        self._log_info("Yes he is back in a geofence! Open THE GATEEE!!")
-                        self.gate_iusers[gate_id][iuser.id] = 0
-                        if iuser.last_seen_speed_kmh > 10:
-                            gate.open()
-                    else:
-                        self._log_info("No he is not back yet.")
-                else:
-                    self._log_info(f"Check if {iuser.user.name} is out.")
-                    if self._is_out_of_geofence(gate, iuser.last_seen_location):
-                        self.gate_iusers[gate_id][iuser.id] += 1
-                    if self.gate_iusers[gate_id][iuser.id] > 4:
-                        self._log_info(f"YES {iuser.user.name} is truly out!")
+
+        if not payload.get('is_active') or not payload.get('last_seen_location'):
+            return
+        try:
+            self.check_gates(
+                instance_uid, obj_id, payload.get('role'),
+                payload['last_seen_location'],
+                payload.get('last_seen_speed_kmh') or 0
+            )
+        except Exception:
+            self._log_warning(traceback.format_exc())
 
     def watch_gates(self):
-        drop_current_instance()
-        for gate in Component.objects.filter(base_type='gate').select_related(
-            'zone', 'zone__instance'
-        ):
-            if not gate.config.get('auto_open_distance'):
-                continue
-            # Track new users as they appear in the system
-            for iuser in InstanceUser.objects.filter(
-                is_active=True, instance=gate.zone.instance,
-                role__is_person=True
+        if not self._geofence_events_subscribed:
+            self._geofence_events_subscribed = True
+            from simo.core.mqtt_hub import get_mqtt_hub
+            hub = get_mqtt_hub()
+            for topic in (
+                'SIMO/obj-state/+/InstanceUser/+',
+                'SIMO/obj-state/+/Component/+',
             ):
-                if gate.config.get('auto_open_for'):
-                    if iuser.role.id not in gate.config['auto_open_for']:
-                        continue
-                if gate.id not in self.gate_iusers:
-                    self.gate_iusers[gate.id] = {}
-                if iuser.id not in self.gate_iusers[gate.id]:
-                    if iuser.last_seen_location:
-                        self.gate_iusers[gate.id][iuser.id] = 0
-                        if self._is_out_of_geofence(
-                            gate, iuser.last_seen_location
-                        ):
-                            self.gate_iusers[gate.id][iuser.id] += 1
-                    iuser.on_change(self.check_gates)
+                hub.subscribe(topic, self.on_geofence_event)
+
+        # Full refresh, picks up changes of roles and gates' instances
+        self.build_geofences()
+        # Track users as they appear in the system
+        for iuser_id, role_id, instance_uid, location in \
+        InstanceUser.objects.filter(
+            is_active=True, role__is_person=True,
+            instance__uid__in=list(self.geofences),
+            last_seen_location__isnull=False
+        ).values_list('id', 'role_id', 'instance__uid', 'last_seen_location'):
+            self.check_gates(
+                instance_uid, iuser_id, role_id, location, initial=True
+            )
 
 
 class AutomationsGatewayHandler(GatesHandler, BaseObjectCommandsGatewayHandler):
@@ -300,10 +476,19 @@ class AutomationsGatewayHandler(GatesHandler, BaseObjectCommandsGatewayHandler):
     info = "Provides various types of automation capabilities"
 
     running_scripts = None
+    # Script processes are supervised by exit notifications (see
+    # supervise_scripts), this is only a full reconciliation with DB.
     periodic_tasks = (
-        ('watch_scripts', 10),
+        ('watch_scripts', 60),
         ('watch_gates', 60)
     )
+    # Seconds to wait before reviving keep alive script that died
+    revive_delay = 5
+    # Longest delay between retries of failed script exit handling
+    exit_retry_max_delay = 60
+    # Pre-forked script processes kept ready to run scripts,
+    # settings.SIMO_SCRIPT_WARM_WORKERS overrides it
+    warm_script_workers = 2
 
     terminating_scripts = None
 
@@ -313,6 +498,17 @@ class AutomationsGatewayHandler(GatesHandler, BaseObjectCommandsGatewayHandler):
         self._scripts_lock = threading.RLock()
         self.running_scripts = {}
         self.terminating_scripts = set()
+        # {script id: (retry at, delay)} of exits that failed to be handled
+        self._exit_retries = {}
+        self.script_host = ScriptHostManager(on_exit=self.wake_supervisor)
+        self._supervisor_wakeup, self._supervisor_waker = \
+            multiprocessing.Pipe(duplex=False)
+        self._supervisor_woken = threading.Event()
+        self.script_pool = WarmScriptPool(
+            getattr(
+                settings, 'SIMO_SCRIPT_WARM_WORKERS', self.warm_script_workers
+            )
+        )
 
         if _virtual_scripts_managed_externally():
             # Do not run local script processes on virtual hubs.
@@ -414,13 +610,16 @@ class AutomationsGatewayHandler(GatesHandler, BaseObjectCommandsGatewayHandler):
         # This watchdog makes sure such scripts can't block keep-alive.
         startup_timeout = 60
 
+        components = Component.objects.in_bulk(
+            [id for id, data in running_snapshot]
+        )
         # observe running scripts and drop the ones that are no longer alive
         for id, data in running_snapshot:
             if time.time() - data['start_time'] < 5:
                 continue
             process = data['proc']
 
-            comp = Component.objects.filter(id=id).first()
+            comp = components.get(id)
             if comp and comp.value == 'finished':
                 if process.is_alive():
                     process.kill()
@@ -480,7 +679,8 @@ class AutomationsGatewayHandler(GatesHandler, BaseObjectCommandsGatewayHandler):
             return
 
         for comp in Component.objects.filter(
-            base_type='script', value__in=('stopped', 'finished', 'error')
+            base_type='script', value__in=('stopped', 'finished', 'error'),
+            meta__has_key='pid'
         ):
             pid = self._get_script_pid(comp)
             if not pid:
@@ -525,6 +725,133 @@ class AutomationsGatewayHandler(GatesHandler, BaseObjectCommandsGatewayHandler):
         ).exclude(value__in=('running', 'stopped', 'finished')):
             self.start_script(script)
 
+    def wake_supervisor(self, *args):
+        # one pending wake up is enough, never fill up the pipe
+        if self._supervisor_woken.is_set():
+            return
+        self._supervisor_woken.set()
+        try:
+            self._supervisor_waker.send(None)
+        except Exception:
+            pass
+
+    def supervise_scripts(self, exit):
+        '''
+        Sleeps until any of script processes exits (or new one is started)
+        and handles exited scripts immediately.
+        '''
+        while not exit.is_set():
+            with self._scripts_lock:
+                # Sentinel of exited process stays ready forever, so exits
+                # left to stop_script or waiting for a retry are not
+                # waited on, otherwise this would spin.
+                sentinels = {
+                    getattr(data['proc'], 'sentinel', None)
+                    for id, data in self.running_scripts.items()
+                    if id not in self.terminating_scripts
+                    and id not in self._exit_retries
+                }
+                timeout = 5
+                if self._exit_retries:
+                    timeout = min(timeout, max(0, min(
+                        at for at, delay in self._exit_retries.values()
+                    ) - time.time()))
+            waitables = [self._supervisor_wakeup] + [
+                sentinel for sentinel in sentinels if isinstance(sentinel, int)
+            ]
+            try:
+                ready = multiprocessing.connection.wait(
+                    waitables, timeout=timeout
+                )
+                if self._supervisor_wakeup in ready:
+                    while self._supervisor_wakeup.poll():
+                        self._supervisor_wakeup.recv()
+                    self._supervisor_woken.clear()
+                self.reap_scripts()
+            except Exception:
+                self.logger.error(
+                    "Scripts supervisor failure", exc_info=True
+                )
+                time.sleep(1)
+
+    def reap_scripts(self):
+        '''
+        Handle scripts which process is no longer alive
+        '''
+        drop_current_instance()
+        now = time.time()
+        with self._scripts_lock:
+            for id in list(self._exit_retries):
+                if id not in self.running_scripts:
+                    self._exit_retries.pop(id)
+            exited = [
+                id for id, data in self.running_scripts.items()
+                if id not in self.terminating_scripts
+                and self._exit_retries.get(id, (0, 0))[0] <= now
+                and not data['proc'].is_alive()
+            ]
+        for id in exited:
+            self._handle_script_exit(id)
+
+    def _handle_script_exit(self, id):
+        with self._scripts_lock:
+            data = self.running_scripts.get(id)
+            if not data or id in self.terminating_scripts:
+                return
+        # it has been observed that is_alive might sometimes report false
+        # however the process is actually still running
+        try:
+            data['proc'].kill()
+        except Exception:
+            pass
+        try:
+            comp = Component.objects.filter(id=id).first()
+            if comp and comp.value == 'running':
+                # script died without telling us anything
+                self.last_death = time.time()
+                tz = pytz.timezone(comp.zone.instance.timezone)
+                timezone.activate(tz)
+                logger = get_component_logger(comp)
+                logger.log(logging.INFO, "-------DEAD!-------")
+                comp.value = 'error'
+                comp.save()
+        except Exception:
+            # leave it tracked and retry later, backing off
+            with self._scripts_lock:
+                delay = min(
+                    self._exit_retries.get(id, (0, 0.5))[1] * 2,
+                    self.exit_retry_max_delay
+                )
+                self._exit_retries[id] = (time.time() + delay, delay)
+            self._log_warning(
+                f"Unable to handle exit of script {id}, "
+                f"retrying in {delay}s:\n{traceback.format_exc()}"
+            )
+            return
+        with self._scripts_lock:
+            self._exit_retries.pop(id, None)
+            if self.running_scripts.get(id) is data:
+                self.running_scripts.pop(id, None)
+        if comp and comp.value == 'error' and comp.config.get('keep_alive'):
+            timer = threading.Timer(
+                self.revive_delay, self._revive_script, args=(id,)
+            )
+            timer.daemon = True
+            timer.start()
+
+    def _revive_script(self, id):
+        drop_current_instance()
+        if self.exit.is_set() or is_service_suspended():
+            return
+        with self._scripts_lock:
+            if id in self.running_scripts:
+                return
+        comp = Component.objects.filter(
+            id=id, base_type='script', config__keep_alive=True
+        ).exclude(value__in=('running', 'stopped', 'finished')).first()
+        if comp:
+            self.start_script(comp)
+
     def run(self, exit):
         if _virtual_scripts_managed_externally():
             drop_current_instance()
@@ -577,6 +904,11 @@ class AutomationsGatewayHandler(GatesHandler, BaseObjectCommandsGatewayHandler):
         ):
             self.stop_script(component, stop_status='error')
 
+        self.script_pool.start()
+        threading.Thread(
+            target=self.supervise_scripts, args=(exit,), daemon=True
+        ).start()
+
         # Start scripts that are designed to be autostarted
         # as well as those that are designed to be kept alive, but
         # got terminated unexpectedly
@@ -594,6 +926,7 @@ class AutomationsGatewayHandler(GatesHandler, BaseObjectCommandsGatewayHandler):
             time.sleep(1)
         self.mqtt_client.loop_stop()
         self.mqtt_client.disconnect()
+        self.script_pool.shutdown()
 
         with self._scripts_lock:
             script_ids = list(self.running_scripts.keys())
@@ -672,13 +1005,21 @@ class AutomationsGatewayHandler(GatesHandler, BaseObjectCommandsGatewayHandler):
                     pass
                 self.running_scripts.pop(component.id, None)
 
-            process = ScriptRunHandler(
-                component.id, multiprocessing.Event(), daemon=True
-            )
-            process.start()
+            if is_hosted_script(component):
+                process = self.script_host.start_script(component.id)
+            else:
+                process = self.script_pool.claim(component.id)
+                if not process:
+                    process = ScriptRunHandler(
+                        component.id, multiprocessing.Event(), daemon=True
+                    )
+                    process.start()
             self.running_scripts[component.id] = {
                 'proc': process, 'start_time': time.time()
             }
+            self._exit_retries.pop(component.id, None)
+        self.script_pool.refill()
+        self.wake_supervisor()
 
 
     def stop_script(self, component, stop_status='stopped'):
@@ -111,6 +111,47 @@ def haversine_distance(location1, location2, units_of_measure='metric'):
     return distance
 
 
+class Geofence:
+    '''
+    Circle of radius meters around location together with a bounding
+    box of everything within radius + margin meters of it, so locations
+    which are obviously far away are told apart without any trigonometry.
+    '''
+    EARTH_RADIUS = 6371000
+
+    def __init__(self, location, radius, margin=0):
+        lat, lon = (float(c) for c in location.split(','))
+        self.location = location
+        self.radius = radius
+        self.margin = margin
+        reach = (radius + margin) / self.EARTH_RADIUS
+        d_lat = math.degrees(reach)
+        cos_lat = math.cos(math.radians(lat))
+        if cos_lat > math.sin(reach):
+            d_lon = math.degrees(math.asin(math.sin(reach) / cos_lat))
+        else:
+            # circle reaches the pole
+            d_lon = 180
+        self.bbox = (lat - d_lat, lat + d_lat, lon - d_lon, lon + d_lon)
+
+    def distance(self, location):
+        '''
+        :return: distance in meters to given location or None if it is
+        further away than radius + margin.
+        '''
+        lat, lon = (float(c) for c in location.split(','))
+        lat_min, lat_max, lon_min, lon_max = self.bbox
+        if not lat_min <= lat <= lat_max:
+            return None
+        if not (lon_min <= lon <= lon_max or lon_min <= lon - 360 <= lon_max
+                or lon_min <= lon + 360 <= lon_max):
+            return None
+        distance = haversine_distance(self.location, location)
+        if distance > self.radius + self.margin:
+            return None
+        return distance
+
+
 def be_or_not_to_be(min_seconds, max_seconds, last_be_timestamp=0):
     '''
     Returns True if max_hours has passed after last_be or last_be is not provided
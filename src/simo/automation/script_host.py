@@ -0,0 +1,279 @@
+"""
+Shared in-process host of trusted built-in scripts.
+
+Every script normally runs in a dedicated ScriptRunHandler process.
+Built-in scripts implemented via controller's `_run` (like
+PresenceLighting) are trusted and cooperative, so when enabled in
+settings.SIMO_SCRIPT_HOST they run as threads of a single ScriptHost
+worker process instead. They share that process's MQTT hub for their
+watchers and each one gets its own stop event, log file and exception
+handling. User code scripts always stay in separate processes.
+"""
+import os
+import sys
+import itertools
+import logging
+import queue
+import threading
+import traceback
+import multiprocessing
+import pytz
+from django.conf import settings
+from django.db import connection as db_connection
+from django.utils import timezone
+from simo.core.utils.logs import StreamToLogger
+
+
+DEFAULTS = {
+    'enabled': False,
+    'controllers': ('simo.automation.controllers.PresenceLighting',),
+}
+
+
+def get_script_host_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'SIMO_SCRIPT_HOST', None) or {})
+    return config
+
+
+def is_hosted_script(component):
+    config = get_script_host_config()
+    if not config['enabled']:
+        return False
+    return component.controller_uid in config['controllers']
+
+
+class _ScriptOutputRouter:
+    """
+    Routes sys.stdout/stderr writes to log of the script which is
+    currently running in this thread, falls back to original stream.
+    """
+
+    def __init__(self, host, level, fallback):
+        self.host = host
+        self.level = level
+        self.fallback = fallback
+
+    def _target(self):
+        from simo.core.events import get_current_watcher_stop_event
+        streams = self.host.output_streams.get(
+            get_current_watcher_stop_event()
+        )
+        if not streams:
+            return self.fallback
+        return streams[self.level]
+
+    def write(self, buf):
+        return self._target().write(buf)
+
+    def flush(self):
+        return self._target().flush()
+
+
+class ScriptHost(multiprocessing.Process):
+    '''
+      Single worker process running many trusted scripts as threads.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.commands = multiprocessing.Queue()
+        self.exits = multiprocessing.Queue()
+        self.parent_pid = os.getpid()
+        self.output_streams = {}
+
+    def start_script(self, component_id, token):
+        self.commands.put(('start', component_id, token))
+
+    def stop_script(self, component_id, token):
+        self.commands.put(('stop', component_id, token))
+
+    def run(self):
+        sys.stdout = _ScriptOutputRouter(self, logging.INFO, sys.stdout)
+        sys.stderr = _ScriptOutputRouter(self, logging.ERROR, sys.stderr)
+        scripts = {}
+        while os.getppid() == self.parent_pid:
+            try:
+                command, component_id, token = self.commands.get(timeout=1)
+            except queue.Empty:
+                continue
+            entry = scripts.get(component_id)
+            if command == 'stop':
+                if entry and entry['token'] == token:
+                    entry['exit_event'].set()
+                continue
+            if entry:
+                # Previous run (if still alive) is left to finish on its own
+                entry['exit_event'].set()
+            exit_event = threading.Event()
+            thread = threading.Thread(
+                target=self.run_script,
+                args=(component_id, token, exit_event), daemon=True
+            )
+            scripts[component_id] = {
+                'token': token, 'thread': thread, 'exit_event': exit_event
+            }
+            thread.start()
+
+    def run_script(self, component_id, token, exit_event):
+        from simo.core.models import Component
+        from simo.core.middleware import introduce_instance
+        from simo.core.loggers import get_component_logger
+        from simo.core.events import (
+            set_current_watcher_stop_event, clear_current_watcher_stop_event,
+            cleanup_watchers_for_event
+        )
+
+        component = None
+        try:
+            db_connection.connect()
+            component = Component.objects.get(id=component_id)
+            timezone.activate(pytz.timezone(component.zone.instance.timezone))
+            introduce_instance(component.zone.instance)
+            logger = get_component_logger(component)
+            self.output_streams[exit_event] = {
+                logging.INFO: StreamToLogger(logger, logging.INFO),
+                logging.ERROR: StreamToLogger(logger, logging.ERROR),
+            }
+            set_current_watcher_stop_event(exit_event, shared_hub=True)
+            component.set('running')
+            print("------START-------")
+            controller = component.controller
+            controller.exit_event = exit_event
+            controller._run()
+        except Exception:
+            print("------ERROR------")
+            traceback.print_exc(file=sys.stderr)
+            if component:
+                try:
+                    component.set('error')
+                except Exception:
+                    pass
+        else:
+            if not exit_event.is_set():
+                print("------FINISH-----")
+                component.set('finished')
+        finally:
+            cleanup_watchers_for_event(exit_event)
+            clear_current_watcher_stop_event()
+            self.output_streams.pop(exit_event, None)
+            try:
+                db_connection.close()
+            except Exception:
+                pass
+            self.exits.put((component_id, token))
+
+
+class HostedScript:
+    '''
+      Gateway side handle of a script running inside of ScriptHost.
+      Mimics ScriptRunHandler interface used by AutomationsGatewayHandler.
+    '''
+
+    def __init__(self, host, component_id, token):
+        self.host = host
+        self.component_id = component_id
+        self.token = token
+        self.exit_event = _HostedScriptExitEvent(self)
+        # hosted scripts always exit cooperatively
+        self.exit_in_use = threading.Event()
+        self.exit_in_use.set()
+        self.exin_in_use_fail = threading.Event()
+        self.watchers_cleaned = threading.Event()
+        self.exited = threading.Event()
+
+    @property
+    def pid(self):
+        return self.host.pid
+
+    @property
+    def sentinel(self):
+        # Exits of single scripts are reported via ScriptHostManager.on_exit
+        return self.host.sentinel
+
+    def start(self):
+        self.host.start_script(self.component_id, self.token)
+
+    def is_alive(self):
+        return self.host.is_alive() and not self.exited.is_set()
+
+    def terminate(self):
+        self.exit_event.set()
+
+    def kill(self):
+        # A thread can not be killed, so stop it and forget about it.
+        # Whatever is still running finishes within host process.
+        self.exit_event.set()
+        self.exited.set()
+        self.watchers_cleaned.set()
+
+
+class _HostedScriptExitEvent:
+
+    def __init__(self, script):
+        self.script = script
+        self._event = threading.Event()
+
+    def set(self):
+        if self._event.is_set():
+            return
+        self._event.set()
+        try:
+            self.script.host.stop_script(
+                self.script.component_id, self.script.token
+            )
+        except Exception:
+            pass
+
+    def is_set(self):
+        return self._event.is_set()
+
+
+class ScriptHostManager:
+    '''
+      Owns ScriptHost process on gateway side and tracks exits of
+      scripts it runs.
+    '''
+
+    def __init__(self, on_exit=None):
+        self._lock = threading.Lock()
+        self.on_exit = on_exit
+        self.host = None
+        self.scripts = {}
+        self._tokens = itertools.count(1)
+
+    def _ensure_host(self):
+        if self.host and self.host.is_alive():
+            return self.host
+        self.host = ScriptHost(daemon=True)
+        self.host.start()
+        threading.Thread(
+            target=self._watch_exits, args=(self.host,), daemon=True
+        ).start()
+        return self.host
+
+    def _watch_exits(self, host):
+        while host.is_alive():
+            try:
+                component_id, token = host.exits.get(timeout=1)
+            except queue.Empty:
+                continue
+            except Exception:
+                return
+            with self._lock:
+                script = self.scripts.get(component_id)
+                if not script or script.token != token:
+                    continue
+                self.scripts.pop(component_id, None)
+            script.exited.set()
+            script.watchers_cleaned.set()
+            if self.on_exit:
+                self.on_exit(component_id)
+
+    def start_script(self, component_id):
+        with self._lock:
+            host = self._ensure_host()
+            script = HostedScript(host, component_id, next(self._tokens))
+            self.scripts[component_id] = script
+        script.start()
+        return script
@@ -1,3 +1,87 @@
+import time
+import uuid
+import threading
+from django.core.cache import cache
+from django.db import transaction
 from dynamic_preferences.registries import global_preferences_registry as gpr
 
-dynamic_settings = gpr.manager()
+
+class LocalPreferences:
+    """
+    Process local read-through cache of global preferences.
+
+    Preferences are read in hot paths of gateways, controllers and API
+    views, while they change very rarely. Values are kept in memory of
+    every process. A change of any preference bumps a version in shared
+    cache and every process compares it to its own at most once per
+    CHECK_INTERVAL seconds, so changes made elsewhere are seen within
+    that delay.
+    """
+    VERSION_KEY = 'simo-preferences-version'
+    CHECK_INTERVAL = 1
+
+    def __init__(self, manager):
+        self.manager = manager
+        self._values = {}
+        self._version = None
+        self._checked = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.manager, name)
+
+    def _get_shared_version(self):
+        try:
+            version = cache.get(self.VERSION_KEY)
+            if version is None:
+                cache.add(self.VERSION_KEY, uuid.uuid4().hex, None)
+                version = cache.get(self.VERSION_KEY)
+        except Exception:
+            # Shared cache is down, rely on local invalidations only
+            return self._version
+        return version
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self._checked <= self.CHECK_INTERVAL:
+            return
+        with self._lock:
+            version = self._get_shared_version()
+            if version != self._version:
+                self._values = {}
+                self._version = version
+            self._checked = now
+
+    def __getitem__(self, key):
+        self._check_version()
+        values = self._values
+        try:
+            return values[key]
+        except KeyError:
+            pass
+        value = self.manager[key]
+        values[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self.manager[key] = value
+        self._values.pop(key, None)
+
+    def get(self, key, no_cache=False):
+        if no_cache:
+            return self.manager.get(key, no_cache=True)
+        return self[key]
+
+    def _bump_shared_version(self):
+        try:
+            cache.set(self.VERSION_KEY, uuid.uuid4().hex, None)
+        except Exception:
+            pass
+
+    def invalidate(self):
+        self._values = {}
+        # Other processes must not reload before changes are visible to them
+        transaction.on_commit(self._bump_shared_version)
+
+
+dynamic_settings = LocalPreferences(gpr.manager())
@@ -39,15 +39,15 @@ from .serializers import (
 from .permissions import (
     IsInstanceSuperuser, InstanceSuperuserCanEdit, ComponentPermission
 )
+from .instance_cache import get_instance_by_slug
 
 
 class InstanceMixin:
 
     def dispatch(self, request, *args, **kwargs):
-        self.instance = Instance.objects.filter(
-            slug=self.request.resolver_match.kwargs.get('instance_slug'),
-            is_active=True
-        ).last()
+        self.instance = get_instance_by_slug(
+            self.request.resolver_match.kwargs.get('instance_slug')
+        )
         if not self.instance:
             raise Http404()
         introduce_instance(self.instance, request)
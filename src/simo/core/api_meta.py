@@ -4,8 +4,9 @@ from django.utils.encoding import force_str
 from rest_framework.metadata import SimpleMetadata
 from rest_framework import serializers
 from rest_framework.utils.field_mapping import ClassLookupDict
-from simo.core.models import Icon, Instance, Category, Zone
+from simo.core.models import Icon, Category, Zone
 from simo.core.middleware import introduce_instance
+from simo.core.instance_cache import get_instance_by_slug
 from .serializers import (
     HiddenSerializerField, ComponentManyToManyRelatedField,
     TextAreaSerializerField, Component, LocationSerializer,
@@ -50,9 +51,9 @@ class SIMOAPIMetadata(SimpleMetadata):
     def determine_metadata(self, request, view):
         self.instance = getattr(view, 'instance', None)
         if not self.instance:
-            self.instance = Instance.objects.filter(
-                slug=request.resolver_match.kwargs.get('instance_slug')
-            ).first()
+            self.instance = get_instance_by_slug(
+                request.resolver_match.kwargs.get('instance_slug')
+            )
         if self.instance:
             introduce_instance(self.instance)
         return super().determine_metadata(request, view)
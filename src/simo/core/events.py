@@ -32,18 +32,29 @@ except Exception:  # pragma: no cover - defensive fallback for tests
 _watcher_context = threading.local()
 
 
-def set_current_watcher_stop_event(event):
+def set_current_watcher_stop_event(event, shared_hub=False):
+    """
+    Bind watchers created by current thread to given stop event.
+    :param shared_hub: watchers subscribe via process-wide MQTT hub
+    instead of dedicated clients. Used when many scripts share a process.
+    """
     _watcher_context.stop_event = event
+    _watcher_context.shared_hub = shared_hub
 
 
 def clear_current_watcher_stop_event():
     if hasattr(_watcher_context, 'stop_event'):
         del _watcher_context.stop_event
+    _watcher_context.shared_hub = False
 
 
 def get_current_watcher_stop_event():
     return getattr(_watcher_context, 'stop_event', None)
 
+
+def _watchers_share_hub():
+    return getattr(_watcher_context, 'shared_hub', False)
+
 logger = logging.getLogger(__name__)
 _WATCHER_DB_ERRORS = (
     DjangoInterfaceError,
@@ -170,6 +181,30 @@ def get_event_obj(payload, model_class=None, gateway=None):
     return obj
 
 
+def publish_component_change(component, context):
+    """Publish change events of a component and its masters.
+
+    :param context: result of Component._build_change_event_context()
+    """
+    ObjectChangeEvent(
+        component.zone.instance,
+        component,
+        dirty_fields=context['dirty_fields'],
+        actor=context.get('actor'),
+        actor_type=context.get('actor_type'),
+        actor_user_id=context.get('actor_user_id'),
+        actor_instance_user_id=context.get('actor_instance_user_id'),
+        **context['component']
+    ).publish()
+    for master_ctx in context['masters']:
+        master = master_ctx['component']
+        ObjectChangeEvent(
+            master.zone.instance,
+            master,
+            **master_ctx['data']
+        ).publish()
+
+
 class OnChangeMixin:
 
     _on_change_function = None
@@ -179,6 +214,7 @@ class OnChangeMixin:
     _mqtt_stop_event = None
     _mqtt_cleanup_registered = False
     _watcher_owner_event = None
+    _watcher_shared_hub = False
     _on_change_since = None
     _watcher_last_error = None
     _watcher_last_error_at = None
@@ -212,7 +248,7 @@ class OnChangeMixin:
     @staticmethod
     def _use_hub_watchers() -> bool:
         if get_current_watcher_stop_event():
-            return False
+            return _watchers_share_hub()
         env = os.environ.get('SIMO_MQTT_WATCHERS_VIA_HUB')
         if env is not None:
             return env.strip().lower() in ('1', 'true', 'yes', 'on')
@@ -332,10 +368,17 @@ class OnChangeMixin:
         except Exception as exc:
             self._record_watcher_failure(exc, 'on_mqtt_message')
             return
+        owner_event = self._watcher_owner_event
+        if self._watcher_shared_hub and owner_event is not None:
+            # Delivered by shared hub thread; act on behalf of owner script
+            set_current_watcher_stop_event(owner_event, shared_hub=True)
         try:
             self._on_change_function(*args)
         except Exception:
             print(traceback.format_exc(), file=sys.stderr)
+        finally:
+            if self._watcher_shared_hub and owner_event is not None:
+                clear_current_watcher_stop_event()
 
     def _prepare_on_change_args(self, payload):
         tz = pytz.timezone(self.get_instance().timezone)
@@ -510,6 +553,7 @@ class OnChangeMixin:
 
             owner_event = get_current_watcher_stop_event()
             self._watcher_owner_event = owner_event
+            self._watcher_shared_hub = use_hub and owner_event is not None
             _register_component_watcher(self, owner_event)
             self._clear_watcher_failure()
         else:
@@ -545,24 +589,10 @@ class OnChangeMixin:
         except Exception:
             return
         child_event.set()
-_watcher_context = threading.local()
 _watcher_registry_lock = threading.Lock()
 _watcher_registry = {}
 
 
-def set_current_watcher_stop_event(event):
-    _watcher_context.stop_event = event
-
-
-def clear_current_watcher_stop_event():
-    if hasattr(_watcher_context, 'stop_event'):
-        del _watcher_context.stop_event
-
-
-def get_current_watcher_stop_event():
-    return getattr(_watcher_context, 'stop_event', None)
-
-
 def _register_component_watcher(component, owner_event):
     if owner_event is None:
         return
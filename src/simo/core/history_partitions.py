@@ -0,0 +1,241 @@
+"""
+Optional monthly range partitioning of ComponentHistory (PostgreSQL only).
+
+Component history is by far the largest table of a hub and retention
+used to be enforced by deleting old rows in batches, which leaves lots
+of dead tuples behind for vacuum to deal with. Once the table is
+converted with `manage.py partition_component_history` every calendar
+month (UTC) lives in its own partition, so whole months that are past
+retention of every instance are dropped instead of deleted row by row.
+
+Partitions are named <table>_pYYYY_MM, rows that do not fit any of them
+end up in <table>_default.
+"""
+import re
+import datetime
+import logging
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+
+# Partitions are created this many months in advance
+MONTHS_AHEAD = 2
+
+
+def get_table():
+    from .models import ComponentHistory
+    return ComponentHistory._meta.db_table
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [get_table()]
+        )
+        return bool(cursor.fetchone())
+
+
+def month_start(dt):
+    dt = dt.astimezone(datetime.timezone.utc)
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(month):
+    if month.month == 12:
+        return month.replace(year=month.year + 1, month=1)
+    return month.replace(month=month.month + 1)
+
+
+def months_later(dt, months):
+    month = month_start(dt)
+    for _ in range(months):
+        month = next_month(month)
+    return month
+
+
+def iter_months(start, end):
+    """Starts of months from month of start up to month of end inclusive."""
+    month = month_start(start)
+    end = month_start(end)
+    while month <= end:
+        yield month
+        month = next_month(month)
+
+
+def partition_name(month):
+    return f'{get_table()}_p{month.year:04d}_{month.month:02d}'
+
+
+def parse_partition_name(name):
+    """Returns month start of a partition or None if not a month partition."""
+    match = re.fullmatch(
+        re.escape(get_table()) + r'_p(\d{4})_(\d{2})', name
+    )
+    if not match:
+        return None
+    return datetime.datetime(
+        int(match.group(1)), int(match.group(2)), 1,
+        tzinfo=datetime.timezone.utc
+    )
+
+
+def get_partitions():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s AND pg_table_is_visible(p.oid)",
+            [get_table()]
+        )
+        return [r[0] for r in cursor.fetchall()]
+
+
+def create_partition(cursor, month):
+    qn = connection.ops.quote_name
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS %s PARTITION OF %s "
+        "FOR VALUES FROM ('%s') TO ('%s')" % (
+            qn(partition_name(month)), qn(get_table()),
+            month.isoformat(), next_month(month).isoformat()
+        )
+    )
+
+
+def ensure_partitions(months_ahead=MONTHS_AHEAD):
+    """Makes sure partitions of this and upcoming months exist."""
+    now = timezone.now()
+    existing = set(get_partitions())
+    created = []
+    for month in iter_months(now, months_later(now, months_ahead)):
+        if partition_name(month) in existing:
+            continue
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                create_partition(cursor, month)
+        except Exception:
+            # Most likely default partition already has rows of that month
+            logger.exception(
+                "Unable to create history partition %s", partition_name(month)
+            )
+            continue
+        created.append(partition_name(month))
+    return created
+
+
+def drop_partitions_before(cutoff):
+    """
+    Drops month partitions which hold nothing newer than cutoff.
+    Returns names of dropped partitions.
+    """
+    qn = connection.ops.quote_name
+    dropped = []
+    for name in sorted(get_partitions()):
+        month = parse_partition_name(name)
+        if not month or next_month(month) > cutoff:
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS %s" % qn(name))
+        dropped.append(name)
+    return dropped
+
+
+def convert_to_partitioned(months_ahead=MONTHS_AHEAD):
+    """
+    Rebuilds ComponentHistory table as a table partitioned by month of
+    date, moving all existing rows over. Primary key of a partitioned
+    table must include partition key, so it becomes (id, date), ids keep
+    coming from a sequence, so they stay unique just like before.
+
+    Takes an exclusive lock on history table for the whole time, so it
+    is meant to be run while SIMO.io services are stopped.
+    """
+    from .models import ComponentHistory
+
+    qn = connection.ops.quote_name
+    table = get_table()
+    legacy = f'{table}_legacy'
+    seq = f'{table}_id_part_seq'
+    fields = {f.name: f for f in ComponentHistory._meta.concrete_fields}
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("LOCK TABLE %s IN ACCESS EXCLUSIVE MODE" % qn(table))
+            cursor.execute(
+                "SELECT MIN(date), COALESCE(MAX(id), 0) FROM %s" % qn(table)
+            )
+            first_date, max_id = cursor.fetchone()
+            cursor.execute(
+                "ALTER TABLE %s RENAME TO %s" % (qn(table), qn(legacy))
+            )
+            cursor.execute(
+                "CREATE TABLE %s (LIKE %s INCLUDING DEFAULTS) "
+                "PARTITION BY RANGE (date)" % (qn(table), qn(legacy))
+            )
+            cursor.execute(
+                "CREATE SEQUENCE %s OWNED BY %s.id" % (qn(seq), qn(table))
+            )
+            cursor.execute(
+                "SELECT setval(%s, %s, %s)", [seq, max_id or 1, bool(max_id)]
+            )
+            cursor.execute(
+                "ALTER TABLE %s ALTER COLUMN id SET DEFAULT nextval('%s')" % (
+                    qn(table), seq
+                )
+            )
+            cursor.execute(
+                "ALTER TABLE %s ADD PRIMARY KEY (id, date)" % qn(table)
+            )
+
+            now = timezone.now()
+            for month in iter_months(
+                first_date or now, months_later(now, months_ahead)
+            ):
+                create_partition(cursor, month)
+            cursor.execute(
+                "CREATE TABLE %s PARTITION OF %s DEFAULT" % (
+                    qn(f'{table}_default'), qn(table)
+                )
+            )
+
+            columns = ', '.join(
+                qn(f.column) for f in ComponentHistory._meta.concrete_fields
+            )
+            cursor.execute(
+                "INSERT INTO %s (%s) SELECT %s FROM %s" % (
+                    qn(table), columns, columns, qn(legacy)
+                )
+            )
+            cursor.execute("DROP TABLE %s" % qn(legacy))
+
+            for name in ('component', 'user'):
+                field = fields[name]
+                target = field.remote_field.model._meta
+                cursor.execute(
+                    "ALTER TABLE %s ADD CONSTRAINT %s FOREIGN KEY (%s) "
+                    "REFERENCES %s (%s) DEFERRABLE INITIALLY DEFERRED" % (
+                        qn(table), qn(f'{table}_{field.column}_fk'),
+                        qn(field.column), qn(target.db_table),
+                        qn(target.pk.column)
+                    )
+                )
+            for name in ('component', 'user', 'date', 'type'):
+                column = fields[name].column
+                cursor.execute("CREATE INDEX %s ON %s (%s)" % (
+                    qn(f'{table}_{column}_idx'), qn(table), qn(column)
+                ))
+
+        with connection.schema_editor(atomic=False) as schema_editor:
+            for index in ComponentHistory._meta.indexes:
+                schema_editor.add_index(ComponentHistory, index)
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE %s" % qn(table))
@@ -0,0 +1,143 @@
+"""
+Process-local snapshots of house overview used by voice assistant.
+
+Layout of a house (zones and their components) changes rarely, so it is
+built once and kept in memory until structure version of an instance is
+bumped. Structure version lives in a shared cache, so modifications done
+by any process invalidate snapshots of all of them.
+
+Values of weather and main state components, which are the only live
+values of an overview, are patched in place from obj-state events.
+"""
+import json
+import threading
+import time
+from django.core.cache import cache
+
+
+# Component fields that affect the layout of house overview
+STRUCTURE_FIELDS = (
+    'name', 'icon', 'zone', 'base_type', 'controller_uid', 'config',
+    'is_active',
+)
+# Safety net for the case when obj-state events are not delivered.
+MAX_AGE = 300
+
+COMPONENT_EVENTS_TOPIC = 'SIMO/obj-state/+/Component/+'
+
+
+def _version_key(instance_id):
+    return f'home-overview-version-{instance_id}'
+
+
+def get_structure_version(instance_id):
+    key = _version_key(instance_id)
+    version = cache.get(key)
+    if version is None:
+        # Unknown (or evicted) version must never match any existing snapshot
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_structure_version(instance_id):
+    key = _version_key(instance_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
+
+
+class HomeOverviewSnapshots:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots = {}
+        self._subscribed = False
+
+    def get(self, instance_id, version):
+        snapshot = self._snapshots.get(instance_id)
+        if not snapshot or snapshot['version'] != version:
+            return
+        if time.monotonic() - snapshot['built'] > MAX_AGE:
+            return
+        return snapshot
+
+    def put(self, instance, version, zones, live_components):
+        """
+        :param zones: prebuilt zones overview
+        :param live_components: {key: Component or None} components
+        which value and alive fields are kept up to date from events.
+        """
+        self._subscribe()
+        built_at = time.time()
+        snapshot = {
+            'version': version,
+            'instance_uid': instance.uid,
+            'built': time.monotonic(),
+            'zones': zones,
+            'live': live_components,
+            # timestamps of last applied values per component
+            'timestamps': {
+                component.id: built_at
+                for component in live_components.values() if component
+            },
+        }
+        with self._lock:
+            self._snapshots[instance.id] = snapshot
+        return snapshot
+
+    def invalidate(self, instance_id=None):
+        with self._lock:
+            if instance_id is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(instance_id, None)
+
+    def _subscribe(self):
+        if self._subscribed:
+            return
+        from simo.core.mqtt_hub import get_mqtt_hub
+        try:
+            get_mqtt_hub().subscribe(
+                COMPONENT_EVENTS_TOPIC, self.on_mqtt_message
+            )
+        except Exception:
+            return
+        self._subscribed = True
+
+    def on_mqtt_message(self, client, userdata, msg):
+        try:
+            _, _, instance_uid, _, component_id = msg.topic.split('/')
+            component_id = int(component_id)
+            payload = json.loads(msg.payload)
+        except Exception:
+            return
+        restructured = not getattr(msg, 'retain', False) and any(
+            field in STRUCTURE_FIELDS
+            for field in (payload.get('dirty_fields') or {})
+        )
+        with self._lock:
+            for instance_id, snapshot in list(self._snapshots.items()):
+                if snapshot['instance_uid'] != instance_uid:
+                    continue
+                if restructured:
+                    self._snapshots.pop(instance_id, None)
+                    continue
+                timestamp = payload.get('timestamp', 0)
+                if component_id not in snapshot['timestamps']:
+                    continue
+                # Value in snapshot is already newer than this event
+                if timestamp < snapshot['timestamps'][component_id]:
+                    continue
+                snapshot['timestamps'][component_id] = timestamp
+                for component in snapshot['live'].values():
+                    if not component or component.id != component_id:
+                        continue
+                    if 'value' in payload:
+                        component.value = payload['value']
+                    if 'alive' in payload:
+                        component.alive = payload['alive']
+
+
+home_overview_snapshots = HomeOverviewSnapshots()
@@ -0,0 +1,109 @@
+"""
+Process local cache of active instances.
+
+Instance is resolved on every request, while instances themselves change
+very rarely. Every process keeps all active instances in memory together
+with their prebuilt tzinfo. Saving or deleting an instance bumps a
+version in shared cache and every process compares it to its own at
+most once per CHECK_INTERVAL seconds.
+
+Queryset .update() calls bypass model signals, call invalidate()
+after those.
+"""
+import copy
+import time
+import uuid
+import threading
+import pytz
+from django.core.cache import cache
+from django.db import transaction
+
+
+VERSION_KEY = 'simo-instances-version'
+CHECK_INTERVAL = 1
+
+_lock = threading.Lock()
+_state = {
+    'version': None, 'checked': 0, 'by_id': None, 'by_slug': None,
+    'by_uid': None,
+}
+
+
+def _get_shared_version():
+    try:
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+            version = cache.get(VERSION_KEY)
+    except Exception:
+        # Shared cache is down, rely on local invalidations only
+        return _state['version']
+    return version
+
+
+def _load(version):
+    from .models import Instance
+    by_id, by_slug, by_uid = {}, {}, {}
+    for instance in Instance.objects.filter(is_active=True).order_by('-id'):
+        try:
+            instance.tzinfo = pytz.timezone(instance.timezone)
+        except Exception:
+            # should never, but just in case
+            instance.tzinfo = pytz.timezone('UTC')
+        by_id[instance.id] = instance
+        # lowest id wins if slugs collide
+        by_slug[instance.slug] = instance
+        by_uid[instance.uid] = instance
+    _state.update({
+        'version': version, 'by_id': by_id, 'by_slug': by_slug,
+        'by_uid': by_uid,
+    })
+
+
+def _get(index, key):
+    with _lock:
+        now = time.monotonic()
+        if _state['by_id'] is None or now - _state['checked'] > CHECK_INTERVAL:
+            version = _get_shared_version()
+            if _state['by_id'] is None or version != _state['version']:
+                _load(version)
+            _state['checked'] = now
+        instance = _state[index].get(key)
+    if instance is None:
+        return None
+    # Callers are free to modify what they get
+    return copy.copy(instance)
+
+
+def get_instance_by_id(instance_id):
+    try:
+        instance_id = int(instance_id)
+    except (TypeError, ValueError):
+        return None
+    return _get('by_id', instance_id)
+
+
+def get_instance_by_slug(slug):
+    if not slug:
+        return None
+    return _get('by_slug', slug)
+
+
+def get_instance_by_uid(uid):
+    if not uid:
+        return None
+    return _get('by_uid', uid)
+
+
+def _bump_shared_version():
+    try:
+        cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+    except Exception:
+        pass
+
+
+def invalidate():
+    with _lock:
+        _state['by_id'] = None
+    # Other processes must not reload before changes are visible to them
+    transaction.on_commit(_bump_shared_version)
@@ -0,0 +1,282 @@
+import ctypes
+import ctypes.util
+import itertools
+import logging
+import os
+import struct
+import threading
+import time
+from typing import Callable, Dict, List
+
+
+logger = logging.getLogger(__name__)
+
+
+# Used only where inotify is not available
+POLL_INTERVAL = 0.3
+
+IN_MODIFY = 0x00000002
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+WATCH_MASK = IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# struct inotify_event without its variable length name
+_EVENT = struct.Struct('iIII')
+
+
+class _Inotify:
+    """Bare minimum of Linux inotify API."""
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(
+            ctypes.util.find_library('c') or 'libc.so.6', use_errno=True
+        )
+        self.fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def add_watch(self, path):
+        wd = self._libc.inotify_add_watch(
+            self.fd, os.fsencode(path), WATCH_MASK
+        )
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def rm_watch(self, wd):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self):
+        """Blocks until something happens, returns [(wd, mask, name)]."""
+        data = os.read(self.fd, 64 * 1024)
+        events = []
+        pos = 0
+        while pos + _EVENT.size <= len(data):
+            wd, mask, _cookie, length = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size
+            name = data[pos:pos + length].rstrip(b'\0')
+            pos += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+
+class _WatchedFile:
+    """
+    Follows a single log file across rotations and truncations,
+    yielding complete lines only.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.subscribers: Dict[int, Callable[[List[str]], None]] = {}
+        self.file = None
+        self.inode = None
+        self.offset = 0
+        self.partial = b''
+        self._open()
+        # Whatever is already there is served by read_head()
+        self._read()
+
+    def _open(self):
+        self.close()
+        self.offset = 0
+        self.partial = b''
+        try:
+            self.file = open(self.path, 'rb')
+        except OSError:
+            return
+        self.inode = os.fstat(self.file.fileno()).st_ino
+
+    def close(self):
+        if self.file:
+            self.file.close()
+        self.file = None
+        self.inode = None
+
+    def _read(self):
+        if not self.file:
+            return []
+        data = self.file.read()
+        if not data:
+            return []
+        self.offset += len(data)
+        data = self.partial + data
+        end = data.rfind(b'\n') + 1
+        self.partial = data[end:]
+        return data[:end].decode('utf-8', 'replace').splitlines(True)
+
+    def read_new(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            # Rotated away, new file is not there yet
+            return self._read()
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            # Finish what was written to rotated file and start over
+            lines = self._read()
+            self._open()
+            return lines + self._read()
+        return self._read()
+
+    def read_head(self):
+        """Everything up to the last line that was handed out."""
+        if not self.file:
+            return ''
+        return os.pread(
+            self.file.fileno(), self.offset - len(self.partial), 0
+        ).decode('utf-8', 'replace')
+
+
+class _LogWatcher:
+    """
+    A process-wide watcher of log files that are streamed to
+    websockets. Every file is read by a single _WatchedFile no matter
+    how many consumers follow it and new lines are pushed to all of
+    them as soon as inotify reports a change of a file. Nothing runs
+    while watched files are not written to.
+
+    Where inotify is not available, a single thread polls files that
+    have subscribers every POLL_INTERVAL seconds instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._files: Dict[str, _WatchedFile] = {}
+        self._subscriptions: Dict[int, str] = {}
+        self._dirs: Dict[str, int] = {}
+        self._tokens = itertools.count(1)
+        self._thread = None
+        self._wakeup = threading.Event()
+        try:
+            self._inotify = _Inotify()
+        except Exception:
+            logger.warning("inotify is not available, polling log files")
+            self._inotify = None
+
+    def subscribe(self, path, callback):
+        """
+        Calls callback(lines) from watcher thread with every bunch of
+        complete lines appended to the file. Returns subscription token
+        and text of the file up to the first line that will be pushed.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            watched = self._files.get(path)
+            if watched is None:
+                watched = _WatchedFile(path)
+                self._files[path] = watched
+                self._watch_dir(os.path.dirname(path))
+            token = next(self._tokens)
+            watched.subscribers[token] = callback
+            self._subscriptions[token] = path
+            self._ensure_thread()
+            self._wakeup.set()
+            return token, watched.read_head()
+
+    def unsubscribe(self, token):
+        with self._lock:
+            path = self._subscriptions.pop(token, None)
+            watched = self._files.get(path)
+            if not watched:
+                return
+            watched.subscribers.pop(token, None)
+            if watched.subscribers:
+                return
+            watched.close()
+            self._files.pop(path)
+            dir = os.path.dirname(path)
+            if not any(os.path.dirname(p) == dir for p in self._files):
+                self._unwatch_dir(dir)
+
+    def _watch_dir(self, dir):
+        # Directories are watched, as log files get replaced on rotation
+        if not self._inotify or dir in self._dirs:
+            return
+        try:
+            self._dirs[dir] = self._inotify.add_watch(dir)
+        except OSError:
+            logger.exception("Unable to watch %s", dir)
+
+    def _unwatch_dir(self, dir):
+        wd = self._dirs.pop(dir, None)
+        if wd is not None:
+            self._inotify.rm_watch(wd)
+
+    def _ensure_thread(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(
+            target=self._run, name='log-watcher', daemon=True
+        )
+        self._thread.start()
+
+    def _dispatch(self, watched):
+        try:
+            lines = watched.read_new()
+        except Exception:
+            logger.exception("Unable to read %s", watched.path)
+            return
+        if not lines:
+            return
+        for callback in list(watched.subscribers.values()):
+            try:
+                callback(lines)
+            except Exception:
+                logger.exception("Log subscriber failed")
+
+    def _run(self):
+        while True:
+            try:
+                if self._inotify:
+                    self._wait_for_changes()
+                else:
+                    self._poll()
+            except Exception:
+                logger.exception("Log watcher failure")
+                time.sleep(1)
+
+    def _wait_for_changes(self):
+        events = self._inotify.read_events()
+        with self._lock:
+            dirs = {wd: dir for dir, wd in self._dirs.items()}
+            changed = set()
+            for wd, mask, name in events:
+                if mask & IN_Q_OVERFLOW:
+                    changed = set(self._files)
+                    break
+                if wd in dirs and name:
+                    changed.add(os.path.join(dirs[wd], name))
+            for path in changed:
+                watched = self._files.get(path)
+                if watched:
+                    self._dispatch(watched)
+
+    def _poll(self):
+        with self._lock:
+            files = list(self._files.values())
+            for watched in files:
+                self._dispatch(watched)
+        if files:
+            time.sleep(POLL_INTERVAL)
+        else:
+            self._wakeup.wait()
+            self._wakeup.clear()
+
+
+_watcher: _LogWatcher | None = None
+_watcher_pid: int | None = None
+
+
+def get_log_watcher() -> _LogWatcher:
+    """Return a process-local log watcher."""
+    global _watcher, _watcher_pid
+    pid = os.getpid()
+    if _watcher is None or _watcher_pid != pid:
+        _watcher = _LogWatcher()
+        _watcher_pid = pid
+    return _watcher
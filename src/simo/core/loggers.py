@@ -1,8 +1,183 @@
+"""
+Gateway, component and colonel log files.
+
+Loggers of these never write to files on the thread that logs. Final
+log line is formatted right away and put to a bounded queue of the
+process, single listener thread writes it to a file and rotates files
+when needed. A slow disk or a script flooding its stdout can therefore
+never stall device control loops, once the queue is full records are
+dropped according to drop_policy and counted.
+"""
+import os
+import queue
+import time
 import logging
-from simo.core.utils.model_helpers import get_log_file_path
+import threading
+import multiprocessing.util
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from django.conf import settings
 from django.utils import timezone
-from logging.handlers import RotatingFileHandler
+from simo.core.utils.model_helpers import get_log_file_path
+
+
+DEFAULTS = {
+    # Records waiting to be written, per process.
+    'queue_size': 10000,
+    # What to do once queue is full:
+    # 'oldest' - drop oldest waiting record to make room for a new one,
+    # 'newest' - drop record that is being logged.
+    'drop_policy': 'oldest',
+}
+
+
+def get_logging_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'SIMO_LOGGING', None) or {})
+    return config
+
+
+class _RoutingListener(QueueListener):
+    """Writes every record with the file handler it was queued for."""
+
+    def __init__(self, queue, pipeline):
+        super().__init__(queue)
+        self.pipeline = pipeline
+
+    def enqueue_sentinel(self):
+        # Queue may be full, wait for room instead of failing
+        self.queue.put(self._sentinel)
+
+    def handle(self, item):
+        handler, record = item
+        handler.handle(record)
+        self.pipeline.written += 1
+
+
+class LogPipeline:
+    """Bounded queue of log records and its listener, one per process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self.queue = None
+        self.listener = None
+        self._finalizer = None
+        self.written = 0
+        self.dropped = 0
+
+    def _get_queue(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return self.queue
+        with self._lock:
+            if self._pid != pid:
+                # New process, or forked one, whatever was queued
+                # belongs to the parent.
+                self.queue = queue.Queue(get_logging_config()['queue_size'])
+                self.listener = _RoutingListener(self.queue, self)
+                self.listener.start()
+                self.written = 0
+                self.dropped = 0
+                self._pid = pid
+                # Finalizers are per process, multiprocessing runs them
+                # once run() of a child process is done, as well as on
+                # interpreter exit.
+                self._finalizer = multiprocessing.util.Finalize(
+                    None, self.flush, exitpriority=10
+                )
+        return self.queue
+
+    def put(self, handler, record):
+        q = self._get_queue()
+        try:
+            q.put_nowait((handler, record))
+            return
+        except queue.Full:
+            pass
+        with self._lock:
+            self.dropped += 1
+            if get_logging_config()['drop_policy'] != 'oldest':
+                return
+            try:
+                q.get_nowait()
+                q.task_done()
+            except queue.Empty:
+                pass
+            try:
+                q.put_nowait((handler, record))
+            except queue.Full:
+                # other threads took the room, drop this one too
+                self.dropped += 1
 
+    def flush(self, timeout=5):
+        """Waits until everything queued by this process is written."""
+        if self._pid != os.getpid():
+            return
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def stop(self):
+        """
+        Stops listener thread of this process once everything queued so
+        far is written. Next record starts a new one.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            listener = self.listener
+            self._pid = None
+        if listener._thread:
+            listener.stop()
+        self._finalizer.cancel()
+
+    def get_stats(self):
+        return {
+            'pending': self.queue.qsize() if self._pid == os.getpid() else 0,
+            'written': self.written, 'dropped': self.dropped,
+        }
+
+
+log_pipeline = LogPipeline()
+
+
+class NonBlockingHandler(QueueHandler):
+    """
+    Formats records on the calling thread, so that time and timezone
+    are of the moment and context of logging, and leaves writing them
+    to target handler on log_pipeline listener thread.
+    """
+
+    def __init__(self, target):
+        super().__init__(None)
+        self.target = target
+
+    def enqueue(self, record):
+        log_pipeline.put(self.target, record)
+
+    def close(self):
+        super().close()
+        self.target.close()
+
+
+def flush_logs(timeout=5):
+    log_pipeline.flush(timeout)
+
+
+def add_file_handler(logger, path, max_bytes=100 * 1024):
+    formatter = logging.Formatter(
+        '%(asctime)s [%(levelname)s] %(message)s',
+        "%m-%d %H:%M:%S"
+    )
+    formatter.converter = \
+        lambda *args, **kwargs: timezone.localtime().timetuple()
+    file_handler = RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=3, encoding='utf-8'
+    )
+    handler = NonBlockingHandler(file_handler)
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+    return handler
 
 
 def get_gw_logger(gateway_id):
@@ -10,40 +185,16 @@ def get_gw_logger(gateway_id):
     logger = logging.getLogger("Gateway Logger [%d]" % gateway_id)
     logger.propagate = False
     if not logger.handlers:
-        formatter = logging.Formatter(
-            '%(asctime)s [%(levelname)s] %(message)s',
-            "%m-%d %H:%M:%S"
-        )
-        formatter.converter = \
-            lambda *args, **kwargs: timezone.localtime().timetuple()
-        from simo.core.utils.model_helpers import get_log_file_path
         gw = Gateway.objects.get(pk=gateway_id)
-        file_handler = RotatingFileHandler(
-            get_log_file_path(gw), maxBytes=102400,  # 100KB
-            backupCount=3, encoding='utf-8'
-        )
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        add_file_handler(logger, get_log_file_path(gw))
     return logger
 
 
-
 def get_component_logger(component):
     logger = logging.getLogger(
         "Component Logger [%d]" % component.id
     )
     logger.propagate = False
     if not logger.handlers:
-        formatter = logging.Formatter(
-            '%(asctime)s [%(levelname)s] %(message)s',
-            "%m-%d %H:%M:%S"
-        )
-        formatter.converter = \
-            lambda *args, **kwargs: timezone.localtime().timetuple()
-        file_handler = RotatingFileHandler(
-            get_log_file_path(component), maxBytes=102400,  # 100KB
-            backupCount=3, encoding='utf-8'
-        )
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        add_file_handler(logger, get_log_file_path(component))
     return logger
@@ -0,0 +1,148 @@
+import time
+import datetime
+import statistics
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from simo.core import history_partitions
+from simo.core.models import Component, ComponentHistory
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark hot component history queries on a generated dataset. "
+        "Rows are generated for existing components inside of a "
+        "transaction which is always rolled back (PostgreSQL only). "
+        "History table is locked while it runs, so stop SIMO.io services "
+        "or run it against a copy of the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=3_000_000)
+        parser.add_argument(
+            '--components', type=int, default=50,
+            help='Number of existing components to spread rows over.'
+        )
+        parser.add_argument(
+            '--days', type=int, default=180,
+            help='Generated rows are spread over this many days.'
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Benchmark requires PostgreSQL.")
+        component_ids = list(
+            Component.objects.order_by('id').values_list('id', flat=True)[
+                :options['components']
+            ]
+        )
+        if not component_ids:
+            raise CommandError("There are no components to generate history for.")
+
+        with transaction.atomic():
+            self.generate(component_ids, options['rows'], options['days'])
+            self.stdout.write("\nWith composite indexes:")
+            self.run_queries(component_ids, options['repeat'], options['days'])
+            self.stdout.write("\nWithout composite indexes:")
+            self.drop_composite_indexes()
+            self.run_queries(component_ids, options['repeat'], options['days'])
+            self.time_retention(options['days'])
+            transaction.set_rollback(True)
+
+    def generate(self, component_ids, rows, days):
+        started = time.perf_counter()
+        table = connection.ops.quote_name(ComponentHistory._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (component_id, date, type, value, alive) "
+                f"SELECT (%s::int[])[1 + g %% %s], "
+                f"now() - (g * %s::float / %s) * interval '1 day', "
+                f"CASE WHEN g %% 10 = 0 THEN 'security' ELSE 'value' END, "
+                f"to_jsonb(g %% 100), true "
+                f"FROM generate_series(1, %s) g",
+                [component_ids, len(component_ids), days, rows, rows]
+            )
+            cursor.execute(f"ANALYZE {table}")
+        self.stdout.write(
+            f"Generated {rows} history rows for {len(component_ids)} "
+            f"components in {time.perf_counter() - started:.1f}s"
+        )
+
+    def drop_composite_indexes(self):
+        with connection.schema_editor(atomic=False) as schema_editor:
+            for index in ComponentHistory._meta.indexes:
+                schema_editor.remove_index(ComponentHistory, index)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE %s" % connection.ops.quote_name(
+                ComponentHistory._meta.db_table
+            ))
+
+    def run_queries(self, component_ids, repeat, days):
+        now = timezone.now()
+        day_ago = now - datetime.timedelta(days=1)
+        month_ago = now - datetime.timedelta(days=min(days, 30))
+
+        def value_qs(comp_id):
+            return ComponentHistory.objects.filter(
+                component_id=comp_id, type='value'
+            )
+
+        queries = {
+            # Controller._get_value_history('day')
+            'day baseline': lambda c: value_qs(c).filter(
+                date__lte=day_ago
+            ).order_by('date').values_list('value', flat=True).last(),
+            'day changes': lambda c: list(value_qs(c).filter(
+                date__gt=day_ago, date__lt=now
+            ).order_by('date').values_list('date', 'value')),
+            # History API bucket
+            'month bucket': lambda c: list(value_qs(c).filter(
+                date__gt=month_ago, date__lte=now
+            ).values_list('value', flat=True)),
+            # Button dedupe in ControllerBase.set()
+            'last event': lambda c: value_qs(c).order_by(
+                '-date', '-id'
+            ).first(),
+        }
+        for name, query in queries.items():
+            timings = []
+            for i in range(repeat):
+                comp_id = component_ids[i % len(component_ids)]
+                started = time.perf_counter()
+                query(comp_id)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f"  {name:<14} median {statistics.median(timings):8.2f}ms  "
+                f"max {timings[-1]:8.2f}ms"
+            )
+
+    def time_retention(self, days):
+        cutoff = history_partitions.month_start(
+            timezone.now() - datetime.timedelta(days=days // 2)
+        )
+        sid = transaction.savepoint()
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM %s WHERE date < %%s" % connection.ops.quote_name(
+                    ComponentHistory._meta.db_table
+                ), [cutoff]
+            )
+            deleted = cursor.rowcount
+        self.stdout.write(
+            f"\nRetention by DELETE of {deleted} rows: "
+            f"{time.perf_counter() - started:.2f}s"
+        )
+        transaction.savepoint_rollback(sid)
+        if history_partitions.is_partitioned():
+            sid = transaction.savepoint()
+            started = time.perf_counter()
+            dropped = history_partitions.drop_partitions_before(cutoff)
+            self.stdout.write(
+                f"Retention by dropping {len(dropped)} partitions: "
+                f"{time.perf_counter() - started:.2f}s"
+            )
+            transaction.savepoint_rollback(sid)
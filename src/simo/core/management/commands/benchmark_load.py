@@ -0,0 +1,624 @@
+"""
+End to end load and latency benchmark of a hub.
+
+Runs against local mosquitto, PostgreSQL and redis the hub is configured
+with. A throwaway instance with N colonels, M switches spread over them
+and K app users is created and removed afterwards. Then:
+
+- command_to_device: values are sent to components through their
+  controllers, time is measured until simulated colonels receive
+  set_val over FleetConsumer websocket protocol;
+- device_to_app: simulated colonels report new values, time is measured
+  until every app user receives it on its fanout feed topic.
+
+DB queries per event, CPU time of every process involved and time spent
+in hot paths are reported for every phase too. The report is JSON, so
+that runs can be compared against each other.
+
+Colonels are served by FleetConsumer inside this process, app fanout is
+run_app_mqtt_fanout in a child process. Stop the fanout service of the
+hub while benchmarking, otherwise every feed message is delivered twice.
+"""
+import asyncio
+import collections
+import contextlib
+import datetime
+import functools
+import json
+import multiprocessing
+import os
+import signal
+import statistics
+import threading
+import time
+import uuid
+import zlib
+from unittest import mock
+
+import paho.mqtt.client as mqtt
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save
+
+from simo.core.controllers import ControllerBase
+from simo.core.management.commands import run_app_mqtt_fanout
+
+
+HOT_PATHS = (
+    (ControllerBase, 'send', 'ControllerBase.send'),
+    (ControllerBase, 'set', 'ControllerBase.set'),
+    (
+        ControllerBase, '_receive_from_device',
+        'ControllerBase._receive_from_device'
+    ),
+    (
+        run_app_mqtt_fanout.Command, 'on_message',
+        'run_app_mqtt_fanout.on_message'
+    ),
+)
+
+
+def summarize(durations):
+    """Latency statistics of durations (seconds) in milliseconds."""
+    if not durations:
+        return None
+    durations = sorted(durations)
+
+    def ms(value):
+        return round(value * 1000, 3)
+
+    def percentile(p):
+        return ms(durations[min(len(durations) - 1, int(len(durations) * p))])
+
+    return {
+        'mean': ms(statistics.fmean(durations)),
+        'p50': percentile(0.5), 'p90': percentile(0.9),
+        'p99': percentile(0.99), 'max': ms(durations[-1]),
+    }
+
+
+def read_cpu_seconds(pid):
+    """User + system CPU time of a process, None if not available."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # process name may contain spaces, fields start after it
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class SharedCounter:
+    """Counter which is also incremented by forked child processes."""
+
+    def __init__(self):
+        self.value = multiprocessing.Value('Q', 0)
+
+    def add(self, count=1):
+        with self.value.get_lock():
+            self.value.value += count
+
+    def reset(self):
+        with self.value.get_lock():
+            self.value.value = 0
+
+    def get(self):
+        return self.value.value
+
+
+class QueryCounter(SharedCounter):
+    """Counts DB queries of every connection of a process."""
+
+    def __call__(self, execute, sql, params, many, context):
+        self.add()
+        return execute(sql, params, many, context)
+
+    def _on_connection_created(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def install(self):
+        connection_created.connect(self._on_connection_created, weak=False)
+        for connection in connections.all():
+            self._on_connection_created(None, connection)
+
+
+class CallStats:
+    """Number, total and max duration of calls, shared with children."""
+
+    def __init__(self):
+        self.data = multiprocessing.Array('d', 3)
+
+    def add(self, duration):
+        with self.data.get_lock():
+            self.data[0] += 1
+            self.data[1] += duration
+            self.data[2] = max(self.data[2], duration)
+
+    def reset(self):
+        with self.data.get_lock():
+            self.data[:] = [0, 0, 0]
+
+    def report(self):
+        calls, total, longest = self.data[:]
+        if not calls:
+            return None
+        return {
+            'calls': int(calls),
+            'mean_ms': round(total / calls * 1000, 3),
+            'max_ms': round(longest * 1000, 3),
+        }
+
+    def wrap(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(time.perf_counter() - started)
+        return wrapper
+
+
+def run_fanout(queries, hot_paths):
+    queries.install()
+    Command = run_app_mqtt_fanout.Command
+    Command.on_message = hot_paths['run_app_mqtt_fanout.on_message'].wrap(
+        Command.on_message
+    )
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        # Returns on SIGINT
+        Command().handle()
+
+
+class Fixture:
+    """Throwaway instance with colonels, switches and app users."""
+
+    def __init__(self, colonels, components, app_users):
+        self.counts = (colonels, components, app_users)
+        self.uid = 'benchmark-' + uuid.uuid4().hex[:8]
+        self.instance = None
+        self.colonels = []
+        self.components = []
+        self.users = []
+
+    def create(self):
+        from simo.core.models import Instance, Zone, Component, Gateway
+        from simo.core.signal_receivers import create_instance_defaults
+        from simo.fleet.controllers import Switch
+        from simo.fleet.gateways import FleetGatewayHandler
+        from simo.fleet.models import Colonel, InstanceOptions
+        from simo.users.models import User, PermissionsRole, InstanceUser
+
+        colonels, components, app_users = self.counts
+        # Default zones, categories and components are of no use here
+        post_save.disconnect(create_instance_defaults, sender=Instance)
+        try:
+            self.instance = Instance.objects.create(
+                uid=self.uid, name='Benchmark', slug=self.uid
+            )
+        finally:
+            post_save.connect(create_instance_defaults, sender=Instance)
+        self.secret = InstanceOptions.objects.get_or_create(
+            instance=self.instance
+        )[0].secret_key
+        zone = Zone.objects.create(
+            instance=self.instance, name='Benchmark', order=0
+        )
+        gateway, _ = Gateway.objects.get_or_create(
+            type=FleetGatewayHandler.uid
+        )
+        for i in range(colonels):
+            self.colonels.append(Colonel.objects.create(
+                instance=self.instance, uid=f'{self.uid}-{i}',
+                type='game-changer', name=f'Benchmark {i}', enabled=True,
+            ))
+        for i in range(components):
+            colonel = self.colonels[i % colonels]
+            self.components.append(Component.objects.create(
+                name=f'Benchmark {i}', zone=zone, category=None,
+                gateway=gateway, base_type='switch',
+                controller_uid=Switch.uid, meta={}, value=False,
+                config={
+                    'colonel': colonel.id, 'output_pin_no': 100 + i // colonels
+                },
+            ))
+        role = PermissionsRole.objects.create(
+            instance=self.instance, name='Benchmark', is_superuser=True
+        )
+        for i in range(app_users):
+            user = User.objects.create(
+                email=f'{self.uid}-{i}@benchmark.local', name=f'Benchmark {i}'
+            )
+            InstanceUser.objects.create(
+                user=user, instance=self.instance, role=role, is_active=True
+            )
+            self.users.append(user)
+
+    def delete(self):
+        from simo.users.models import User
+        User.objects.filter(id__in=[u.id for u in self.users]).delete()
+        if self.instance:
+            self.instance.delete()
+
+    def get_colonel_headers(self, colonel):
+        return [(k.encode(), str(v).encode()) for k, v in {
+            'instance-uid': self.instance.uid,
+            'instance-secret': self.secret,
+            'colonel-uid': colonel.uid,
+            'colonel-type': colonel.type,
+            'firmware-version': colonel.firmware_version or '1.0',
+            'colonel-name': colonel.name,
+        }.items()]
+
+
+class SimulatedColonel:
+    """Talks FleetConsumer websocket protocol like a colonel does."""
+
+    def __init__(self, benchmark, colonel, headers):
+        self.benchmark = benchmark
+        self.colonel = colonel
+        self.headers = headers
+        self.loop = asyncio.get_running_loop()
+        self.incoming = asyncio.Queue()
+        self.connected = asyncio.Event()
+        self.task = None
+
+    async def connect(self, timeout):
+        from simo.fleet.socket_consumers import FleetConsumer
+        scope = {
+            'type': 'websocket', 'path': '/ws/fleet/', 'query_string': b'',
+            'headers': self.headers, 'url_route': {'args': (), 'kwargs': {}},
+        }
+        self.task = asyncio.create_task(
+            FleetConsumer.as_asgi()(scope, self.incoming.get, self._send)
+        )
+        self.incoming.put_nowait({'type': 'websocket.connect'})
+        try:
+            await asyncio.wait_for(self.connected.wait(), timeout)
+        except asyncio.TimeoutError:
+            raise CommandError(f"Colonel {self.colonel.uid} did not connect.")
+
+    async def _send(self, message):
+        # Consumer sends from MQTT client thread too
+        received_at = time.perf_counter()
+        self.loop.call_soon_threadsafe(self._on_message, received_at, message)
+
+    def _on_message(self, received_at, message):
+        if message['type'] != 'websocket.send':
+            return
+        if message.get('bytes'):
+            data = json.loads(zlib.decompress(message['bytes']))
+        else:
+            data = json.loads(message['text'])
+        if data.get('command') == 'hello':
+            self.connected.set()
+        elif data.get('command') == 'set_val':
+            self.benchmark.on_set_val(data['id'], received_at)
+
+    def report_value(self, component_id, value):
+        self.incoming.put_nowait({
+            'type': 'websocket.receive',
+            'text': json.dumps({'comp': component_id, 'val': value}),
+        })
+
+    async def disconnect(self):
+        self.incoming.put_nowait({'type': 'websocket.disconnect', 'code': 1000})
+        try:
+            await asyncio.wait_for(self.task, 10)
+        except Exception:
+            self.task.cancel()
+
+
+class AppUser:
+    """Mobile app following its fanout feed."""
+
+    def __init__(self, benchmark, user, instance_uid):
+        self.benchmark = benchmark
+        self.user = user
+        self.topic = f'{run_app_mqtt_fanout.FEED_PREFIX}/{user.id}/feed/' \
+                     f'{instance_uid}/Component/+'
+        self.subscribed = threading.Event()
+        self.client = mqtt.Client()
+        self.client.username_pw_set('root', settings.SECRET_KEY)
+        self.client.on_connect = self.on_connect
+        self.client.on_subscribe = self.on_subscribe
+        self.client.on_message = self.on_message
+
+    def connect(self):
+        try:
+            self.client.connect(settings.MQTT_HOST, settings.MQTT_PORT)
+        except Exception as e:
+            raise CommandError(f"Unable to connect to MQTT broker: {e}")
+        self.client.loop_start()
+
+    def on_connect(self, client, userdata, flags, rc):
+        client.subscribe(self.topic)
+
+    def on_subscribe(self, client, userdata, mid, granted_qos):
+        self.subscribed.set()
+
+    def on_message(self, client, userdata, msg):
+        if msg.retain:
+            return
+        received_at = time.perf_counter()
+        try:
+            payload = json.loads(msg.payload)
+            component_id = int(msg.topic.split('/')[-1])
+        except (ValueError, TypeError):
+            return
+        if 'value' not in (payload.get('dirty_fields') or {}):
+            return
+        self.benchmark.on_feed_value(
+            self.user.id, component_id, payload.get('value'), received_at
+        )
+
+    def disconnect(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+class LoadBenchmark:
+
+    def __init__(self, fixture, options, pids, queries, hot_paths):
+        self.fixture = fixture
+        self.events = options['events']
+        self.rate = options['rate']
+        self.timeout = options['timeout']
+        self.pids = pids
+        # {process name: QueryCounter}
+        self.queries = queries
+        self.hot_paths = hot_paths
+        self.lock = threading.Lock()
+        self.latencies = []
+        # {component_id: deque([sent_at, ...])}
+        self.pending_commands = collections.defaultdict(collections.deque)
+        # {(component_id, value): deque([[reported_at, {user_id, ...}], ...])}
+        self.pending_reports = collections.defaultdict(collections.deque)
+        self.command_values = {c.id: c.value for c in fixture.components}
+        self.device_values = dict(self.command_values)
+
+    def on_set_val(self, component_id, received_at):
+        with self.lock:
+            pending = self.pending_commands.get(component_id)
+            if pending:
+                self.latencies.append(received_at - pending.popleft())
+
+    def on_feed_value(self, user_id, component_id, value, received_at):
+        with self.lock:
+            pending = self.pending_reports.get((component_id, value))
+            if not pending:
+                return
+            for event in pending:
+                if user_id in event[1]:
+                    event[1].discard(user_id)
+                    self.latencies.append(received_at - event[0])
+                    break
+            while pending and not pending[0][1]:
+                pending.popleft()
+
+    async def send_command(self, i):
+        components = self.fixture.components
+        component = components[i % len(components)]
+        value = not self.command_values[component.id]
+        self.command_values[component.id] = value
+        with self.lock:
+            self.pending_commands[component.id].append(time.perf_counter())
+        await sync_to_async(
+            component.controller.send, thread_sensitive=True
+        )(value)
+
+    async def report_value(self, i):
+        components = self.fixture.components
+        component = components[i % len(components)]
+        value = not self.device_values[component.id]
+        self.device_values[component.id] = value
+        with self.lock:
+            self.pending_reports[(component.id, value)].append([
+                time.perf_counter(), {u.id for u in self.fixture.users}
+            ])
+        self.colonels[component.config['colonel']].report_value(
+            component.id, value
+        )
+
+    async def run_phase(self, emit, deliveries_per_event):
+        with self.lock:
+            self.latencies = []
+        for stats in self.hot_paths.values():
+            stats.reset()
+        cpu = {name: read_cpu_seconds(pid) for name, pid in self.pids.items()}
+        queries = {
+            name: counter.get() for name, counter in self.queries.items()
+        }
+
+        started = time.perf_counter()
+        for i in range(self.events):
+            if self.rate:
+                await asyncio.sleep(
+                    max(0, started + i / self.rate - time.perf_counter())
+                )
+            await emit(i)
+        expected = self.events * deliveries_per_event
+        deadline = time.perf_counter() + self.timeout
+        while len(self.latencies) < expected \
+        and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        duration = time.perf_counter() - started
+
+        cpu_report = {}
+        for name, pid in self.pids.items():
+            after = read_cpu_seconds(pid)
+            if after is None or cpu[name] is None:
+                cpu_report[name] = None
+                continue
+            cpu_report[name] = {
+                'seconds': round(after - cpu[name], 3),
+                'percent': round((after - cpu[name]) / duration * 100, 1),
+            }
+        with self.lock:
+            latencies = list(self.latencies)
+            self.pending_commands.clear()
+            self.pending_reports.clear()
+        return {
+            'events': self.events,
+            'expected_deliveries': expected,
+            'delivered': len(latencies),
+            'duration_s': round(duration, 3),
+            'latency_ms': summarize(latencies),
+            'db_queries_per_event': {
+                name: round((counter.get() - queries[name]) / self.events, 2)
+                for name, counter in self.queries.items()
+            },
+            'cpu': cpu_report,
+            'hot_paths': {
+                name: stats.report() for name, stats in self.hot_paths.items()
+            },
+        }
+
+    async def run(self):
+        self.colonels = {}
+        for colonel in self.fixture.colonels:
+            simulated = SimulatedColonel(
+                self, colonel, self.fixture.get_colonel_headers(colonel)
+            )
+            await simulated.connect(self.timeout)
+            self.colonels[colonel.id] = simulated
+        app_users = [
+            AppUser(self, user, self.fixture.instance.uid)
+            for user in self.fixture.users
+        ]
+        try:
+            for app_user in app_users:
+                app_user.connect()
+            for app_user in app_users:
+                if not await sync_to_async(
+                    app_user.subscribed.wait, thread_sensitive=False
+                )(self.timeout):
+                    raise CommandError("App user did not subscribe.")
+            # Consumers subscribe to gateway commands in the background
+            await asyncio.sleep(1)
+
+            phases = {}
+            phases['command_to_device'] = await self.run_phase(
+                self.send_command, 1
+            )
+            # Let stragglers of previous phase pass
+            await asyncio.sleep(1)
+            phases['device_to_app'] = await self.run_phase(
+                self.report_value, len(app_users)
+            )
+            return phases
+        finally:
+            for app_user in app_users:
+                app_user.disconnect()
+            for simulated in self.colonels.values():
+                await simulated.disconnect()
+
+
+class Command(BaseCommand):
+    help = (
+        "End to end load and latency benchmark against local mosquitto, "
+        "PostgreSQL and redis. Creates a throwaway instance, reports JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--colonels', type=int, default=5)
+        parser.add_argument(
+            '--components', type=int, default=50,
+            help='Switches, spread evenly over colonels.'
+        )
+        parser.add_argument('--app-users', type=int, default=10)
+        parser.add_argument(
+            '--events', type=int, default=200, help='Events per phase.'
+        )
+        parser.add_argument(
+            '--rate', type=float, default=20,
+            help='Events per second, 0 to emit them as fast as possible.'
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=10,
+            help='Seconds to wait for outstanding deliveries of a phase.'
+        )
+        parser.add_argument(
+            '--watch-pid', action='append', default=[], metavar='NAME=PID',
+            help='Report CPU usage of other processes as well, '
+                 'e.g. gateways=1234. Can be given multiple times.'
+        )
+        parser.add_argument(
+            '--output', help='Write report to a file instead of stdout.'
+        )
+
+    def handle(self, *args, **options):
+        if options['colonels'] < 1 or options['components'] < 1 \
+        or options['app_users'] < 1 or options['events'] < 1:
+            raise CommandError("Everything has to be at least 1.")
+        pids = {'benchmark': os.getpid()}
+        for item in options['watch_pid']:
+            name, _, pid = item.partition('=')
+            if not pid.isdigit():
+                raise CommandError(f"Bad --watch-pid {item}, NAME=PID expected.")
+            pids[name] = int(pid)
+
+        queries = QueryCounter()
+        fanout_queries = QueryCounter()
+        hot_paths = {name: CallStats() for owner, attr, name in HOT_PATHS}
+
+        # Child must not share connections of this process
+        connections.close_all()
+        fanout = multiprocessing.get_context('fork').Process(
+            target=run_fanout, args=(fanout_queries, hot_paths),
+            name='benchmark-fanout', daemon=True
+        )
+        fanout.start()
+        pids['fanout'] = fanout.pid
+
+        queries.install()
+        fixture = Fixture(
+            options['colonels'], options['components'], options['app_users']
+        )
+        started_at = datetime.datetime.now(datetime.timezone.utc)
+        try:
+            fixture.create()
+            benchmark = LoadBenchmark(
+                fixture, options, pids,
+                {'benchmark': queries, 'fanout': fanout_queries}, hot_paths
+            )
+            with contextlib.ExitStack() as stack:
+                for owner, attr, name in HOT_PATHS:
+                    if owner is run_app_mqtt_fanout.Command:
+                        continue
+                    stack.enter_context(mock.patch.object(
+                        owner, attr, hot_paths[name].wrap(getattr(owner, attr))
+                    ))
+                if options['verbosity'] < 2:
+                    # Consumers print every message
+                    devnull = stack.enter_context(open(os.devnull, 'w'))
+                    stack.enter_context(contextlib.redirect_stdout(devnull))
+                phases = async_to_sync(benchmark.run)()
+        finally:
+            os.kill(fanout.pid, signal.SIGINT)
+            fanout.join(10)
+            if fanout.is_alive():
+                fanout.terminate()
+            fixture.delete()
+
+        report = {
+            'started_at': started_at.isoformat(),
+            'options': {
+                key: options[key] for key in (
+                    'colonels', 'components', 'app_users', 'events', 'rate',
+                    'timeout',
+                )
+            },
+            'phases': phases,
+        }
+        report = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(report + '\n')
+            self.stderr.write(f"Report written to {options['output']}")
+        else:
+            self.stdout.write(report)
@@ -0,0 +1,91 @@
+import logging
+import threading
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+
+from simo.core import loggers
+from simo.core.management.commands.benchmark_load import summarize
+from simo.core.utils.logs import StreamToLogger
+
+
+class SlowHandler(logging.Handler):
+    """Stands in for a file handler on a slow disk."""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    def emit(self, record):
+        time.sleep(self.delay)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark log call latency of a device control loop, on its own "
+        "and while a script floods its stdout into a slow disk."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=500)
+        parser.add_argument(
+            '--write-ms', type=float, default=1,
+            help='Time it takes to write a single log line to disk.'
+        )
+
+    def handle(self, *args, **options):
+        pipeline = loggers.LogPipeline()
+        with mock.patch.object(loggers, 'log_pipeline', pipeline):
+            try:
+                self.run(options['iterations'], options['write_ms'] / 1000)
+            finally:
+                pipeline.stop()
+        self.stdout.write(
+            f"dropped {pipeline.dropped} of "
+            f"{pipeline.written + pipeline.dropped} records"
+        )
+
+    def run(self, iterations, write_seconds):
+        script_logger = self.get_logger('script', write_seconds)
+        loop_logger = self.get_logger('loop', write_seconds)
+        stdout = StreamToLogger(script_logger, logging.INFO)
+        stop = threading.Event()
+
+        def flood():
+            while not stop.is_set():
+                stdout.write('flooding output line\n')
+
+        def control_loop():
+            latencies = []
+            for i in range(iterations):
+                started = time.perf_counter()
+                loop_logger.info('tick %d', i)
+                latencies.append(time.perf_counter() - started)
+            return summarize(latencies)
+
+        self.report('quiet', control_loop())
+        flooder = threading.Thread(target=flood, daemon=True)
+        flooder.start()
+        try:
+            time.sleep(0.2)
+            self.report('flooded', control_loop())
+        finally:
+            stop.set()
+            flooder.join()
+
+    def get_logger(self, name, write_seconds):
+        logger = logging.getLogger(f'Benchmark Logger [{name}]')
+        logger.handlers = [
+            loggers.NonBlockingHandler(SlowHandler(write_seconds))
+        ]
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        return logger
+
+    def report(self, name, stats):
+        self.stdout.write(
+            f"{name:<8} log call p50 {stats['p50'] * 1000:8.1f}us "
+            f"p99 {stats['p99'] * 1000:8.1f}us "
+            f"max {stats['max'] * 1000:8.1f}us"
+        )
@@ -0,0 +1,57 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from simo.core import throttling
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark per request overhead of adaptive throttling against "
+        "configured cache: a call per key versus a single atomic script."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=1000,
+            help='Keep it below scope limits, banned requests are cheaper.'
+        )
+        parser.add_argument('--scope', default='benchmark')
+
+    def handle(self, *args, **options):
+        client = throttling._get_redis_client()
+        if client is None:
+            raise CommandError("Default cache is not redis.")
+
+        user = mock.Mock(is_authenticated=True, id=-1)
+        request = throttling.SimpleRequest(user=user, meta={})
+        subject = throttling._subject(request)
+        counters = throttling._get_counters(subject, options['scope'], True)
+        n = options['requests']
+
+        paths = (
+            ('per key', lambda: throttling._check_throttle_per_key(
+                subject, counters
+            ), 1 + 2 * len(counters)),
+            ('atomic', lambda: throttling._check_throttle_atomic(
+                client, subject, counters
+            ), 1),
+        )
+        for name, check, round_trips in paths:
+            self.clear(subject, counters)
+            started = time.perf_counter()
+            for i in range(n):
+                check()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{name:<8} {elapsed / n * 1000000:8.1f}us per request, "
+                f"{round_trips} round trips"
+            )
+        self.clear(subject, counters)
+
+    def clear(self, subject, counters):
+        cache.delete_many(
+            [throttling._ban_key(subject)] + [c[0] for c in counters]
+        )
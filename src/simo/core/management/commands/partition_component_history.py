@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from simo.core import history_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert component history table to monthly range partitions "
+        "(PostgreSQL only). Stop SIMO.io services before running it, "
+        "the table is locked while existing rows are being moved."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead', type=int,
+            default=history_partitions.MONTHS_AHEAD,
+            help='How many upcoming months to create partitions for.'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Partitioning is only supported on PostgreSQL.")
+        if history_partitions.is_partitioned():
+            created = history_partitions.ensure_partitions(
+                options['months_ahead']
+            )
+            self.stdout.write(
+                f"Already partitioned, created {len(created)} new partitions."
+            )
+            return
+        history_partitions.convert_to_partitioned(options['months_ahead'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Component history partitioned into "
+            f"{len(history_partitions.get_partitions())} partitions."
+        ))
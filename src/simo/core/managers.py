@@ -3,7 +3,8 @@ import traceback
 from actstream.managers import ActionManager as OrgActionManager
 from .middleware import get_current_instance
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Prefetch
 
 
 class ActionManager(OrgActionManager):
@@ -93,4 +94,66 @@ class ComponentsManager(models.Manager):
         for gateway, send_vals in gateway_components.items():
             GatewayObjectCommand(gateway, bulk_send=send_vals).publish(
                 retain=False
-            )
\ No newline at end of file
+            )
+
+    def bulk_set_alive(self, components, alive):
+        """
+        Set alive state of many components at once.
+
+        Performs a single UPDATE, records history in bulk and publishes
+        the same change events that Component.save() would, in one go
+        after the transaction is committed.
+        :param components: iterable of components or their ids
+        :return: list of components whose alive state was changed
+        """
+        from .models import Component, ComponentHistory
+        from .events import publish_component_change
+
+        ids = [getattr(c, 'id', c) for c in components]
+        if not ids:
+            return []
+
+        now = timezone.now()
+        with transaction.atomic():
+            changed = list(
+                Component.all_objects.filter(
+                    id__in=ids, alive=not alive
+                ).select_related(
+                    'zone__instance', 'gateway'
+                ).prefetch_related(Prefetch(
+                    'masters',
+                    queryset=Component.all_objects.select_related(
+                        'zone__instance'
+                    )
+                )).select_for_update(of=('self',))
+            )
+            if not changed:
+                return []
+            Component.all_objects.filter(
+                id__in=[comp.id for comp in changed]
+            ).update(alive=alive, last_change=now)
+            ComponentHistory.objects.bulk_create([
+                ComponentHistory(
+                    component=comp, type='value', value=comp.value,
+                    alive=alive
+                ) for comp in changed
+            ])
+
+            events = []
+            for comp in changed:
+                dirty_fields_prev = {
+                    'alive': comp.alive, 'last_change': comp.last_change
+                }
+                comp.alive = alive
+                comp.last_change = now
+                events.append(
+                    (comp, comp._build_change_event_context(dirty_fields_prev))
+                )
+
+            def publish_events():
+                for comp, context in events:
+                    publish_component_change(comp, context)
+
+            transaction.on_commit(publish_events)
+
+        return changed
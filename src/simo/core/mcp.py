@@ -6,13 +6,13 @@ from typing import Any, TypeAlias
 
 from pydantic import AliasChoices, BaseModel, ConfigDict, Field
 from concurrent.futures import ThreadPoolExecutor
-from asgiref.sync import sync_to_async
-from django.db import close_old_connections
 from django.utils import timezone
 from simo.mcp_server.app import mcp
+from simo.mcp_server.utils import run_sync
 from simo.users.utils import get_current_user, introduce_user, get_ai_user
 from simo.core.middleware import get_current_instance, introduce_instance
 from simo.core.throttling import check_throttle, SimpleRequest
+from .home_overview import get_structure_version, home_overview_snapshots
 from .models import Zone, Component, ComponentHistory
 
 log = logging.getLogger(__name__)
@@ -381,6 +381,44 @@ def _build_zone_overview(zone) -> dict:
         'components': component_map,
     }
 
+
+def _build_overview_snapshot(instance, version):
+    from simo.generic.controllers import Weather
+
+    zones = list(
+        Zone.objects.filter(instance=instance)
+        .prefetch_related('components', 'components__icon')
+        .order_by('order', 'id')
+    )
+
+    weather_component = (
+        Component.objects.filter(
+            zone__instance=instance,
+            controller_uid=Weather.uid,
+            config__is_main=True,
+        )
+        .select_related('zone')
+        .first()
+    )
+    main_house_state = (
+        Component.objects.filter(
+            zone__instance=instance,
+            base_type='state-select',
+            config__is_main=True,
+        )
+        .select_related('zone')
+        .first()
+    )
+    return home_overview_snapshots.put(
+        instance, version,
+        zones=[_build_zone_overview(zone) for zone in zones],
+        live_components={
+            'weather': weather_component,
+            'main_house_state': main_house_state,
+        }
+    )
+
+
 @mcp.tool(name="core.get_home_overview")
 async def get_home_overview() -> dict:
     """
@@ -391,38 +429,17 @@ async def get_home_overview() -> dict:
         raise PermissionError('No instance context')
 
     def _build(current_instance):
-        close_old_connections()
         try:
             introduce_instance(current_instance)
         except Exception:
             pass
 
-        from simo.generic.controllers import Weather
-
-        zones = list(
-            Zone.objects.filter(instance=current_instance)
-            .prefetch_related('components', 'components__icon')
-            .order_by('order', 'id')
-        )
-
-        weather_component = (
-            Component.objects.filter(
-                zone__instance=current_instance,
-                controller_uid=Weather.uid,
-                config__is_main=True,
-            )
-            .select_related('zone')
-            .first()
-        )
-        main_house_state = (
-            Component.objects.filter(
-                zone__instance=current_instance,
-                base_type='state-select',
-                config__is_main=True,
-            )
-            .select_related('zone')
-            .first()
-        )
+        version = get_structure_version(current_instance.id)
+        snapshot = home_overview_snapshots.get(current_instance.id, version)
+        if not snapshot:
+            snapshot = _build_overview_snapshot(current_instance, version)
+        weather_component = snapshot['live']['weather']
+        main_house_state = snapshot['live']['main_house_state']
 
         tz = pytz.timezone(current_instance.timezone)
         now = timezone.localtime(timezone.now(), tz)
@@ -436,10 +453,10 @@ async def get_home_overview() -> dict:
             'weather': _build_weather_summary(weather_component) if weather_component else None,
             'main_house_state': _build_main_component_summary(main_house_state) if main_house_state else None,
             'component_map_item_format': '#component_id|icon_slug|component_name',
-            'zones': [_build_zone_overview(zone) for zone in zones],
+            'zones': snapshot['zones'],
         }
 
-    return await sync_to_async(_build, thread_sensitive=True)(inst)
+    return await run_sync(_build, inst)
 
 @mcp.tool(name="core.query_components")
 async def query_components(
@@ -463,7 +480,6 @@ async def query_components(
     )
 
     def _load(current_instance):
-        close_old_connections()
         try:
             introduce_instance(current_instance)
         except Exception:
@@ -497,7 +513,7 @@ async def query_components(
             'components': [_build_query_component_summary(component) for component in components],
         }
 
-    return await sync_to_async(_load, thread_sensitive=True)(inst)
+    return await run_sync(_load, inst)
 
 
 @mcp.tool(name="core.get_component_value_change_history")
@@ -516,7 +532,6 @@ async def get_component_value_change_history(
         raise PermissionError('No instance context')
 
     def _load(_start: int, _end: int, _ids: str, current_instance):
-        close_old_connections()
         try:
             introduce_instance(current_instance)
         except Exception:
@@ -554,7 +569,7 @@ async def get_component_value_change_history(
             })
         return history
 
-    return await sync_to_async(_load, thread_sensitive=True)(start, end, component_ids, inst)
+    return await run_sync(_load, start, end, component_ids, inst)
 
 
 @mcp.tool(name="core.execute_component_methods")
@@ -581,7 +596,6 @@ async def execute_component_methods(
     then correlate each reply without additional bookkeeping.
     """
     def _execute():
-        close_old_connections()
         log.debug(f"Execute component methods: {operations}")
         current_user = get_current_user()
         if not current_user:
@@ -655,7 +669,7 @@ async def execute_component_methods(
             results = list(executor.map(_run, operations))
         return results
 
-    return await sync_to_async(_execute, thread_sensitive=True)()
+    return await run_sync(_execute)
 
 
 @mcp.tool(name="core.update_ai_memory")
@@ -668,7 +682,6 @@ async def update_ai_memory(text):
         raise PermissionError('No instance context')
 
     def _execute(text, current_instance):
-        close_old_connections()
         try:
             introduce_instance(current_instance)
         except Exception:
@@ -676,7 +689,7 @@ async def update_ai_memory(text):
         current_instance.ai_memory = text
         current_instance.save(update_fields=['ai_memory'])
 
-    return await sync_to_async(_execute, thread_sensitive=True)(text, inst)
+    return await run_sync(_execute, text, inst)
 
 
 @mcp.tool(name="core.get_unix_timestamp")
@@ -39,11 +39,9 @@ def drop_current_instance(request=None):
 
 
 def get_current_instance(request=None):
-    from simo.core.models import Instance
+    from .instance_cache import get_instance_by_id
     if request and request.session.get('instance_id'):
-        instance = Instance.objects.filter(
-            id=request.session['instance_id'], is_active=True
-        ).first()
+        instance = get_instance_by_id(request.session['instance_id'])
         if not instance:
             del request.session['instance_id']
         else:
@@ -100,23 +98,20 @@ def instance_middleware(get_response):
                 finally:
                     _current_instance.reset(token)
 
-        from simo.core.models import Instance
+        from .instance_cache import get_instance_by_slug, get_instance_by_uid
 
         instance = None
         # Allow selecting instance via admin query parameter for deep-links
         if request.path.startswith('/admin') and request.GET.get('instance_uid'):
-            i = Instance.objects.filter(
-                uid=request.GET.get('instance_uid'), is_active=True
-            ).first()
+            i = get_instance_by_uid(request.GET.get('instance_uid'))
             if i:
                 instance = i
                 introduce_instance(instance, request)
         # API calls
         if request.resolver_match:
-            instance = Instance.objects.filter(
-                slug=request.resolver_match.kwargs.get('instance_slug'),
-                is_active=True
-            ).first()
+            instance = get_instance_by_slug(
+                request.resolver_match.kwargs.get('instance_slug')
+            )
 
         if not instance:
             instance = get_current_instance(request)
@@ -128,13 +123,14 @@ def instance_middleware(get_response):
 
         if instance:
             introduce_instance(instance, request)
-            try:
-                # should never, but just in case
-                tz = pytz.timezone(instance.timezone)
-                timezone.activate(tz)
-            except:
-                tz = pytz.timezone('UTC')
-                timezone.activate(tz)
+            tz = getattr(instance, 'tzinfo', None)
+            if tz is None:
+                try:
+                    # should never, but just in case
+                    tz = pytz.timezone(instance.timezone)
+                except:
+                    tz = pytz.timezone('UTC')
+            timezone.activate(tz)
 
         try:
             response = get_response(request)
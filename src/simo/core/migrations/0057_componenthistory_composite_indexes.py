@@ -0,0 +1,30 @@
+# Generated by Django 4.2.10 on 2026-10-19 10:12
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Component history is the largest table, indexes are built
+    # without blocking writes to it during an upgrade.
+    atomic = False
+
+    dependencies = [
+        ('core', '0056_component_breach_delay'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='componenthistory',
+            index=models.Index(
+                fields=['component', 'type', 'date'],
+                name='core_comphist_comp_type_date',
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='componenthistory',
+            index=models.Index(
+                fields=['component', 'date'], name='core_comphist_comp_date',
+            ),
+        ),
+    ]
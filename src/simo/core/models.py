@@ -919,6 +919,17 @@ class ComponentHistory(models.Model):
 
     class Meta:
         ordering = '-date',
+        indexes = [
+            # Practically every history lookup is for a date range of
+            # a single component, most of them also of a single type.
+            models.Index(
+                fields=['component', 'type', 'date'],
+                name='core_comphist_comp_type_date'
+            ),
+            models.Index(
+                fields=['component', 'date'], name='core_comphist_comp_date'
+            ),
+        ]
 
 
 class HistoryAggregate(models.Model):
@@ -1,7 +1,8 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS, IsAuthenticated
 from django.http import Http404
 from .middleware import introduce_instance
-from .models import Instance, Category, Zone, Component
+from .instance_cache import get_instance_by_slug
+from .models import Category, Zone, Component
 
 
 class InstancePermission(BasePermission):
@@ -13,10 +14,9 @@ class InstancePermission(BasePermission):
 
         instance = getattr(view, 'instance', None)
         if not instance:
-            instance = Instance.objects.filter(
-                slug=request.resolver_match.kwargs.get('instance_slug'),
-                is_active=True
-            ).first()
+            instance = get_instance_by_slug(
+                request.resolver_match.kwargs.get('instance_slug')
+            )
 
         if not instance:
             raise Http404()
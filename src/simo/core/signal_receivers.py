@@ -14,6 +14,13 @@ from .models import (
 )
 
 
+@receiver(post_save, sender=Instance)
+@receiver(post_delete, sender=Instance)
+def invalidate_instance_cache(sender, instance, *args, **kwargs):
+    from .instance_cache import invalidate
+    invalidate()
+
+
 @receiver(post_save, sender=Instance)
 def create_instance_defaults(sender, instance, created, **kwargs):
     if not created:
@@ -199,32 +206,30 @@ def post_save_actions_dispatcher(sender, instance, created, **kwargs):
 @receiver(post_save, sender=Gateway)
 def post_save_change_events(sender, instance, created, **kwargs):
     target = instance
-    from .events import ObjectChangeEvent, dirty_fields_to_current_values
+    from .events import (
+        ObjectChangeEvent, dirty_fields_to_current_values,
+        publish_component_change
+    )
 
     if isinstance(target, Component):
+        if created:
+            instance_id = target.zone.instance_id
+
+            def clear_api_cache():
+                from simo.users.models import bump_roles_cache_version
+                cache.delete(f"main-components-{instance_id}")
+                # Cached roles hold component permissions of the instance
+                bump_roles_cache_version(instance_id)
+
+            transaction.on_commit(clear_api_cache)
+
         context = getattr(target, '_pending_change_event', None)
         target._pending_change_event = None
         if not context:
             return
 
         def post_update_component():
-            ObjectChangeEvent(
-                target.zone.instance,
-                target,
-                dirty_fields=context['dirty_fields'],
-                actor=context.get('actor'),
-                actor_type=context.get('actor_type'),
-                actor_user_id=context.get('actor_user_id'),
-                actor_instance_user_id=context.get('actor_instance_user_id'),
-                **context['component']
-            ).publish()
-            for master_ctx in context['masters']:
-                master = master_ctx['component']
-                ObjectChangeEvent(
-                    master.zone.instance,
-                    master,
-                    **master_ctx['data']
-                ).publish()
+            publish_component_change(target, context)
 
         transaction.on_commit(post_update_component)
         return
@@ -247,15 +252,46 @@ def post_save_change_events(sender, instance, created, **kwargs):
 
     transaction.on_commit(post_update)
 
-    if created and isinstance(instance, Component):
-        def clear_api_cache():
-            cache.delete(f"main-components-{instance.zone.instance.id}")
-            from simo.users.models import User
-            for user in User.objects.all():
-                role_cache_key = f'user-{user.id}_instance-' \
-                                 f'{instance.zone.instance.id}_role'
-                cache.delete(role_cache_key)
-        transaction.on_commit(clear_api_cache)
+
+@receiver(post_save, sender=Zone)
+@receiver(post_delete, sender=Zone)
+@receiver(post_save, sender=Component)
+@receiver(post_delete, sender=Component)
+def invalidate_home_overview(sender, instance, created=False, **kwargs):
+    from .home_overview import STRUCTURE_FIELDS, bump_structure_version
+
+    if isinstance(instance, Zone):
+        instance_ids = {instance.instance_id}
+    else:
+        zone_ids = {instance.zone_id}
+        if kwargs['signal'] is post_save and not created:
+            dirty_fields = instance.get_dirty_fields(check_relationship=True)
+            if not any(f in dirty_fields for f in STRUCTURE_FIELDS):
+                return
+            # component moved from other zone, maybe even other instance
+            if dirty_fields.get('zone'):
+                zone_ids.add(dirty_fields['zone'])
+        instance_ids = set(Zone.objects.filter(
+            pk__in=zone_ids
+        ).values_list('instance_id', flat=True))
+
+    def bump_versions():
+        for instance_id in instance_ids:
+            bump_structure_version(instance_id)
+
+    transaction.on_commit(bump_versions)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_dynamic_settings(sender, instance, **kwargs):
+    meta = getattr(instance, '_meta', None)
+    if not meta or meta.app_label != 'dynamic_preferences':
+        return
+    if getattr(sender, '__name__', '') != 'GlobalPreferenceModel':
+        return
+    from simo.conf import dynamic_settings
+    dynamic_settings.invalidate()
 
 
 @receiver(post_save)
@@ -15,6 +15,7 @@ from simo.users.utils import introduce_user
 from simo.core.throttling import check_throttle, SimpleRequest
 from simo.core.models import Component, Gateway
 from simo.core.utils.model_helpers import get_log_file_path
+from simo.core.log_watcher import get_log_watcher
 from simo.core.middleware import introduce_instance
 
 
@@ -31,9 +32,9 @@ class SIMOWebsocketConsumer(WebsocketConsumer):
 
 @capture_socket_errors
 class LogConsumer(AsyncWebsocketConsumer):
-    log_file = None
     in_error = False
-    watch = True
+    watch_token = None
+    stream_task = None
 
     async def connect(self):
         obj_type = await sync_to_async(
@@ -76,8 +77,20 @@ class LogConsumer(AsyncWebsocketConsumer):
         self.log_file_path = await sync_to_async(
             get_log_file_path, thread_sensitive=True
         )(self.obj)
-        self.log_file = open(self.log_file_path)
-        lines = [l.rstrip('\n') for l in self.log_file]
+        loop = asyncio.get_running_loop()
+        self.new_lines = asyncio.Queue()
+
+        def on_new_lines(lines):
+            try:
+                loop.call_soon_threadsafe(self.new_lines.put_nowait, lines)
+            except RuntimeError:
+                # event loop is gone
+                pass
+
+        self.watch_token, head = get_log_watcher().subscribe(
+            self.log_file_path, on_new_lines
+        )
+        lines = head.splitlines()
 
         self.ansi_converter = Ansi2HTMLConverter()
 
@@ -102,34 +115,27 @@ class LogConsumer(AsyncWebsocketConsumer):
 
         await self.send(text_data=('<br>'.join(lines[-500:])))
 
-        asyncio.create_task(self.watch_log_file())
+        self.stream_task = asyncio.create_task(self.stream_log_lines())
 
-    async def watch_log_file(self):
-        while self.watch:
-            try:
-                line = self.log_file.readline()
-            except:
-                self.log_file_path = await sync_to_async(
-                    get_log_file_path, thread_sensitive=True
-                )(self.obj)
-                self.log_file = open(self.log_file_path)
-                continue
-            if not line:
-                await asyncio.sleep(0.3)
-                continue
-            line = self.ansi_converter.convert(line, full=False)
-            if '[ERROR]' in line:
-                self.in_error = True
-                line = '<div class="code-error">%s</div>' % line
-            else:
-                line = '<br>' + line
-                self.in_error = False
-            await self.send(text_data=line)
+    async def stream_log_lines(self):
+        while True:
+            for line in await self.new_lines.get():
+                line = self.ansi_converter.convert(line, full=False)
+                if '[ERROR]' in line:
+                    self.in_error = True
+                    line = '<div class="code-error">%s</div>' % line
+                else:
+                    line = '<br>' + line
+                    self.in_error = False
+                await self.send(text_data=line)
 
     async def disconnect(self, code):
-        if self.log_file:
-            self.log_file.close()
-            self.log_file = None
+        if self.watch_token:
+            get_log_watcher().unsubscribe(self.watch_token)
+            self.watch_token = None
+        if self.stream_task:
+            self.stream_task.cancel()
+            self.stream_task = None
 
 
 @capture_socket_errors
@@ -22,6 +22,7 @@ from simo.core.utils.version import get_simo_version
 from simo.core.middleware import introduce_instance, drop_current_instance
 from simo.users.models import PermissionsRole, InstanceUser, User
 from .models import Instance, Component, ComponentHistory, HistoryAggregate
+from . import history_partitions
 
 
 @celery_app.task
@@ -493,7 +494,20 @@ def clear_history():
                 break
             qs.model.objects.filter(id__in=ids).delete()
 
-    for instance in Instance.objects.all():
+    instances = list(Instance.objects.all())
+
+    if history_partitions.is_partitioned():
+        # Whole months past retention of every instance are dropped,
+        # whatever is left is cleaned up row by row below.
+        history_partitions.ensure_partitions()
+        if instances:
+            cutoff = timezone.now() - datetime.timedelta(
+                days=max(instance.history_days for instance in instances)
+            )
+            for name in history_partitions.drop_partitions_before(cutoff):
+                print(f"Dropped history partition {name}")
+
+    for instance in instances:
         print(f"Clear history of {instance}")
         introduce_instance(instance)
         old_times = timezone.now() - datetime.timedelta(days=instance.history_days)
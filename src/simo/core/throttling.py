@@ -3,9 +3,12 @@ from __future__ import annotations
 import hashlib
 import time
 from dataclasses import dataclass
+from functools import lru_cache
 
 from django.conf import settings
 from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from rest_framework.throttling import BaseThrottle
 
 
@@ -33,6 +36,7 @@ def _now() -> int:
     return int(time.time())
 
 
+@lru_cache(maxsize=None)
 def _hub_key() -> str:
     # Per-hub identifier for shared cache keys.
     # SECRET_KEY is per-installation and avoids DB access.
@@ -72,6 +76,7 @@ def _subject(request) -> str:
     return f'ip:{_get_client_ip(request)}'
 
 
+@lru_cache(maxsize=None)
 def _ban_seconds() -> int:
     cfg = getattr(settings, 'SIMO_THROTTLE', None)
     if isinstance(cfg, dict):
@@ -102,6 +107,7 @@ def _parse_rules(raw, fallback: tuple[ThrottleRule, ...]) -> tuple[ThrottleRule,
     return tuple(parsed) if parsed else fallback
 
 
+@lru_cache(maxsize=None)
 def _rules_for(scope: str) -> tuple[ThrottleRule, ...]:
     cfg = getattr(settings, 'SIMO_THROTTLE', None)
     if isinstance(cfg, dict):
@@ -114,6 +120,7 @@ def _rules_for(scope: str) -> tuple[ThrottleRule, ...]:
     return DEFAULT_RULES_DEFAULT_SCOPE
 
 
+@lru_cache(maxsize=None)
 def _rules_global() -> tuple[ThrottleRule, ...]:
     cfg = getattr(settings, 'SIMO_THROTTLE', None)
     if isinstance(cfg, dict) and cfg.get('global_rules') is not None:
@@ -121,6 +128,14 @@ def _rules_global() -> tuple[ThrottleRule, ...]:
     return DEFAULT_RULES_GLOBAL
 
 
+@receiver(setting_changed)
+def _clear_settings_caches(*, setting, **kwargs):
+    # Settings are parsed once per process, tests override them.
+    if setting in ('SIMO_THROTTLE', 'SECRET_KEY'):
+        for func in (_hub_key, _ban_seconds, _rules_for, _rules_global):
+            func.cache_clear()
+
+
 def _ban_key(subject: str) -> str:
     # Per-user-per-hub ban (across all scopes and instances).
     return f'simo:ban:{_hub_key()}:{subject}'
@@ -156,37 +171,106 @@ def _set_ban(subject: str) -> int:
     return seconds
 
 
-def check_throttle(*, request, scope: str) -> int:
-    """Return wait seconds (0 means allowed).
+# Ban check, all window counters and ban set in a single round trip.
+# KEYS: ban key, counter keys...
+# ARGV: now, ban seconds, then window seconds and limit of every counter.
+THROTTLE_SCRIPT = """
+local ban_until = tonumber(redis.call('GET', KEYS[1]))
+if ban_until and ban_until > tonumber(ARGV[1]) then
+    return ban_until - tonumber(ARGV[1])
+end
+for i = 2, #KEYS do
+    local count = redis.call('INCR', KEYS[i])
+    if count == 1 then
+        redis.call('EXPIRE', KEYS[i], ARGV[i * 2 - 1])
+    end
+    if count > tonumber(ARGV[i * 2]) then
+        redis.call(
+            'SET', KEYS[1], tonumber(ARGV[1]) + tonumber(ARGV[2]),
+            'EX', ARGV[2]
+        )
+        return tonumber(ARGV[2])
+    end
+end
+return 0
+"""
+
+_throttle_script = None
+
+
+def _get_redis_client():
+    """Raw redis client of default cache, None if it is not redis."""
+    get_client = getattr(getattr(cache, 'client', None), 'get_client', None)
+    if not callable(get_client):
+        return None
+    return get_client(write=True)
 
-    Fail-open behavior: if cache is down/unavailable, returns 0.
-    """
-    subject = _subject(request)
+
+def _get_counters(subject: str, scope: str, is_auth: bool):
+    counters = []
+    for sc, rules in (('global', _rules_global()), (scope, _rules_for(scope))):
+        for rule in rules:
+            limit = rule.limit_authenticated if is_auth else rule.limit_anonymous
+            counters.append((
+                _counter_key(subject, sc, rule.window_seconds),
+                rule.window_seconds, limit
+            ))
+    return counters
+
+
+def _check_throttle_atomic(client, subject: str, counters) -> int:
+    global _throttle_script
+    if _throttle_script is None:
+        _throttle_script = client.register_script(THROTTLE_SCRIPT)
+    keys = [cache.make_key(_ban_key(subject))]
+    args = [_now(), max(1, _ban_seconds())]
+    for key, window_seconds, limit in counters:
+        keys.append(cache.make_key(key))
+        args.extend((window_seconds, limit))
+    return int(_throttle_script(keys=keys, args=args, client=client))
+
+
+def _check_throttle_per_key(subject: str, counters) -> int:
     wait = _is_banned(subject)
     if wait:
         return wait
 
-    is_auth = _is_authenticated(request)
-    scopes_to_check = ('global', scope)
-
-    for sc in scopes_to_check:
-        rules = _rules_global() if sc == 'global' else _rules_for(sc)
-        for rule in rules:
-            limit = rule.limit_authenticated if is_auth else rule.limit_anonymous
-            key = _counter_key(subject, sc, rule.window_seconds)
-            try:
-                # Ensure key exists with TTL before incr.
-                cache.add(key, 0, timeout=rule.window_seconds)
-                count = cache.incr(key)
-            except Exception:
-                # Cache unavailable => don't block
-                continue
-            if int(count) > limit:
-                return _set_ban(subject)
+    for key, window_seconds, limit in counters:
+        try:
+            # Ensure key exists with TTL before incr.
+            cache.add(key, 0, timeout=window_seconds)
+            count = cache.incr(key)
+        except Exception:
+            # Cache unavailable => don't block
+            continue
+        if int(count) > limit:
+            return _set_ban(subject)
 
     return 0
 
 
+def check_throttle(*, request, scope: str) -> int:
+    """Return wait seconds (0 means allowed).
+
+    On redis cache the whole evaluation is a single atomic script call,
+    other cache backends (tests) fall back to a call per key.
+
+    Fail-open behavior: if cache is down/unavailable, returns 0.
+    """
+    subject = _subject(request)
+    counters = _get_counters(subject, scope, _is_authenticated(request))
+    try:
+        client = _get_redis_client()
+    except Exception:
+        return 0
+    if client is None:
+        return _check_throttle_per_key(subject, counters)
+    try:
+        return _check_throttle_atomic(client, subject, counters)
+    except Exception:
+        return 0
+
+
 class SimoAdaptiveThrottle(BaseThrottle):
     """DRF throttle using SIMO adaptive per-user bans."""
 
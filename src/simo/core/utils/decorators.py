@@ -1,5 +1,6 @@
 from functools import wraps
 
+from django.db import close_old_connections
 from django.middleware.csrf import CsrfViewMiddleware
 from django.views.decorators.csrf import csrf_exempt
 
@@ -60,3 +61,22 @@ def simo_csrf_exempt(view_func):
         return view_func(request, *args, **kwargs)
 
     return csrf_exempt(_wrapped)
+
+
+def with_db_connection(func):
+    """Recycle DB connection of calling thread around func, the way
+    Django does it per request.
+
+    For blocking code run on threads other than the request thread,
+    e.g. sync_to_async(thread_sensitive=False) executors.
+    """
+
+    @wraps(func)
+    def _wrapped(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return _wrapped
@@ -57,3 +57,19 @@ def dirty_fields_to_current_values(instance, dirty_fields):
         except (LookupError, AttributeError):
             current[field_name] = getattr(instance, field_name, None)
     return current
+
+
+class JSONBSet(models.Func):
+    """Set a single top level key of a JSONField in place.
+
+    Usable in ``QuerySet.update()`` to stamp many rows with a single query
+    without overwriting other keys that might have been changed meanwhile.
+    """
+    function = 'jsonb_set'
+    output_field = models.JSONField()
+
+    def __init__(self, field, key, value):
+        super().__init__(
+            field, models.Value('{%s}' % key),
+            models.Value(value, output_field=models.JSONField())
+        )
@@ -1,7 +1,9 @@
 import datetime
 import time
+import sys
 import json
 import threading
+import traceback
 from django.utils import timezone
 from simo.core.models import Component
 from simo.core.gateways import BaseObjectCommandsGatewayHandler
@@ -86,12 +88,9 @@ class FleetGatewayHandler(BaseObjectCommandsGatewayHandler):
 
     def watch_colonels_connection(self):
         from .models import Colonel
-        for colonel in Colonel.objects.filter(
-            socket_connected=True,
+        Colonel.objects.mark_disconnected(
             last_seen__lt=timezone.now() - datetime.timedelta(minutes=2)
-        ):
-            colonel.socket_connected = False
-            colonel.save()
+        )
 
     def push_discoveries(self):
         from .models import Colonel
@@ -147,8 +146,12 @@ class FleetGatewayHandler(BaseObjectCommandsGatewayHandler):
             self.remote_button_watchers = {}
         if not hasattr(self, 'remote_button_targets'):
             self.remote_button_targets = {}
+        if not hasattr(self, 'remote_button_dispatch'):
+            self.remote_button_dispatch = {}
         if not hasattr(self, 'remote_button_lock'):
             self.remote_button_lock = threading.RLock()
+        if not hasattr(self, 'remote_button_events_token'):
+            self.remote_button_events_token = None
 
     @staticmethod
     def _get_control_button_id(ctrl):
@@ -185,62 +188,126 @@ class FleetGatewayHandler(BaseObjectCommandsGatewayHandler):
         )
 
     def _build_remote_button_targets(self):
-        button_cache = {}
-        current_targets = {}
-
-        for component in self._get_button_control_components():
+        '''
+        :return: ({button_id: {(component_id, ctrl_no), ...}},
+                  {button_id: button}, {component_id: component})
+        '''
+        controls = []
+        for component in self._get_button_control_components().select_related(
+            'gateway', 'zone'
+        ):
             for ctrl_no, ctrl in enumerate(component.config.get('controls', [])):
                 button_id = self._get_control_button_id(ctrl)
                 if button_id is None:
                     continue
-                if button_id not in button_cache:
-                    button_cache[button_id] = Component.objects.filter(
-                        id=button_id
-                    ).first()
-                button = button_cache[button_id]
-                if not button:
-                    continue
-                if button.config.get('colonel') == component.config.get('colonel'):
-                    # button is on a same colonel, therefore colonel handles
-                    # all control actions and we do not need to do it here
-                    continue
-                if button.id not in current_targets:
-                    current_targets[button.id] = set()
-                current_targets[button.id].add((component.id, ctrl_no))
+                controls.append((component, ctrl_no, button_id))
 
-        return current_targets
+        buttons = Component.objects.select_related('zone').in_bulk(
+            {button_id for component, ctrl_no, button_id in controls}
+        )
+        current_targets = {}
+        components = {}
+        for component, ctrl_no, button_id in controls:
+            button = buttons.get(button_id)
+            if not button:
+                continue
+            if button.config.get('colonel') == component.config.get('colonel'):
+                # button is on a same colonel, therefore colonel handles
+                # all control actions and we do not need to do it here
+                continue
+            if button.id not in current_targets:
+                current_targets[button.id] = set()
+            current_targets[button.id].add((component.id, ctrl_no))
+            components[component.id] = component
+
+        return current_targets, {
+            button_id: buttons[button_id] for button_id in current_targets
+        }, components
 
     def watch_buttons(self, component=None):
+        '''
+        Rebuild dispatch table of remote buttons, that are not on the same
+        colonel as components they control, so button presses are
+        dispatched to prepared target components without any DB reads.
+        '''
         self._ensure_button_watch_state()
-        current_targets = self._build_remote_button_targets()
+        current_targets, buttons, components = \
+            self._build_remote_button_targets()
+
+        dispatch = {}
+        for button_id, targets in current_targets.items():
+            # lowest matching control of every target component
+            ctrl_numbers = {}
+            for component_id, ctrl_no in targets:
+                if ctrl_no < ctrl_numbers.get(component_id, ctrl_no + 1):
+                    ctrl_numbers[component_id] = ctrl_no
+            dispatch[button_id] = [
+                (components[component_id], ctrl_no)
+                for component_id, ctrl_no in sorted(ctrl_numbers.items())
+            ]
 
         with self.remote_button_lock:
-            previous_watchers = self.remote_button_watchers
             previous_targets = self.remote_button_targets
-            current_watchers = {}
-
-            for button_id in current_targets:
-                button = previous_watchers.pop(button_id, None)
-                if not button:
-                    button = Component.objects.filter(id=button_id).first()
-                if not button:
-                    continue
-                if (
-                    button_id not in previous_targets
-                    or previous_targets[button_id] != current_targets[button_id]
-                ):
+            for button_id, button in buttons.items():
+                if previous_targets.get(button_id) != current_targets[button_id]:
                     print(
                         f"Binding button {button} to "
                         f"{len(current_targets[button_id])} fleet control(s)!"
                     )
-                button.on_change(self.on_remote_button_change)
-                current_watchers[button_id] = button
+            self.remote_button_watchers = buttons
+            self.remote_button_targets = current_targets
+            self.remote_button_dispatch = dispatch
 
-            for button in previous_watchers.values():
-                button.on_change(None)
+        self._subscribe_to_component_events()
 
-            self.remote_button_watchers = current_watchers
-            self.remote_button_targets = current_targets
+    def _subscribe_to_component_events(self):
+        if self.remote_button_events_token is not None:
+            return
+        from simo.core.mqtt_hub import get_mqtt_hub
+        self.remote_button_events_token = get_mqtt_hub().subscribe(
+            'SIMO/obj-state/+/Component/+', self.on_component_event
+        )
+
+    def on_component_event(self, client, userdata, msg):
+        try:
+            component_id = int(msg.topic.split('/')[-1])
+            payload = json.loads(msg.payload)
+        except Exception:
+            return
+        if getattr(msg, 'retain', False):
+            return
+        dirty_fields = payload.get('dirty_fields') or {}
+
+        if 'config' in dirty_fields:
+            try:
+                if self._affects_remote_buttons(component_id):
+                    self.watch_buttons()
+            except Exception:
+                print(traceback.format_exc(), file=sys.stderr)
+            return
+
+        if 'value' not in dirty_fields:
+            return
+        button = self.remote_button_watchers.get(component_id)
+        if not button:
+            return
+        if payload.get('timestamp', 0) < time.time() - 10:
+            return
+        button.value = payload.get('value')
+        self.on_remote_button_change(button)
+
+    def _affects_remote_buttons(self, component_id):
+        if component_id in self.remote_button_watchers:
+            return True
+        if any(
+            component.id == component_id
+            for targets in self.remote_button_dispatch.values()
+            for component, ctrl_no in targets
+        ):
+            return True
+        return self._get_button_control_components().filter(
+            id=component_id
+        ).exists()
 
     def _dispatch_button_to_component(self, comp, btn, ctrl_no=None):
         controls = comp.config.get('controls', [])
@@ -274,20 +341,9 @@ class FleetGatewayHandler(BaseObjectCommandsGatewayHandler):
 
         self._ensure_button_watch_state()
         with self.remote_button_lock:
-            raw_targets = self.remote_button_targets.get(btn.id, set())
+            targets = self.remote_button_dispatch.get(btn.id, [])
 
-        if not raw_targets:
-            return
-
-        targets = {}
-        for component_id, ctrl_no in raw_targets:
-            if component_id not in targets or ctrl_no < targets[component_id]:
-                targets[component_id] = ctrl_no
-
-        for component_id, ctrl_no in sorted(targets.items()):
-            comp = Component.objects.filter(id=component_id).first()
-            if not comp:
-                continue
+        for comp, ctrl_no in targets:
             self._dispatch_button_to_component(comp, btn, ctrl_no=ctrl_no)
 
     def button_action(self, comp, btn):
@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from simo.core.management.commands.benchmark_load import Fixture, summarize
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark time to configured of colonels reconnecting at once, "
+        "like they do after hub restart, with cold and warm config cache. "
+        "Creates a throwaway instance which is removed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--colonels', type=int, default=12)
+        parser.add_argument(
+            '--components', type=int, default=8,
+            help='Switches per colonel.'
+        )
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        from simo.fleet import socket_consumers
+
+        if options['colonels'] < 1 or options['components'] < 1:
+            raise CommandError("Everything has to be at least 1.")
+        fixture = Fixture(
+            options['colonels'], options['colonels'] * options['components'],
+            app_users=0
+        )
+        try:
+            fixture.create()
+            consumers = []
+            for colonel in fixture.colonels:
+                consumer = socket_consumers.FleetConsumer()
+                consumer.colonel = colonel
+                consumer.instance = fixture.instance
+                consumers.append(consumer)
+
+            results = {'cold': [], 'warm': []}
+            for i in range(options['repeat']):
+                for colonel in fixture.colonels:
+                    socket_consumers.colonel_configs.pop(colonel.id, None)
+                for cache in ('cold', 'warm'):
+                    results[cache].append(asyncio.run(self.storm(consumers)))
+        finally:
+            for colonel in fixture.colonels:
+                socket_consumers.colonel_configs.pop(colonel.id, None)
+            fixture.delete()
+
+        self.stdout.write(
+            f"Reconnect storm of {options['colonels']} colonels with "
+            f"{options['components']} components each, time to configured:"
+        )
+        for cache, durations in results.items():
+            stats = summarize(durations)
+            self.stdout.write(
+                f"{cache:<5} mean {stats['mean']:8.1f}ms "
+                f"p50 {stats['p50']:8.1f}ms max {stats['max']:8.1f}ms"
+            )
+
+    async def storm(self, consumers):
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            consumer.get_config_data() for consumer in consumers
+        ])
+        return time.perf_counter() - started
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from simo.core.middleware import get_current_instance
 
 
@@ -13,6 +13,35 @@ class ColonelsManager(models.Manager):
             )
         return qs
 
+    def mark_disconnected(self, **filters):
+        """
+        Mark connected colonels matching given filters as disconnected
+        using a single UPDATE instead of saving them one by one.
+        :return: list of colonels that were marked as disconnected
+        """
+        from actstream import action
+
+        with transaction.atomic():
+            lost_colonels = list(
+                self.get_queryset().filter(
+                    socket_connected=True, **filters
+                ).select_related('instance').select_for_update(of=('self',))
+            )
+            if not lost_colonels:
+                return []
+            self.model.objects.filter(
+                id__in=[colonel.id for colonel in lost_colonels]
+            ).update(socket_connected=False)
+
+        for colonel in lost_colonels:
+            colonel.socket_connected = False
+            action.send(
+                colonel, target=colonel, verb='disconnected',
+                instance_id=colonel.instance.id,
+                action_type='colonel_status', value='disconnected'
+            )
+        return lost_colonels
+
 
 class ColonelPinsManager(models.Manager):
 
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fleet', '0060_voiceassistant_assistant_config'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='colonel',
+            name='config_version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Incremented every time colonel config is updated.'),
+        ),
+    ]
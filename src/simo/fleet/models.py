@@ -6,7 +6,9 @@ from actstream import action
 from django.core.exceptions import ValidationError
 from django.db import transaction
 from django.db import models
-from django.db.models.signals import post_save, pre_delete, post_delete
+from django.db.models.signals import (
+    post_save, pre_delete, post_delete, m2m_changed
+)
 from django.dispatch import receiver
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
@@ -147,6 +149,10 @@ class Colonel(DirtyFieldsMixin, models.Model):
 
     components = models.ManyToManyField(Component, editable=False)
     occupied_pins = models.JSONField(default=dict, blank=True)
+    config_version = models.PositiveIntegerField(
+        default=0, editable=False,
+        help_text="Incremented every time colonel config is updated."
+    )
 
     logs_stream = models.BooleanField(
         default=False, help_text="ATENTION! Causes serious overhead and "
@@ -171,9 +177,10 @@ class Colonel(DirtyFieldsMixin, models.Model):
 
     def save(self, *args, **kwargs):
         if 'socket_connected' in self.get_dirty_fields() and self.socket_connected:
-            for comp in self.components.all():
-                comp.alive = True
-                comp.save()
+            Component.objects.bulk_set_alive(
+                self.components.filter(alive=False).values_list('id', flat=True),
+                True
+            )
 
         if self.minor_upgrade_available and self.firmware_version == self.minor_upgrade_available:
             self.minor_upgrade_available = None
@@ -236,6 +243,11 @@ class Colonel(DirtyFieldsMixin, models.Model):
 
     def update_config(self):
         from .gateways import FleetGatewayHandler
+        Colonel.objects.filter(pk=self.pk).update(
+            config_version=models.F('config_version') + 1
+        )
+        self.refresh_from_db(fields=['config_version'])
+
         def publish_update():
             for gateway in Gateway.objects.filter(type=FleetGatewayHandler.uid):
                 GatewayObjectCommand(
@@ -246,29 +258,50 @@ class Colonel(DirtyFieldsMixin, models.Model):
 
     @transaction.atomic
     def rebuild_occupied_pins(self):
-        for pin in ColonelPin.objects.filter(colonel=self):
-            pin.occupied_by_id = None
-            pin.occupied_by_content_type = None
-            pin.save()
+        component_ct_id = ContentType.objects.get_for_model(Component).id
+        interface_ct_id = ContentType.objects.get_for_model(Interface).id
 
+        occupants = {}
         for component in self.components.all():
             try:
                 pins = component.controller._get_occupied_pins()
             except:
                 pins = []
             for no in pins:
-                pin, new = ColonelPin.objects.get_or_create(colonel=self, no=no)
-                pin.occupied_by = component
-                pin.save()
+                occupants[no] = (component_ct_id, component.id)
 
+        interface_pins = {}
         for interface in self.interfaces.all():
-            if interface.pin_a:
-                interface.pin_a.occupied_by = interface
-                interface.pin_a.save()
-            if interface.pin_b:
-                interface.pin_b.occupied_by = interface
-                interface.pin_b.save()
+            for pin_id in (interface.pin_a_id, interface.pin_b_id):
+                if pin_id:
+                    interface_pins[pin_id] = (interface_ct_id, interface.id)
+
+        changed = []
+        for pin in ColonelPin.objects.select_for_update().filter(colonel=self):
+            occupant = interface_pins.get(
+                pin.id, occupants.pop(pin.no, (None, None))
+            )
+            if occupant != (
+                pin.occupied_by_content_type_id, pin.occupied_by_id
+            ):
+                pin.occupied_by_content_type_id, pin.occupied_by_id = occupant
+                changed.append(pin)
+        if changed:
+            ColonelPin.objects.bulk_update(
+                changed, ['occupied_by_content_type', 'occupied_by_id']
+            )
 
+        # Pins that are not known to this colonel type yet
+        new_pins = []
+        for no, (ct_id, obj_id) in occupants.items():
+            pin = ColonelPin(
+                colonel=self, no=no, occupied_by_content_type_id=ct_id,
+                occupied_by_id=obj_id
+            )
+            pin.set_label()
+            new_pins.append(pin)
+        if new_pins:
+            ColonelPin.objects.bulk_create(new_pins)
 
     def move_to(self, other_colonel):
         self.restart()
@@ -326,7 +359,7 @@ class ColonelPin(models.Model):
                 return f"{self.label} - {interface.get_type_display()}"
         return self.label
 
-    def save(self, *args, **kwargs):
+    def set_label(self):
         if self.native:
             self.label = f'GPIO{self.no}'
         else:
@@ -334,6 +367,9 @@ class ColonelPin(models.Model):
             self.label = f'IO{no}'
         if self.note:
             self.label += ' | %s' % self.note
+
+    def save(self, *args, **kwargs):
+        self.set_label()
         return super().save(*args, **kwargs)
 
 
@@ -441,6 +477,26 @@ def post_component_save(sender, instance, created, *args, **kwargs):
 
 
 
+@receiver(m2m_changed, sender=Component.slaves.through)
+def post_component_slaves_change(sender, instance, action, reverse,
+                                 pk_set, **kwargs):
+    # Slaves are part of master device config on a colonel
+    if action == 'pre_clear':
+        related = instance.masters if reverse else instance.slaves
+        instance._cleared_slave_links = set(
+            related.values_list('id', flat=True)
+        )
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_cleared_slave_links', set())
+    ids = {instance.id} | set(pk_set or ())
+    Colonel.objects.filter(
+        id__in=Colonel.objects.filter(components__in=ids).values('id')
+    ).update(config_version=models.F('config_version') + 1)
+
+
 @receiver(pre_delete, sender=Component)
 def post_component_delete(sender, instance, *args, **kwargs):
     if not instance.controller_uid.startswith('simo.fleet'):
@@ -1,4 +1,5 @@
 import asyncio
+import copy
 import json
 import logging
 import pytz
@@ -8,15 +9,16 @@ import zlib
 import time
 import threading
 import uuid
-from logging.handlers import RotatingFileHandler
 from django.utils import timezone
 from django.conf import settings
 import paho.mqtt.client as mqtt
 from channels.generic.websocket import AsyncWebsocketConsumer
 from asgiref.sync import sync_to_async
 from simo.core.utils.model_helpers import get_log_file_path
+from simo.core.loggers import add_file_handler
 from simo.core.middleware import drop_current_instance
 from simo.core.utils.logs import capture_socket_errors
+from simo.core.utils.decorators import with_db_connection
 from simo.core.utils.mqtt import connect_with_retry, install_reconnect_handler
 from simo.core.utils import adpcm4
 from simo.core.events import GatewayObjectCommand, get_event_obj
@@ -27,6 +29,7 @@ from simo.users.models import Fingerprint
 
 from .gateways import FleetGatewayHandler
 from .models import Colonel
+from .utils import get_config_state, get_config_diff, get_config_values
 from .controllers import TTLock
 from .voice_assistant import VoiceAssistantSession, VoiceAssistantArbitrator
 
@@ -35,6 +38,16 @@ SPK_CHANNEL_ID = 1
 ADPCM_FRAME_FLAG = 0x80
 ADPCM_HEADER_SIZE = 6
 
+# {colonel_id: {'version': config_version,
+#               'modified': {component_id: last_modified, ...},
+#               'interfaces': {...},
+#               'devices': {component_id: device config without val}}}
+# Not every component change goes through Colonel.update_config(), so
+# entry is valid only while both version and components are the same.
+# Shared by worker threads of all consumers, so it holds plain data only,
+# never model instances.
+colonel_configs = {}
+
 
 @capture_socket_errors
 class FleetConsumer(AsyncWebsocketConsumer):
@@ -49,6 +62,12 @@ class FleetConsumer(AsyncWebsocketConsumer):
         self._arb = None
         self._mqtt_stop_event = None
         self._mic_adpcm_state = adpcm4.ImaAdpcmState()
+        # Colonel accepts incremental config updates
+        self.config_diffs = False
+        # Config state (see get_config_state) known to be on colonel
+        self.config_state = None
+        # Config state sent to colonel, but not yet confirmed by it
+        self.pending_config_state = None
 
 
     async def disconnect(self, code):
@@ -278,106 +297,158 @@ class FleetConsumer(AsyncWebsocketConsumer):
         await self.send_data({'command': 'ota_update', 'version': to_version})
 
     async def get_config_data(self):
-        self.colonel = await sync_to_async(
-            Colonel.objects.get, thread_sensitive=True
-        )(id=self.colonel.id)
-        hub_uid = await sync_to_async(
-            lambda: dynamic_settings['core__hub_uid'], thread_sensitive=True
-        )()
-
-        def get_instance_options():
-            return {
-                'instance_uid': self.instance.uid,
-                'instance_secret': self.instance.fleet_options.secret_key
-            }
-        instance_options = await sync_to_async(
-            get_instance_options, thread_sensitive=True
+        # Runs off the shared sync thread, so configs of many colonels
+        # reconnecting at once are built in parallel.
+        self.colonel, config_data = await sync_to_async(
+            with_db_connection(self._build_config_data),
+            thread_sensitive=False
         )()
+        return config_data
 
+    def _build_config_data(self):
+        colonel = Colonel.objects.get(id=self.colonel.id)
         config_data = {
             'devices': {}, 'interfaces': {},
             'settings': {
-                'name': self.colonel.name, 'hub_uid': hub_uid,
-                'logs_stream': self.colonel.logs_stream,
+                'name': colonel.name,
+                'hub_uid': dynamic_settings['core__hub_uid'],
+                'logs_stream': colonel.logs_stream,
                 'pwm_frequency': 0,
+                'instance_uid': self.instance.uid,
+                'instance_secret': self.instance.fleet_options.secret_key
             }
         }
-        config_data['settings'].update(instance_options)
-
-        def get_interfaces(colonel):
-            return list(colonel.interfaces.all().select_related(
-                'pin_a', 'pin_b'
-            ))
-        interfaces = await sync_to_async(get_interfaces, thread_sensitive=True)(
-            self.colonel
-        )
-        for interface in interfaces:
-            config_data['interfaces'][f'{interface.type}-{interface.no}'] = {
-                'pin_a': interface.pin_a.no, 'pin_b': interface.pin_b.no,
-            }
 
-        def get_components(colonel):
-            return list(
-                colonel.components.all().prefetch_related('slaves')
-            )
-        components = await sync_to_async(
-            get_components, thread_sensitive=True
-        )(self.colonel)
+        components = list(colonel.components.all())
+        modified = {comp.id: comp.last_modified for comp in components}
+        cached = colonel_configs.get(colonel.id)
+        if not cached or cached['version'] != colonel.config_version \
+        or cached['modified'] != modified:
+            cached = self._build_colonel_config(colonel)
+            colonel_configs[colonel.id] = cached
 
+        config_data['interfaces'] = copy.deepcopy(cached['interfaces'])
         service_suspended = is_service_suspended()
-
-        def get_comp_options(comp):
+        for comp in components:
+            device = cached['devices'].get(comp.id)
+            if device is None:
+                continue
+            try:
+                val = comp.controller._prepare_for_send(comp.value)
+            except:
+                print("Error preparing component config")
+                print(traceback.format_exc(), file=sys.stderr)
+                continue
             options = dict((comp.meta or {}).get('options') or {})
             options['controls_enabled'] = not service_suspended
-            return options
+            config_data['devices'][str(comp.id)] = dict(
+                copy.deepcopy(device), val=val, options=options
+            )
 
-        def get_comp_config(comp):
+        return colonel, config_data
+
+    def _build_colonel_config(self, colonel):
+        '''
+        Value independent part of colonel config, which stays valid for
+        as long as colonel config_version remains the same.
+        '''
+        interfaces = {}
+        for interface in colonel.interfaces.all().select_related(
+            'pin_a', 'pin_b'
+        ):
+            interfaces[f'{interface.type}-{interface.no}'] = {
+                'pin_a': interface.pin_a.no, 'pin_b': interface.pin_b.no,
+            }
+
+        devices = {}
+        modified = {}
+        for comp in colonel.components.all().select_related(
+            'zone__instance', 'gateway'
+        ).prefetch_related('slaves'):
+            modified[comp.id] = comp.last_modified
             try:
-                comp_config = {
+                device = {
                     'type': comp.controller.uid.split('.')[-1],
-                    'val': comp.controller._prepare_for_send(
-                        comp.value
-                    ),
                     'config': comp.controller._get_colonel_config()
                 }
                 if hasattr(comp.controller, 'family'):
-                    comp_config['family'] = comp.controller.family
+                    device['family'] = comp.controller.family
                 slaves = [
                     s.id for s in comp.slaves.all()
-                    if s.config.get('colonel') == self.colonel.id
+                    if s.config.get('colonel') == colonel.id
                 ]
                 if slaves:
-                    comp_config['slaves'] = slaves
-                comp_config['options'] = get_comp_options(comp)
-
-                config_data['devices'][str(comp.id)] = comp_config
+                    device['slaves'] = slaves
             except:
                 print("Error preparing component config")
                 print(traceback.format_exc(), file=sys.stderr)
-            else:
-                return comp_config
-
-        for component in components:
-
-            comp_config = components = await sync_to_async(
-                get_comp_config, thread_sensitive=True
-            )(component)
-
-            if not comp_config:
                 continue
+            devices[comp.id] = device
 
-            slaves = [
-                s.id for s in component.slaves.all()
-                if s.config.get('colonel') == self.colonel.id
-            ]
-            if slaves:
-                comp_config['slaves'] = slaves
-            comp_config['options'] = get_comp_options(component)
+        return {
+            'version': colonel.config_version, 'modified': modified,
+            'interfaces': interfaces, 'devices': devices
+        }
 
-            config_data['devices'][str(component.id)] = comp_config
+    async def push_config(self, colonel_state=None, full=False):
+        '''
+        Bring config of connected colonel up to date.
+
+        Colonels opt in to incremental updates by sending config_hash
+        (and optionally device_hashes, interfaces_hash and settings_hash)
+        along with get_config. Such colonels receive config_ok if nothing
+        has changed or update_devices with add/update/remove device configs
+        relative to base_hash. Both carry current values of devices
+        that are not sent over in full. A colonel that is unable to apply
+        update_devices (base_hash mismatch) asks for get_config without
+        config_hash to receive full set_config, otherwise it confirms
+        applied config with config_applied hash.
+        :param colonel_state: config state reported by colonel itself
+        :param full: send full config regardless of what colonel has
+        '''
+        config = await self.get_config_data()
+        compress = self.colonel.type != 'sentinel'
+        if not self.config_diffs:
+            await self.send_data({
+                'command': 'set_config', 'data': config
+            }, compress=compress)
+            return
 
+        state = get_config_state(config)
+        version = self.colonel.config_version
+        known = None if full else colonel_state or self.config_state
+        if known and known.get('hash') == state['hash']:
+            # Values might have changed while colonel was away
+            await self.send_data({
+                'command': 'config_ok', 'hash': state['hash'],
+                'version': version, 'values': get_config_values(config)
+            }, compress=compress)
+            self.config_state = state
+            self.pending_config_state = None
+            return
 
-        return config_data
+        if known and known.get('devices') is not None:
+            diff = get_config_diff(known, config, state)
+            await self.send_data({
+                'command': 'update_devices', 'base_hash': known['hash'],
+                'hash': state['hash'], 'version': version,
+                'values': get_config_values(
+                    config, exclude=set(diff['add']) | set(diff['update'])
+                ),
+                **diff
+            }, compress=compress)
+        else:
+            await self.send_data({
+                'command': 'set_config', 'data': config,
+                'hash': state['hash'], 'version': version
+            }, compress=compress)
+        self.pending_config_state = state
+
+    def config_applied(self, config_hash):
+        pending = self.pending_config_state
+        if pending and pending['hash'] == config_hash:
+            self.config_state = pending
+            self.pending_config_state = None
 
     def on_mqtt_message(self, client, userdata, msg):
         drop_current_instance()
@@ -408,12 +479,7 @@ class FleetConsumer(AsyncWebsocketConsumer):
                 if payload.get('command') == 'update_firmware':
                     asyncio.run(self.firmware_update(payload['to_version']))
                 elif payload.get('command') == 'update_config':
-                    async def send_config():
-                        config = await self.get_config_data()
-                        await self.send_data({
-                            'command': 'set_config', 'data': config
-                        }, compress=self.colonel.type != 'sentinel')
-                    asyncio.run(send_config())
+                    asyncio.run(self.push_config())
                 elif payload.get('command') == 'discover':
                     print(f"SEND discover command for {payload['type']}")
                     asyncio.run(self.send_data(payload))
@@ -455,11 +521,20 @@ class FleetConsumer(AsyncWebsocketConsumer):
                 if 'ping' not in data:
                     print(f"{self.colonel}: {text_data}")
                 if 'get_config' in data:
-                    config = await self.get_config_data()
-                    print("Send config: ", config)
-                    await self.send_data({
-                        'command': 'set_config', 'data': config
-                    }, compress=self.colonel.type != 'sentinel')
+                    colonel_state = None
+                    if 'config_hash' in data:
+                        self.config_diffs = True
+                        colonel_state = {
+                            'hash': data['config_hash'],
+                            'devices': data.get('device_hashes'),
+                            'interfaces': data.get('interfaces_hash'),
+                            'settings': data.get('settings_hash'),
+                        }
+                    await self.push_config(
+                        colonel_state, full=colonel_state is None
+                    )
+                elif 'config_applied' in data:
+                    self.config_applied(data['config_applied'])
                 elif 'comp' in data:
                     try:
                         try:
@@ -720,19 +795,9 @@ class FleetConsumer(AsyncWebsocketConsumer):
         )
         self.colonel_logger.handlers = []
         self.colonel_logger.propagate = False
-        formatter = logging.Formatter(
-            '%(asctime)s [%(levelname)s] %(message)s',
-            "%m-%d %H:%M:%S"
-        )
-        formatter.converter = \
-            lambda *args, **kwargs: timezone.localtime().timetuple()
-
         logfile_path = await sync_to_async(
             get_log_file_path, thread_sensitive=True
         )(self.colonel)
-        file_handler = RotatingFileHandler(
-            logfile_path, maxBytes=1024 * 1024,  # 1Mb
-            backupCount=3, encoding='utf-8'
+        add_file_handler(
+            self.colonel_logger, logfile_path, max_bytes=1024 * 1024  # 1Mb
         )
-        file_handler.setFormatter(formatter)
-        self.colonel_logger.addHandler(file_handler)
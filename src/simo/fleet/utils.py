@@ -1,3 +1,5 @@
+import hashlib
+import json
 from django.db import transaction, models
 from django.core.exceptions import ValidationError
 from django.contrib.contenttypes.models import ContentType
@@ -307,3 +309,80 @@ def get_all_control_input_choices():
     return get_cached_data(
         f'{instance.id}-fleet-control-inputs', get_control_input_choices, 10
     )
+
+
+def _hash(data):
+    return hashlib.sha1(
+        json.dumps(data, sort_keys=True, default=str).encode()
+    ).hexdigest()[:16]
+
+
+def get_config_state(config_data):
+    '''
+    Hashes of colonel config data as built by FleetConsumer.get_config_data.
+    Device values are not part of a config, they are only carried along.
+    :return: {'hash': config hash, 'devices': {device_id: device hash},
+              'interfaces': interfaces hash, 'settings': settings hash}
+    '''
+    devices = {
+        str(id): _hash({k: v for k, v in device.items() if k != 'val'})
+        for id, device in (config_data.get('devices') or {}).items()
+    }
+    interfaces = _hash(config_data.get('interfaces') or {})
+    settings = _hash(config_data.get('settings') or {})
+    return {
+        'hash': _hash({
+            'devices': devices, 'interfaces': interfaces, 'settings': settings
+        }),
+        'devices': devices, 'interfaces': interfaces, 'settings': settings,
+    }
+
+
+def get_config_values(config_data, exclude=()):
+    '''
+    Current device values of colonel config data, except of devices
+    listed in exclude.
+    '''
+    return {
+        id: device.get('val')
+        for id, device in (config_data.get('devices') or {}).items()
+        if id not in exclude
+    }
+
+
+def get_config_diff(old_state, config_data, new_state):
+    '''
+    Device level difference between config known to be on a colonel
+    (old_state) and current config.
+    Interfaces and settings are included only if they differ from
+    hashes in old_state. If colonel did not report some of these hashes,
+    they are included only when old config hash can not be reproduced
+    with current ones.
+    '''
+    old_devices = old_state.get('devices') or {}
+    new_devices = new_state['devices']
+    diff = {
+        'add': {}, 'update': {},
+        'remove': sorted(
+            (id for id in old_devices if id not in new_devices), key=int
+        ),
+    }
+    for id, device_hash in new_devices.items():
+        if id not in old_devices:
+            diff['add'][id] = config_data['devices'][id]
+        elif old_devices[id] != device_hash:
+            diff['update'][id] = config_data['devices'][id]
+
+    reported = {
+        key: old_state.get(key) for key in ('interfaces', 'settings')
+    }
+    unreported = [key for key, val in reported.items() if val is None]
+    if unreported and _hash({
+        'devices': old_devices,
+        **{key: val or new_state[key] for key, val in reported.items()}
+    }) == old_state.get('hash'):
+        unreported = []
+    for key, val in reported.items():
+        if key in unreported or (val is not None and val != new_state[key]):
+            diff[key] = config_data.get(key) or {}
+    return diff
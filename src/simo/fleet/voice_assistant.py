@@ -5,12 +5,10 @@ import sys
 import time
 import traceback
 import inspect
+import importlib
 from collections import deque
 from datetime import timedelta
 
-import websockets
-import lameenc
-from pydub import AudioSegment
 from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
@@ -28,6 +26,29 @@ SPK_CHANNEL_ID = 1
 ADPCM_FRAME_FLAG = 0x80
 ADPCM_HEADER_SIZE = 6
 
+# Audio and websocket libraries take long to import and are of no use to
+# most processes that import this module, see _get_lib().
+_NOT_LOADED = object()
+websockets = _NOT_LOADED
+lameenc = _NOT_LOADED
+AudioSegment = _NOT_LOADED
+
+
+def _get_lib(name):
+    """Imports module level library on first use, None if not installed."""
+    lib = globals()[name]
+    if lib is not _NOT_LOADED:
+        return lib
+    try:
+        if name == 'AudioSegment':
+            lib = importlib.import_module('pydub').AudioSegment
+        else:
+            lib = importlib.import_module(name)
+    except ImportError:
+        lib = None
+    globals()[name] = lib
+    return lib
+
 
 def _normalize_language(value):
     if not value:
@@ -390,6 +411,7 @@ class VoiceAssistantSession:
                     headers["language"] = lang
             except Exception:
                 pass
+            websockets = _get_lib('websockets')
             if not websockets:
                 raise RuntimeError("websockets library not available")
             print(f"VA WS CONNECT {ws_url}")
@@ -783,6 +805,7 @@ class VoiceAssistantSession:
         except Exception:
             pass
 
+        websockets = _get_lib('websockets')
         kwargs = {'max_size': 10 * 1024 * 1024}
         ws_params = inspect.signature(websockets.connect).parameters
         if 'additional_headers' in ws_params:
@@ -1457,6 +1480,7 @@ class VoiceAssistantSession:
                 await stream_queue.put(bytes(chunk))
 
     async def _encode_mp3(self, pcm_bytes: bytes):
+        lameenc = _get_lib('lameenc')
         if lameenc is None:
             loop = asyncio.get_running_loop()
             return await loop.run_in_executor(None, lambda: self._encode_mp3_pydub(pcm_bytes))
@@ -1476,6 +1500,7 @@ class VoiceAssistantSession:
             return await loop.run_in_executor(None, lambda: self._encode_mp3_pydub(pcm_bytes))
 
     def _encode_mp3_pydub(self, pcm_bytes: bytes):
+        AudioSegment = _get_lib('AudioSegment')
         if AudioSegment is None:
             return None
         audio = AudioSegment(data=pcm_bytes, sample_width=2, frame_rate=16000, channels=1)
@@ -1484,6 +1509,7 @@ class VoiceAssistantSession:
         return out.getvalue()
 
     async def _decode_mp3(self, mp3_bytes: bytes):
+        AudioSegment = _get_lib('AudioSegment')
         if AudioSegment is None:
             return None
         def _dec():
@@ -2369,6 +2369,55 @@ class MainState(StateSelect):
         return 'night'
 
 
+    def _get_next_check_time(self, last_sensor_action=None):
+        """
+        Timestamp of the next moment main state might change on its own,
+        when none of its inputs do. That is the nearest sunrise, sunset,
+        any of the configured hours or end of no action period.
+        """
+        from simo.automation.helpers import LocalSun
+        sun = LocalSun(self.component.zone.instance.location)
+        timezone.activate(self.component.zone.instance.timezone)
+        localtime = timezone.localtime()
+
+        hours = {0}
+        for key in (
+            'weekdays_morning_hour', 'weekends_morning_hour',
+            'sunday_thursday_night_hour', 'friday_saturday_night_hour',
+            'sleeping_phones_hour'
+        ):
+            try:
+                hour = int(self.component.config.get(key))
+            except Exception:
+                continue
+            if 0 <= hour <= 23:
+                hours.add(hour)
+
+        candidates = []
+        for days in (0, 1):
+            day = localtime + datetime.timedelta(days=days)
+            candidates.append(sun.get_sunrise_time(day))
+            candidates.append(sun.get_sunset_time(day))
+            for hour in hours:
+                try:
+                    candidates.append(timezone.make_aware(
+                        datetime.datetime.combine(day.date(), datetime.time(hour, 0)),
+                        timezone.get_current_timezone(),
+                    ))
+                except Exception:
+                    # hour does not exist on DST change day
+                    continue
+        candidates = [c.timestamp() for c in candidates]
+
+        away_on_no_action = self.component.config.get('away_on_no_action')
+        if away_on_no_action and last_sensor_action:
+            candidates.append(last_sensor_action + away_on_no_action * 60)
+
+        now = localtime.timestamp()
+        return min(
+            [c for c in candidates if c > now] or [now + 60 * 60]
+        ) + 1
+
     def _check_is_away(self, last_sensor_action):
         away_on_no_action = self.component.config.get('away_on_no_action')
         if not away_on_no_action:
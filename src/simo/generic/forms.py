@@ -1,5 +1,4 @@
 import os
-import librosa
 import tempfile
 from django import forms
 from django.forms import formset_factory
@@ -744,6 +743,7 @@ class AudioAlertConfigForm(BaseComponentForm):
             for chunk in self.cleaned_data['sound'].chunks():
                 temp_file.write(chunk)
 
+        import librosa
         try:
             self.cleaned_data['sound'].duration = int(
                 librosa.core.get_duration(sr=22050, filename=temp_path)
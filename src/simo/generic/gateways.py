@@ -6,6 +6,7 @@ import threading
 import traceback
 from django.conf import settings
 from django.utils import timezone
+from django.db.models import Q
 import paho.mqtt.client as mqtt
 from simo.core.models import Instance, Component
 from simo.core.middleware import introduce_instance, drop_current_instance
@@ -60,39 +61,99 @@ class GroupButtonsHandler:
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.group_buttons = {}
+        self.group_button_dispatch = {}
+        self.group_buttons_lock = threading.Lock()
+        self.group_events_token = None
         self.fade_directions = {}
 
-    def watch_groups(self):
+    def _get_group_components(self):
         from .controllers import DimmableLightsGroup, SwitchGroup
-        current_group_buttons = {}
-        for group_comp in Component.objects.filter(
+        return Component.objects.filter(
             controller_uid__in=(DimmableLightsGroup.uid, SwitchGroup.uid)
-        ):
+        )
+
+    def watch_groups(self):
+        '''
+        Rebuild dispatch table of group buttons, so button presses reach
+        their groups with a single DB read. Groups themselves are loaded
+        on every press, as their values change all the time.
+        '''
+        current_group_buttons = {}
+        for group_comp in self._get_group_components():
             for ctrl in group_comp.config.get('controls', []):
-                if ctrl['button'] not in current_group_buttons:
-                    current_group_buttons[ctrl['button']] = {group_comp.id}
+                try:
+                    btn_id = int(ctrl['button'])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if btn_id not in current_group_buttons:
+                    current_group_buttons[btn_id] = {group_comp.id}
                 else:
-                    current_group_buttons[ctrl['button']].add(group_comp.id)
-
-                if ctrl['button'] not in self.group_buttons:
-                    self.group_buttons[ctrl['button']] = set()
-                if group_comp.id not in self.group_buttons[ctrl['button']]:
-                    self.group_buttons[ctrl['button']].add(group_comp.id)
-                    btn = Component.objects.filter(id=ctrl['button']).first()
-                    if btn:
-                        btn.on_change(self.watch_group_button)
-
-        # remove groups and buttons that are no longer in use
-        for btn_id, groups in self.group_buttons.items():
-            if btn_id not in current_group_buttons:
-                self.group_buttons[btn_id] = set()
+                    current_group_buttons[btn_id].add(group_comp.id)
+
+        buttons = Component.objects.in_bulk(list(current_group_buttons))
+        dispatch = {}
+        for btn_id, group_ids in current_group_buttons.items():
+            if btn_id not in buttons:
                 continue
-            self.group_buttons[btn_id] = current_group_buttons[btn_id]
+            dispatch[btn_id] = (buttons[btn_id], sorted(group_ids))
+
+        with self.group_buttons_lock:
+            self.group_buttons = current_group_buttons
+            self.group_button_dispatch = dispatch
 
+        self._subscribe_to_group_events()
+
+    def _subscribe_to_group_events(self):
+        if self.group_events_token is not None:
+            return
+        from simo.core.mqtt_hub import get_mqtt_hub
+        self.group_events_token = get_mqtt_hub().subscribe(
+            'SIMO/obj-state/+/Component/+', self.on_group_event
+        )
+
+    def on_group_event(self, client, userdata, msg):
+        try:
+            component_id = int(msg.topic.split('/')[-1])
+            payload = json.loads(msg.payload)
+        except Exception:
+            return
+        if getattr(msg, 'retain', False):
+            return
+        dirty_fields = payload.get('dirty_fields') or {}
+
+        if 'config' in dirty_fields:
+            try:
+                if self._affects_group_buttons(component_id):
+                    self.watch_groups()
+            except Exception:
+                print(traceback.format_exc(), file=sys.stderr)
+            return
+
+        if 'value' not in dirty_fields:
+            return
+        entry = self.group_button_dispatch.get(component_id)
+        if not entry:
+            return
+        if payload.get('timestamp', 0) < time.time() - 10:
+            return
+        button = entry[0]
+        button.value = payload.get('value')
+        self.watch_group_button(button)
+
+    def _affects_group_buttons(self, component_id):
+        if component_id in self.group_buttons:
+            return True
+        if any(
+            component_id in group_ids
+            for button, group_ids in self.group_button_dispatch.values()
+        ):
+            return True
+        return self._get_group_components().filter(id=component_id).exists()
 
     def watch_group_button(self, button):
-        group_ids = self.group_buttons.get(button.id)
-        if not group_ids:
+        with self.group_buttons_lock:
+            entry = self.group_button_dispatch.get(button.id)
+        if not entry:
             return
 
         btn_type = button.config.get('btn_type', 'momentary')
@@ -100,10 +161,7 @@ class GroupButtonsHandler:
         if btn_type == 'momentary':
             if button.value not in ('click', 'double-click', 'down', 'up', 'hold'):
                 return
-            for g_id in group_ids:
-                group = Component.objects.filter(id=g_id).first()
-                if not group:
-                    continue
+            for group in self._load_groups(entry[1]):
                 if button.value == 'click':
                     group.toggle()
                 elif button.value == 'double-click':
@@ -123,12 +181,13 @@ class GroupButtonsHandler:
         else: # toggle
             if button.value not in ('down', 'up'):
                 return
-            for g_id in group_ids:
-                group = Component.objects.filter(id=g_id).first()
-                if not group:
-                    continue
+            for group in self._load_groups(entry[1]):
                 group.toggle()
 
+    def _load_groups(self, group_ids):
+        groups = Component.objects.in_bulk(group_ids)
+        return [groups[id] for id in group_ids if id in groups]
+
 
 # class AudioAlertsHandler:
 #
@@ -188,14 +247,18 @@ class GenericGatewayHandler(
         ('watch_alarm_clocks', 30),
         ('watch_watering', 60),
         ('low_battery_notifications', 60 * 60),
-        ('watch_main_states', 60),
         ('watch_groups', 60)
     )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.last_sensor_actions = {}
-        self.sensors_on_watch = {}
+        self.main_states = {}
+        self.main_state_due = {}
+        self.main_state_sensors = {}
+        self.main_state_lock = threading.RLock()
+        self.main_state_wakeup = threading.Event()
+        self.main_state_events_tokens = None
         self.sleep_is_on = {}
         self.last_set_state = None
         self.pulsing_switches = {}
@@ -254,6 +317,8 @@ class GenericGatewayHandler(
     def low_battery_notifications(self):
         from simo.notifications.utils import notify_users
         from simo.automation.helpers import be_or_not_to_be
+        from simo.core.utils.model_helpers import JSONBSet
+        from simo.users.models import InstanceUser
         for instance in Instance.objects.filter(is_active=True):
             timezone.activate(instance.timezone)
             hour = timezone.localtime().hour
@@ -263,6 +328,7 @@ class GenericGatewayHandler(
                 continue
 
             introduce_instance(instance)
+            low_battery_comps = []
             for comp in Component.objects.filter(
                     zone__instance=instance,
                     battery_level__isnull=False, battery_level__lt=20
@@ -272,18 +338,44 @@ class GenericGatewayHandler(
                                          last_warning)
                 if not notify:
                     continue
+                low_battery_comps.append(comp)
+
+            if not low_battery_comps:
+                continue
 
-                iusers = comp.zone.instance.instance_users.filter(
+            # Digest: every recipient gets a single notification
+            # covering all low battery components they can see.
+            recipients = {}
+            for iuser, comps in InstanceUser.get_readable_components(
+                instance.instance_users.filter(
                     is_active=True, role__is_owner=True
-                )
-                if iusers:
+                ).select_related('user', 'role'), low_battery_comps
+            ).items():
+                if comps:
+                    recipients.setdefault(tuple(comps), []).append(iuser)
+
+            for comps, iusers in recipients.items():
+                if len(comps) == 1:
+                    notify_users(
+                        'warning',
+                        f"Low battery ({comps[0].battery_level}%) on {comps[0]}",
+                        component=comps[0], instance_users=iusers
+                    )
+                else:
                     notify_users(
                         'warning',
-                        f"Low battery ({comp.battery_level}%) on {comp}",
-                        component=comp, instance_users=iusers
+                        f"Low battery on {len(comps)} devices",
+                        body='\n'.join(
+                            f"{comp}: {comp.battery_level}%" for comp in comps
+                        ),
+                        instance=instance, instance_users=iusers
                     )
-                comp.meta['last_battery_warning'] = time.time()
-                comp.save()
+
+            Component.all_objects.filter(
+                id__in=[comp.id for comp in low_battery_comps]
+            ).update(meta=JSONBSet(
+                'meta', 'last_battery_warning', time.time()
+            ))
 
 
     def run(self, exit):
@@ -333,6 +425,11 @@ class GenericGatewayHandler(
             daemon=True
         ).start()
 
+        threading.Thread(
+            target=self.watch_main_states, args=(exit,),
+            daemon=True
+        ).start()
+
         print("GATEWAY STARTED!")
         self.mqtt_client.loop_start()
         while not exit.is_set():
@@ -477,21 +574,6 @@ class GenericGatewayHandler(
         if state.config.get('away_on_no_action'):
             if i_id not in self.last_sensor_actions:
                 self.last_sensor_actions[i_id] = time.time()
-            if state.id not in self.sensors_on_watch:
-                self.sensors_on_watch[state.id] = {}
-            for sensor in Component.objects.filter(
-                zone__instance=state.zone.instance,
-                base_type='binary-sensor', alarm_category='security'
-            ):
-                if sensor.id not in self.sensors_on_watch[state.id]:
-                    # Register callback only when MQTT subscription succeeds
-                    try:
-                        sensor.on_change(self.security_sensor_change)
-                    except Exception:
-                        # Leave it untracked so we retry on next tick
-                        raise
-                    else:
-                        self.sensors_on_watch[state.id][sensor.id] = i_id
 
             if state.controller._check_is_away(self.last_sensor_actions.get(i_id, 0)):
                 if state.value != 'away':
@@ -525,22 +607,158 @@ class GenericGatewayHandler(
                     state.send(new_state)
 
 
-    def watch_main_states(self):
+    def build_main_states(self):
+        '''
+        Collect main states together with security sensors of their
+        instances and subscribe to changes of their inputs.
+        '''
         drop_current_instance()
         from .controllers import MainState
-        for state in Component.objects.filter(
-            controller_uid=MainState.uid
-        ).select_related('zone', 'zone__instance'):
+        states = {
+            state.id: state for state in Component.objects.filter(
+                controller_uid=MainState.uid
+            ).select_related('zone', 'zone__instance')
+        }
+        sensors = dict(Component.objects.filter(
+            zone__instance__in={s.zone.instance_id for s in states.values()},
+            base_type='binary-sensor', alarm_category='security'
+        ).values_list('id', 'zone__instance_id'))
+
+        with self.main_state_lock:
+            self.main_state_due = {state_id: 0 for state_id in states}
+            self.main_states = states
+            self.main_state_sensors = sensors
+        self.main_state_wakeup.set()
+
+        self._subscribe_to_main_state_events()
+
+    def _subscribe_to_main_state_events(self):
+        if self.main_state_events_tokens is not None:
+            return
+        from simo.core.mqtt_hub import get_mqtt_hub
+        hub = get_mqtt_hub()
+        self.main_state_events_tokens = [
+            hub.subscribe(
+                'SIMO/obj-state/+/Component/+',
+                self.on_main_state_component_event
+            ),
+            hub.subscribe(
+                'SIMO/obj-state/+/InstanceUser/+',
+                self.on_main_state_iuser_event
+            ),
+        ]
+
+    def _recheck_main_states(self, instance_id):
+        with self.main_state_lock:
+            for state_id, state in self.main_states.items():
+                if state.zone.instance_id == instance_id:
+                    self.main_state_due[state_id] = 0
+        self.main_state_wakeup.set()
+
+    def on_main_state_component_event(self, client, userdata, msg):
+        from .controllers import MainState
+        try:
+            component_id = int(msg.topic.split('/')[-1])
+            payload = json.loads(msg.payload)
+        except Exception:
+            return
+        if getattr(msg, 'retain', False):
+            return
+        dirty_fields = payload.get('dirty_fields') or {}
+
+        if {'config', 'alarm_category', 'base_type', 'zone'} & set(dirty_fields):
             try:
-                self.watch_main_state(state)
-            except Exception as e:
+                if component_id in self.main_states \
+                or component_id in self.main_state_sensors \
+                or Component.objects.filter(
+                    Q(controller_uid=MainState.uid)
+                    | Q(base_type='binary-sensor', alarm_category='security'),
+                    id=component_id
+                ).exists():
+                    self.build_main_states()
+            except Exception:
                 print(traceback.format_exc(), file=sys.stderr)
+            return
 
+        if 'value' not in dirty_fields:
+            return
+        instance_id = self.main_state_sensors.get(component_id)
+        if not instance_id:
+            return
+        self.last_sensor_actions[instance_id] = time.time()
+        self._recheck_main_states(instance_id)
 
-    def security_sensor_change(self, sensor):
-        self.last_sensor_actions[
-            sensor.zone.instance.id
-        ] = time.time()
+    def on_main_state_iuser_event(self, client, userdata, msg):
+        try:
+            instance_uid = msg.topic.split('/')[2]
+            payload = json.loads(msg.payload)
+        except Exception:
+            return
+        if getattr(msg, 'retain', False):
+            return
+        dirty_fields = payload.get('dirty_fields') or {}
+        if not {'at_home', 'phone_on_charge', 'is_active', 'role'} \
+        & set(dirty_fields):
+            return
+        for state in list(self.main_states.values()):
+            if state.zone.instance.uid == instance_uid:
+                self._recheck_main_states(state.zone.instance_id)
+                return
+
+    def update_main_state(self, state_id):
+        state = self.main_states.get(state_id)
+        if not state:
+            return
+        try:
+            state.refresh_from_db()
+            self.watch_main_state(state)
+            next_check = state.controller._get_next_check_time(
+                self.last_sensor_actions.get(state.zone.instance_id)
+            )
+        except Exception:
+            print(traceback.format_exc(), file=sys.stderr)
+            next_check = time.time() + 60
+        with self.main_state_lock:
+            if self.main_state_due.get(state_id) == 0 \
+            and state_id in self.main_states:
+                # inputs changed again while we were at it
+                return
+            if state_id in self.main_states:
+                self.main_state_due[state_id] = next_check
+
+    def watch_main_states(self, exit):
+        '''
+        Main state is recomputed only when one of its inputs changes
+        (security sensors, people at home, their phones, its own config)
+        or when it reaches the next time boundary of its schedule.
+        '''
+        drop_current_instance()
+        while not exit.is_set():
+            self.main_state_wakeup.clear()
+            if self.main_state_events_tokens is None:
+                try:
+                    self.build_main_states()
+                except Exception:
+                    print(traceback.format_exc(), file=sys.stderr)
+                    exit.wait(10)
+                    continue
+            now = time.time()
+            with self.main_state_lock:
+                due = [
+                    state_id for state_id, ts in self.main_state_due.items()
+                    if ts <= now
+                ]
+                for state_id in due:
+                    self.main_state_due[state_id] = now + 60
+            for state_id in due:
+                self.update_main_state(state_id)
+            with self.main_state_lock:
+                next_check = min(
+                    self.main_state_due.values(), default=now + 60
+                )
+            self.main_state_wakeup.wait(
+                min(max(next_check - time.time(), 0), 60)
+            )
 
 
     def watch_switch_pulses(self, exit):
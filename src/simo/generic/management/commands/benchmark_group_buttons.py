@@ -0,0 +1,117 @@
+import json
+import time
+import uuid
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.signals import post_save
+
+from simo.core.management.commands.benchmark_load import summarize
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark press-to-command latency of group buttons. Buttons and "
+        "groups are generated inside of a transaction which is always "
+        "rolled back, no commands are sent to real devices."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buttons', type=int, default=500)
+        parser.add_argument(
+            '--per-group', type=int, default=10,
+            help='Buttons controlling every group.'
+        )
+
+    def handle(self, *args, **options):
+        from simo.generic.controllers import SwitchGroup
+
+        with transaction.atomic():
+            buttons = self.generate(options['buttons'], options['per_group'])
+            latencies, queries = self.press(buttons, SwitchGroup)
+            transaction.set_rollback(True)
+
+        stats = summarize(latencies)
+        self.stdout.write(
+            f"{len(buttons)} group buttons, press-to-command latency: "
+            f"mean {stats['mean']:.3f}ms p50 {stats['p50']:.3f}ms "
+            f"p99 {stats['p99']:.3f}ms max {stats['max']:.3f}ms, "
+            f"{queries / len(buttons):.1f} queries per press"
+        )
+
+    def generate(self, count, per_group):
+        from simo.core.models import Instance, Zone, Component, Gateway
+        from simo.core.signal_receivers import create_instance_defaults
+        from simo.generic.controllers import SwitchGroup
+        from simo.generic.gateways import GenericGatewayHandler
+
+        uid = 'benchmark-' + uuid.uuid4().hex[:8]
+        post_save.disconnect(create_instance_defaults, sender=Instance)
+        try:
+            instance = Instance.objects.create(
+                uid=uid, name='Benchmark', slug=uid
+            )
+        finally:
+            post_save.connect(create_instance_defaults, sender=Instance)
+        self.instance = instance
+        zone = Zone.objects.create(instance=instance, name='Benchmark', order=0)
+        gateway, _ = Gateway.objects.get_or_create(
+            type=GenericGatewayHandler.uid
+        )
+        buttons = Component.objects.bulk_create([
+            Component(
+                name=f'Button {i}', zone=zone, category=None, gateway=gateway,
+                base_type='button', controller_uid='benchmark', config={},
+                meta={}, value='up',
+            ) for i in range(count)
+        ])
+        Component.objects.bulk_create([
+            Component(
+                name=f'Group {i}', zone=zone, category=None, gateway=gateway,
+                base_type='switch', controller_uid=SwitchGroup.uid,
+                config={'controls': [
+                    {'button': b.id}
+                    for b in buttons[i * per_group:(i + 1) * per_group]
+                ]}, meta={}, value=False,
+            ) for i in range((count + per_group - 1) // per_group)
+        ])
+        return buttons
+
+    def press(self, buttons, group_controller):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from simo.core.events import ObjectChangeEvent
+        from simo.generic.gateways import GroupButtonsHandler
+
+        handler = GroupButtonsHandler()
+        # Presses are fed in directly, not over MQTT
+        handler.group_events_token = 'benchmark'
+        handler.watch_groups()
+
+        messages = []
+        for button in buttons:
+            event = ObjectChangeEvent(
+                self.instance, button, value='click',
+                dirty_fields={'value': 'up'}
+            )
+            event.data['timestamp'] = time.time()
+            messages.append(SimpleNamespace(
+                topic=event.get_topic(), payload=json.dumps(event.data),
+                retain=False,
+            ))
+
+        latencies = []
+        pressed = {}
+
+        def send(controller, value):
+            latencies.append(time.perf_counter() - pressed['at'])
+
+        with mock.patch.object(
+            group_controller, 'send', autospec=True, side_effect=send
+        ), CaptureQueriesContext(connection) as ctx:
+            for msg in messages:
+                pressed['at'] = time.perf_counter()
+                handler.on_group_event(None, None, msg)
+        return latencies, len(ctx.captured_queries)
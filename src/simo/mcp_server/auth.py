@@ -1,7 +1,6 @@
 from typing import Any, Optional
-from asgiref.sync import sync_to_async
-from django.db import close_old_connections
 from simo.mcp_server.models import InstanceAccessToken
+from simo.mcp_server.utils import run_sync
 from simo.core.middleware import introduce_instance
 from fastmcp.server.auth.auth import AccessToken, TokenVerifier
 
@@ -12,7 +11,6 @@ class DjangoTokenVerifier(TokenVerifier):
     async def verify_token(self, token: str) -> Optional[AccessToken]:
 
         def _load():
-            close_old_connections()
             access_token = InstanceAccessToken.objects.select_related(
                 "instance"
             ).filter(
@@ -22,7 +20,7 @@ class DjangoTokenVerifier(TokenVerifier):
                 return
             return access_token
 
-        access_token = await sync_to_async(_load, thread_sensitive=True)()
+        access_token = await run_sync(_load)
         if not access_token:
             return None
 
@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from simo.core.models import Component
+from simo.mcp_server import utils
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark throughput of concurrent MCP tool calls: MCP worker "
+        "threads pool versus the single thread sensitive sync thread "
+        "(PostgreSQL only)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16],
+            help='Numbers of tool calls in flight to measure.'
+        )
+        parser.add_argument(
+            '--calls', type=int, default=200,
+            help='Tool calls per concurrency level.'
+        )
+        parser.add_argument(
+            '--query-ms', type=float, default=5,
+            help='Time every tool call spends waiting for the database.'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Benchmark requires PostgreSQL.")
+        self.query_seconds = options['query_ms'] / 1000
+        # Connection of this thread is not used by the workers
+        connection.close()
+
+        modes = (
+            ('pool', utils.run_sync),
+            ('sync thread', self.run_sync_thread_sensitive),
+        )
+        self.stdout.write(
+            f"{'concurrency':>11} " + ' '.join(
+                f"{name + ' calls/s':>18}" for name, run in modes
+            )
+        )
+        for concurrency in options['concurrency']:
+            results = [
+                asyncio.run(self.measure(run, concurrency, options['calls']))
+                for name, run in modes
+            ]
+            self.stdout.write(
+                f"{concurrency:>11} " + ' '.join(
+                    f"{result:>18.1f}" for result in results
+                )
+            )
+
+    async def run_sync_thread_sensitive(self, func, *args, **kwargs):
+        # How MCP tools were run before the workers pool
+        return await sync_to_async(func)(*args, **kwargs)
+
+    def tool(self):
+        # A query waiting on the database plus a regular ORM read
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_sleep(%s)", [self.query_seconds])
+        return list(Component.objects.values_list('id', 'value')[:50])
+
+    async def measure(self, run, concurrency, calls):
+        queue = asyncio.Queue()
+        for i in range(calls):
+            queue.put_nowait(i)
+
+        async def caller():
+            while not queue.empty():
+                queue.get_nowait()
+                await run(self.tool)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(caller() for i in range(concurrency)))
+        return calls / (time.perf_counter() - started)
@@ -0,0 +1,21 @@
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from simo.core.utils.decorators import with_db_connection
+
+
+# MCP requests run their blocking code on a bounded pool of worker threads
+# instead of the single thread-sensitive sync thread, so concurrent tool
+# calls do not queue behind each other. Every worker thread holds its own
+# DB connection which is recycled the same way Django does it per request.
+executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'SIMO_MCP_WORKERS', 8),
+    thread_name_prefix='mcp-worker',
+)
+
+
+async def run_sync(func, *args, **kwargs):
+    """Run blocking (ORM) code of MCP request on MCP worker threads pool."""
+    return await sync_to_async(
+        with_db_connection(func), thread_sensitive=False, executor=executor
+    )(*args, **kwargs)
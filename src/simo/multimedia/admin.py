@@ -1,4 +1,3 @@
-import librosa
 from datetime import timedelta
 from django.contrib import admin
 from .models import Sound
@@ -22,6 +21,7 @@ class SoundAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
         # need to keep it here as using admin interface skips post_save signals
+        import librosa
         try:
             obj.duration = int(
                 librosa.core.get_duration(
@@ -1,4 +1,3 @@
-import librosa
 import os
 from django.core.files.storage import FileSystemStorage
 from django import forms
@@ -1,4 +1,4 @@
-import os, librosa
+import os
 from django.urls import reverse
 from django.db import models
 from django.db.models.signals import post_save, post_delete
@@ -47,6 +47,7 @@ class Sound(models.Model):
 @receiver(post_save, sender=Sound)
 def determine_duration(sender, instance, created, **kwargs):
     if not instance.duration:
+        import librosa
         instance.duration = int(
             librosa.core.get_duration(
                 sr=22050, filename=instance.file.path
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from simo.core.middleware import get_current_instance
 from .models import Notification, UserNotification
+from .delivery import dispatch_notifications
 
 
 class UserNotificationInline(admin.TabularInline):
@@ -34,6 +35,5 @@ class NotificationAdmin(admin.ModelAdmin):
         return ', '.join([str(u) for u in obj.to_users.all()])
 
     def dispatch(self, request, queryset):
-        for item in queryset:
-            item.dispatch()
+        dispatch_notifications(queryset.select_related('instance'))
         self.message_user(request, "%d notifications were dispatched." % queryset.count())
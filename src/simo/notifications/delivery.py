@@ -0,0 +1,317 @@
+"""Push notifications delivery to SIMO.io postmaster.
+
+A single pooled HTTP session per process is used, so consecutive
+deliveries reuse the same keep-alive connection instead of doing a new
+HTTPS handshake for every notification.
+"""
+import datetime
+import logging
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from simo.conf import dynamic_settings
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULTS = {
+    'postmaster_url': 'https://simo.io/api/notifications/postmaster/',
+    'connect_timeout': 5,
+    'read_timeout': 15,
+    'max_attempts': 3,
+    'backoff_seconds': 0.5,
+    # Deliver every notification together with other ready ones that
+    # still have undelivered recipients in a single request.
+    # Requires postmaster that accepts {'notifications': [...]} payloads.
+    'batch': False,
+    'batch_size': 50,
+    # Undelivered notifications older than that are not picked up
+    'batch_max_age': 600,
+    # Notifications claimed by a batch that was not finished in that
+    # many seconds (worker died) are picked up again
+    'batch_claim_timeout': 300,
+}
+
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+
+
+def get_delivery_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'SIMO_NOTIFICATIONS', None) or {})
+    return config
+
+
+class DeliveryStats:
+    """Process-local delivery counters and latency metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.retries = 0
+            self.failures = 0
+            self.delivered = 0
+            self.latency_total = 0.0
+            self.latency_max = 0.0
+            self.latency_last = 0.0
+
+    def record(self, latency, delivered=0, retries=0, failed=False):
+        with self._lock:
+            self.requests += 1
+            self.retries += retries
+            self.delivered += delivered
+            if failed:
+                self.failures += 1
+            self.latency_total += latency
+            self.latency_last = latency
+            self.latency_max = max(self.latency_max, latency)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'failures': self.failures,
+                'delivered': self.delivered,
+                'latency_avg_ms': round(
+                    self.latency_total / self.requests * 1000, 2
+                ) if self.requests else None,
+                'latency_max_ms': round(self.latency_max * 1000, 2),
+                'latency_last_ms': round(self.latency_last * 1000, 2),
+            }
+
+
+delivery_stats = DeliveryStats()
+
+
+def get_delivery_stats():
+    return delivery_stats.as_dict()
+
+
+class PostmasterClient:
+    """Pooled, retrying HTTP client of SIMO.io postmaster."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+        self.batch_supported = True
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._session = session
+                self._pid = os.getpid()
+            return self._session
+
+    def _send(self, payload, config):
+        return self.session.post(
+            config['postmaster_url'], json=payload,
+            timeout=(config['connect_timeout'], config['read_timeout'])
+        )
+
+    def post(self, payload, delivered=1):
+        """
+        Post payload to postmaster, retrying with exponential backoff on
+        connection errors and temporary server side failures.
+        :return: decoded json response or None if delivery failed
+        """
+        config = get_delivery_config()
+        attempts = max(1, int(config['max_attempts']))
+        started = time.monotonic()
+        result = None
+        attempt = 0
+        while attempt < attempts:
+            if attempt:
+                time.sleep(config['backoff_seconds'] * 2 ** (attempt - 1))
+            attempt += 1
+            try:
+                response = self._send(payload, config)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                logger.warning("Postmaster connection error: %s", e)
+                continue
+            except requests.RequestException as e:
+                logger.warning("Postmaster request failed: %s", e)
+                break
+            if response.status_code in RETRY_STATUS_CODES:
+                continue
+            try:
+                result = response.json()
+            except ValueError:
+                result = None
+            if not isinstance(result, dict):
+                result = {'status': 'error'}
+            result['http_status'] = response.status_code
+            break
+
+        success = bool(result) and result.get('status') == 'success'
+        delivery_stats.record(
+            time.monotonic() - started,
+            delivered=delivered if success else 0,
+            retries=attempt - 1, failed=not success
+        )
+        return result
+
+
+_client = None
+
+
+def get_postmaster_client():
+    global _client
+    if _client is None:
+        _client = PostmasterClient()
+    return _client
+
+
+def get_primary_device_tokens(user_ids):
+    """
+    Resolve primary device tokens of many users with a single query.
+    :return: {user_id: token}
+    """
+    from simo.users.models import UserDevice
+
+    tokens = {}
+    for user_id, os_name, token in UserDevice.objects.filter(
+        users__in=user_ids, is_primary=True
+    ).order_by('-last_seen').values_list('users', 'os', 'token'):
+        tokens.setdefault(user_id, '--'.join([os_name, token]))
+    return tokens
+
+
+def dispatch_notifications(notifications):
+    """
+    Deliver given notifications to all of their not yet notified users.
+    :return: number of successfully delivered notifications
+    """
+    from .models import UserNotification
+
+    notifications = [
+        n for n in notifications if not n.cancelled and not n.is_pending
+    ]
+    if not notifications:
+        return 0
+
+    user_notifications = {}
+    for un in UserNotification.objects.filter(
+        notification__in=notifications, sent__isnull=True
+    ).values_list('id', 'notification_id', 'user_id'):
+        user_notifications.setdefault(un[1], []).append(un)
+    if not user_notifications:
+        return 0
+
+    tokens = get_primary_device_tokens({
+        un[2] for uns in user_notifications.values() for un in uns
+    })
+    hub_secret = dynamic_settings['core__hub_secret']
+
+    payloads = []
+    for notification in notifications:
+        to_tokens = [
+            tokens[un[2]] for un in user_notifications.get(notification.id, [])
+            if un[2] in tokens
+        ]
+        if not to_tokens:
+            continue
+        data = {
+            'instance_uid': notification.instance.uid,
+            'hub_secret': hub_secret,
+            'notification_id': notification.id,
+            'severity': notification.severity,
+            'title': notification.title, 'body': notification.body,
+            'to_tokens': to_tokens
+        }
+        if notification.component_id:
+            data['component_id'] = notification.component_id
+        payloads.append(data)
+    if not payloads:
+        return 0
+
+    client = get_postmaster_client()
+    delivered_ids = []
+    if len(payloads) > 1 and get_delivery_config()['batch'] \
+    and client.batch_supported:
+        response = client.post(
+            {'hub_secret': hub_secret, 'notifications': payloads},
+            delivered=len(payloads)
+        )
+        if response and response.get('status') == 'success':
+            delivered_ids = [p['notification_id'] for p in payloads]
+            payloads = []
+        elif response and response.get('http_status') in (400, 404):
+            # postmaster does not know batches, never try that again
+            client.batch_supported = False
+
+    for data in payloads:
+        response = client.post(data)
+        if response and response.get('status') == 'success':
+            delivered_ids.append(data['notification_id'])
+
+    if delivered_ids:
+        sent_ids = [
+            un[0] for n_id in delivered_ids for un in user_notifications[n_id]
+        ]
+        UserNotification.objects.filter(id__in=sent_ids).update(
+            sent=timezone.now()
+        )
+    return len(delivered_ids)
+
+
+def dispatch_batch(notification_id):
+    """
+    Deliver notification together with other ready notifications that
+    still have undelivered recipients. Collected notifications are claimed
+    in a short transaction and delivered outside of it, so concurrent
+    workers never deliver the same notification twice, while no database
+    locks are held during HTTP requests.
+    :return: number of successfully delivered notifications
+    """
+    from .models import Notification, UserNotification
+
+    config = get_delivery_config()
+    claimed_at = timezone.now()
+    ready = Notification.objects.filter(
+        Q(delivering__isnull=True) | Q(delivering__lt=claimed_at
+            - datetime.timedelta(seconds=config['batch_claim_timeout'])),
+        cancelled__isnull=True, is_pending=False,
+    ).select_for_update(skip_locked=True, of=('self',))
+    with transaction.atomic():
+        if not ready.filter(id=notification_id).first():
+            # Cancelled, or claimed by a batch of another worker
+            return 0
+        undelivered = UserNotification.objects.filter(
+            sent__isnull=True, notification__datetime__gte=claimed_at
+            - datetime.timedelta(seconds=config['batch_max_age'])
+        ).values('notification_id')
+        ids = [notification_id] + list(ready.filter(
+            Q(id__in=undelivered) & ~Q(id=notification_id)
+        ).order_by('id').values_list(
+            'id', flat=True
+        )[:max(0, int(config['batch_size']) - 1)])
+        Notification.objects.filter(id__in=ids).update(delivering=claimed_at)
+
+    try:
+        notifications = Notification.objects.select_related(
+            'instance'
+        ).in_bulk(ids)
+        return dispatch_notifications(
+            [notifications[id] for id in ids if id in notifications]
+        )
+    finally:
+        Notification.objects.filter(
+            id__in=ids, delivering=claimed_at
+        ).update(delivering=None)
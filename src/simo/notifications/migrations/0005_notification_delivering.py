@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_notification_delivery_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='delivering',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
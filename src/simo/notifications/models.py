@@ -1,10 +1,7 @@
-import requests
 from django.utils.translation import gettext_lazy as _
 from django.db import models
-from django.utils import timezone
 from simo.users.models import User
 from simo.core.models import Instance, Component
-from simo.conf import dynamic_settings
 
 
 class Notification(models.Model):
@@ -30,40 +27,12 @@ class Notification(models.Model):
     dispatch_after = models.DateTimeField(null=True, blank=True, db_index=True)
     cancelled = models.DateTimeField(null=True, blank=True, db_index=True)
     event_key = models.CharField(max_length=100, null=True, blank=True, db_index=True)
+    # Claimed for delivery by a batch of some worker at that time
+    delivering = models.DateTimeField(null=True, blank=True, editable=False)
 
     def dispatch(self):
-        if self.cancelled:
-            return
-        if self.is_pending:
-            return
-        data = {
-            'instance_uid': self.instance.uid,
-            'hub_secret': dynamic_settings['core__hub_secret'],
-            'notification_id': self.id, 'severity': self.severity,
-            'title': self.title, 'body': self.body,
-            'to_tokens': []
-        }
-        if self.component:
-            data['component_id'] = self.component.id
-        user_notifications = self.user_notifications.filter(sent__isnull=True)
-        if not user_notifications.exists():
-            return
-        for user_notification in user_notifications:
-            token = user_notification.user.primary_device_token
-            if token:
-                data['to_tokens'].append(
-                    user_notification.user.primary_device_token
-                )
-        if not data['to_tokens']:
-            return
-        try:
-            response = requests.post(
-                'https://simo.io/api/notifications/postmaster/', json=data
-            )
-        except:
-            return
-        if response.json().get('status') == 'success':
-            user_notifications.update(sent=timezone.now())
+        from .delivery import dispatch_notifications
+        dispatch_notifications([self])
 
 
 class UserNotification(models.Model):
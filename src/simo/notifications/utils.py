@@ -8,6 +8,10 @@ from .models import Notification, UserNotification
 
 
 def dispatch_notification_now(notification_id):
+    from .delivery import dispatch_batch, get_delivery_config
+    if get_delivery_config()['batch']:
+        dispatch_batch(notification_id)
+        return
     notification = Notification.objects.filter(
         id=notification_id,
         cancelled__isnull=True,
@@ -76,18 +80,26 @@ def create_notification(
         if instance_users is None:
             instance_users = instance.instance_users.filter(
                 is_active=True
-            ).select_related('user')
-        for iuser in instance_users:
+            ).select_related('user', 'role')
+        instance_users = [
+            iuser for iuser in instance_users
             # do not send emails to system users
-            if iuser.user.email.endswith('simo.io'):
-                continue
-            if iuser.instance.id != instance.id:
-                continue
-            if component is not None and not iuser.can_read(component):
-                continue
-            UserNotification.objects.create(
-                user=iuser.user, notification=notification,
+            if not iuser.user.email.endswith('simo.io')
+            and iuser.instance_id == instance.id
+        ]
+        if component is not None:
+            from simo.users.models import InstanceUser
+            readable = InstanceUser.get_readable_components(
+                instance_users, [component]
             )
+            instance_users = [
+                iuser for iuser in instance_users if readable[iuser]
+            ]
+        user_notifications = [
+            UserNotification(user=iuser.user, notification=notification)
+            for iuser in instance_users
+        ]
+        UserNotification.objects.bulk_create(user_notifications)
         if dispatch:
             using = getattr(getattr(notification, '_state', None), 'db', None) or 'default'
             schedule_notification_dispatch(
@@ -319,6 +319,25 @@ SIMO_THROTTLE = {
     },
 }
 
+# Push notifications delivery can be tuned with SIMO_NOTIFICATIONS dict,
+# see DEFAULTS of simo.notifications.delivery for available keys.
+
+# Trusted built-in scripts (controllers implementing `_run`) can be run as
+# threads of a single shared worker process instead of a process each
+# with SIMO_SCRIPT_HOST dict, see DEFAULTS of simo.automation.script_host
+# for available keys.
+
+# Number of pre-forked script processes kept ready to run scripts can be
+# set with SIMO_SCRIPT_WARM_WORKERS, see warm_script_workers of
+# simo.automation.gateways.AutomationsGatewayHandler for the default.
+
+# Mobile device location reports handling can be tuned with
+# SIMO_DEVICE_REPORTS dict, see DEFAULTS of simo.users.device_reports
+# for available keys.
+
+# Writing of gateway, component and colonel log files can be tuned with
+# SIMO_LOGGING dict, see DEFAULTS of simo.core.loggers for available keys.
+
 REDIS_DB = {
     'celery': 0, 'default_cache': 1, 'select2_cache': 2,
 }
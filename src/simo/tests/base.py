@@ -87,7 +87,7 @@ class BaseSimoTestCase(TestCase):
             mock.patch('simo.users.models.rebuild_authorized_keys', autospec=True),
             mock.patch('simo.core.events.GatewayObjectCommand.publish', autospec=True),
             mock.patch('simo.core.models.Gateway.start', autospec=True),
-            mock.patch('simo.notifications.models.requests.post', autospec=True),
+            mock.patch('simo.notifications.delivery.PostmasterClient._send', autospec=True),
             mock.patch('simo.core.mqtt_hub.get_mqtt_hub', autospec=True, return_value=cls._dummy_mqtt_hub),
         ]
         for patcher in cls._patches:
@@ -104,6 +104,8 @@ class BaseSimoTestCase(TestCase):
 
     def setUp(self):
         from django.core.cache import cache
+        from simo.conf import dynamic_settings
+        from simo.core.instance_cache import invalidate as invalidate_instance_cache
         from simo.core.middleware import drop_current_instance
         from simo.users.utils import introduce_user
 
@@ -113,6 +115,8 @@ class BaseSimoTestCase(TestCase):
             cache.clear()
         except Exception:
             pass
+        invalidate_instance_cache()
+        dynamic_settings.invalidate()
 
     def tearDown(self):
         from simo.core.middleware import drop_current_instance
@@ -137,7 +141,7 @@ class BaseSimoTransactionTestCase(TransactionTestCase):
             mock.patch('simo.users.models.rebuild_authorized_keys', autospec=True),
             mock.patch('simo.core.events.GatewayObjectCommand.publish', autospec=True),
             mock.patch('simo.core.models.Gateway.start', autospec=True),
-            mock.patch('simo.notifications.models.requests.post', autospec=True),
+            mock.patch('simo.notifications.delivery.PostmasterClient._send', autospec=True),
             mock.patch('simo.core.mqtt_hub.get_mqtt_hub', autospec=True, return_value=cls._dummy_mqtt_hub),
         ]
         for patcher in cls._patches:
@@ -154,6 +158,8 @@ class BaseSimoTransactionTestCase(TransactionTestCase):
 
     def setUp(self):
         from django.core.cache import cache
+        from simo.conf import dynamic_settings
+        from simo.core.instance_cache import invalidate as invalidate_instance_cache
         from simo.core.middleware import drop_current_instance
         from simo.users.utils import introduce_user
 
@@ -163,6 +169,8 @@ class BaseSimoTransactionTestCase(TransactionTestCase):
             cache.clear()
         except Exception:
             pass
+        invalidate_instance_cache()
+        dynamic_settings.invalidate()
 
     def tearDown(self):
         from simo.core.middleware import drop_current_instance
@@ -1,8 +1,12 @@
+import json
+from types import SimpleNamespace
 from unittest import mock
 
 from simo.core.models import Component, Gateway, Zone
 
-from .base import BaseSimoTestCase, mk_instance
+from .base import (
+    BaseSimoTestCase, mk_instance, mk_instance_user, mk_role, mk_user
+)
 
 
 class GatesHandlerGeofenceTests(BaseSimoTestCase):
@@ -26,62 +30,137 @@ class GatesHandlerGeofenceTests(BaseSimoTestCase):
             value=None,
         )
 
-    def test_in_geofence_and_out_of_geofence_thresholds(self):
+    def _build_geofences(self):
         from simo.automation.gateways import GatesHandler
 
         handler = GatesHandler()
+        handler.build_geofences()
+        return handler, handler.geofences.get(self.inst.uid, {}).get('gates', [])
 
-        with mock.patch('simo.automation.gateways.haversine_distance', autospec=True, return_value=50):
-            self.assertTrue(handler._is_in_geofence(self.gate, '0,1'))
-            self.assertFalse(handler._is_out_of_geofence(self.gate, '0,1'))
+    def test_geofence_of_gate_with_auto_open_distance(self):
+        handler, geofences = self._build_geofences()
 
-        with mock.patch('simo.automation.gateways.haversine_distance', autospec=True, return_value=400):
-            self.assertFalse(handler._is_in_geofence(self.gate, '0,1'))
-            self.assertTrue(handler._is_out_of_geofence(self.gate, '0,1'))
-
-    def test_geofence_returns_false_when_no_auto_open_distance(self):
-        from simo.automation.gateways import GatesHandler
-
-        handler = GatesHandler()
+        self.assertEqual(len(geofences), 1)
+        self.assertEqual(geofences[0].gate, self.gate)
+        self.assertEqual(geofences[0].radius, 100)
+        self.assertEqual(geofences[0].margin, handler.GEOFENCE_CROSS_ZONE)
 
+    def test_no_geofence_without_auto_open_distance(self):
         self.gate.config.pop('auto_open_distance')
         self.gate.save(update_fields=['config'])
 
-        with mock.patch('simo.automation.gateways.haversine_distance', autospec=True) as dist:
-            self.assertFalse(handler._is_in_geofence(self.gate, '0,1'))
-            self.assertFalse(handler._is_out_of_geofence(self.gate, '0,1'))
-        dist.assert_not_called()
+        handler, geofences = self._build_geofences()
 
-    def test_geofence_falls_back_to_instance_location_on_bad_gate_location(self):
-        from simo.automation.gateways import GatesHandler
+        self.assertEqual(geofences, [])
 
-        handler = GatesHandler()
+    def test_geofence_falls_back_to_instance_location_on_bad_gate_location(self):
         self.gate.config['location'] = 'bad'
         self.gate.save(update_fields=['config'])
 
-        with mock.patch(
-            'simo.automation.gateways.haversine_distance',
-            autospec=True,
-            side_effect=[ValueError('bad gate'), 50],
-        ) as dist:
-            self.assertTrue(handler._is_in_geofence(self.gate, '0,1'))
+        handler, geofences = self._build_geofences()
 
-        # Called once for gate.location, then for instance.location fallback.
-        self.assertEqual(dist.call_count, 2)
+        self.assertEqual(geofences[0].location, '0,0')
 
-    def test_geofence_logs_warning_and_returns_false_when_location_is_unusable(self):
+    def test_geofence_logs_warning_when_location_is_unusable(self):
         from simo.automation.gateways import GatesHandler
 
-        handler = GatesHandler()
         self.gate.config['location'] = 'bad'
         self.gate.save(update_fields=['config'])
         self.inst.location = 'also-bad'
         self.inst.save(update_fields=['location'])
 
-        with (
-            mock.patch('simo.automation.gateways.haversine_distance', autospec=True, side_effect=ValueError('bad')),
-            mock.patch.object(handler, '_log_warning', autospec=True) as warn,
-        ):
-            self.assertFalse(handler._is_in_geofence(self.gate, '0,1'))
+        with mock.patch.object(
+            GatesHandler, '_log_warning', autospec=True
+        ) as warn:
+            handler, geofences = self._build_geofences()
+
+        self.assertEqual(geofences, [])
         warn.assert_called_once()
 
+
+class GeofenceTests(BaseSimoTestCase):
+    def test_far_locations_are_rejected_without_haversine(self):
+        from simo.automation.helpers import Geofence
+
+        geofence = Geofence('54.0,25.0', 100, 200)
+        with mock.patch('simo.automation.helpers.haversine_distance', autospec=True) as dist:
+            self.assertIsNone(geofence.distance('54.1,25.0'))
+            self.assertIsNone(geofence.distance('54.0,25.1'))
+        dist.assert_not_called()
+
+        self.assertAlmostEqual(geofence.distance('54.0005,25.0'), 55.6, delta=1)
+        # Inside of bounding box, but out of reach
+        self.assertIsNone(geofence.distance('54.002,25.0033'))
+
+
+class GatesHandlerGeofenceIndexTests(BaseSimoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.inst = mk_instance('inst-a', 'A')
+        self.inst.location = '54.0,25.0'
+        self.inst.save(update_fields=['location'])
+        self.zone = Zone.objects.create(instance=self.inst, name='Z', order=0)
+        self.gw, _ = Gateway.objects.get_or_create(type='simo.generic.gateways.GenericGatewayHandler')
+        self.gate = Component.objects.create(
+            name='Gate', zone=self.zone, category=None, gateway=self.gw,
+            base_type='gate', controller_uid='x',
+            config={'auto_open_distance': '100m', 'location': '54.0,25.0'},
+            meta={}, value=None,
+        )
+        role = mk_role(self.inst)
+        role.is_person = True
+        role.save()
+        self.iuser = mk_instance_user(mk_user('u@example.com', 'U'), self.inst, role)
+        self.iuser.last_seen_location = '54.0,25.0'
+        self.iuser.save()
+
+    def _mk_handler(self):
+        from simo.automation.gateways import GatesHandler
+
+        handler = GatesHandler()
+        handler.watch_gates()
+        return handler
+
+    def _location_msg(self, location, speed_kmh=0):
+        return SimpleNamespace(
+            topic=f'SIMO/obj-state/{self.inst.uid}/InstanceUser/{self.iuser.id}',
+            payload=json.dumps({
+                'is_active': True, 'role': self.iuser.role_id,
+                'last_seen_location': location,
+                'last_seen_speed_kmh': speed_kmh,
+            }),
+            retain=False,
+        )
+
+    def test_gate_opens_for_returning_user_without_db_reads(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        handler = self._mk_handler()
+        self.assertEqual(handler.gate_iusers, {self.gate.id: {self.iuser.id: 0}})
+        gate = handler.geofences[self.inst.uid]['gates'][0].gate
+        gate.open = mock.Mock()
+
+        with CaptureQueriesContext(connection) as ctx:
+            for i in range(5):
+                handler.on_geofence_event(None, None, self._location_msg('54.1,25.0', 60))
+            self.assertEqual(handler.gate_iusers[self.gate.id][self.iuser.id], 5)
+            handler.on_geofence_event(None, None, self._location_msg('54.0003,25.0', 30))
+
+        self.assertEqual(len(ctx.captured_queries), 0)
+        gate.open.assert_called_once_with()
+        self.assertEqual(handler.gate_iusers[self.gate.id][self.iuser.id], 0)
+
+    def test_gate_config_change_rebuilds_geofences(self):
+        handler = self._mk_handler()
+        self.assertEqual(handler.geofences[self.inst.uid]['gates'][0].radius, 100)
+
+        self.gate.config['auto_open_distance'] = '1km'
+        self.gate.save(update_fields=['config'])
+        handler.on_geofence_event(None, None, SimpleNamespace(
+            topic=f'SIMO/obj-state/{self.inst.uid}/Component/{self.gate.id}',
+            payload=json.dumps({'dirty_fields': {'config': {}}}),
+            retain=False,
+        ))
+
+        self.assertEqual(handler.geofences[self.inst.uid]['gates'][0].radius, 1000)
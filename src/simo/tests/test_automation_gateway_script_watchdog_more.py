@@ -1,3 +1,4 @@
+import multiprocessing.connection
 import time
 from unittest import mock
 
@@ -78,3 +79,173 @@ class AutomationGatewayScriptWatchdogTests(BaseSimoTestCase):
             handler.watch_scripts()
 
         stop_pid.assert_called_once()
+
+
+class _ExitedProc:
+    def __init__(self, sentinel=None):
+        self.sentinel = sentinel
+        self.killed = False
+
+    def is_alive(self):
+        return False
+
+    def kill(self):
+        self.killed = True
+
+
+class AutomationGatewayScriptSupervisorTests(BaseSimoTestCase):
+    def setUp(self):
+        super().setUp()
+        inst = mk_instance('inst-a', 'A')
+        zone = Zone.objects.create(instance=inst, name='Z', order=0)
+        self.gw, _ = Gateway.objects.get_or_create(type='simo.automation.gateways.AutomationsGatewayHandler')
+
+        from simo.automation.controllers import PresenceLighting
+
+        self.script = Component.objects.create(
+            name='S', zone=zone, category=None, gateway=self.gw,
+            base_type='script', controller_uid=PresenceLighting.uid,
+            config={'keep_alive': True}, meta={}, value='running',
+        )
+
+    def test_dead_script_is_marked_error_and_revived_without_polling(self):
+        handler = self.gw.handler
+        proc = _ExitedProc()
+        handler.running_scripts[self.script.id] = {
+            'proc': proc, 'start_time': time.time(),
+        }
+
+        with (
+            mock.patch('simo.automation.gateways.threading.Timer', autospec=True) as timer,
+            mock.patch('simo.automation.gateways.get_component_logger', autospec=True, return_value=mock.Mock()),
+        ):
+            handler.reap_scripts()
+
+        self.script.refresh_from_db()
+        self.assertEqual(self.script.value, 'error')
+        self.assertTrue(proc.killed)
+        self.assertNotIn(self.script.id, handler.running_scripts)
+        timer.assert_called_once_with(
+            handler.revive_delay, handler._revive_script, args=(self.script.id,)
+        )
+
+    def test_terminating_scripts_are_left_to_stop_script(self):
+        handler = self.gw.handler
+        handler.running_scripts[self.script.id] = {
+            'proc': _ExitedProc(), 'start_time': time.time(),
+        }
+        handler.terminating_scripts.add(self.script.id)
+
+        handler.reap_scripts()
+
+        self.assertIn(self.script.id, handler.running_scripts)
+
+    def test_supervisor_wakes_up_on_process_sentinel(self):
+        import os
+        import threading
+
+        handler = self.gw.handler
+        handler.logger = mock.Mock()
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        self.addCleanup(os.close, write_fd)
+        handler.running_scripts[self.script.id] = {
+            'proc': _ExitedProc(sentinel=read_fd), 'start_time': time.time(),
+        }
+        exit = threading.Event()
+        os.write(write_fd, b'x')
+
+        with mock.patch.object(
+            handler, 'reap_scripts', autospec=True,
+            side_effect=lambda: exit.set()
+        ) as reap, mock.patch(
+            'simo.automation.gateways.multiprocessing.connection.wait',
+            wraps=multiprocessing.connection.wait,
+        ) as wait:
+            handler.supervise_scripts(exit)
+
+        reap.assert_called_once()
+        self.assertIn(read_fd, wait.call_args.args[0])
+
+    def test_failed_exit_handling_backs_off_instead_of_spinning(self):
+        import os
+        import threading
+
+        handler = self.gw.handler
+        handler.logger = mock.Mock()
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        self.addCleanup(os.close, write_fd)
+        # Sentinel of exited process is ready forever
+        os.write(write_fd, b'x')
+        handler.running_scripts[self.script.id] = {
+            'proc': _ExitedProc(sentinel=read_fd), 'start_time': time.time(),
+        }
+        exit = threading.Event()
+        waits = []
+        real_wait = multiprocessing.connection.wait
+
+        def wait(waitables, timeout):
+            waits.append((list(waitables), timeout))
+            if len(waits) == 3:
+                exit.set()
+            return real_wait(waitables, timeout=0)
+
+        with mock.patch(
+            'simo.automation.gateways.Component.save', autospec=True,
+            side_effect=Exception('DB is down'),
+        ), mock.patch(
+            'simo.automation.gateways.get_component_logger', autospec=True,
+            return_value=mock.Mock(),
+        ), mock.patch(
+            'simo.automation.gateways.multiprocessing.connection.wait',
+            side_effect=wait,
+        ):
+            handler.supervise_scripts(exit)
+
+        self.assertIn(read_fd, waits[0][0])
+        # Exit is retried later, not on every pass
+        for waitables, timeout in waits[1:]:
+            self.assertNotIn(read_fd, waitables)
+            self.assertGreater(timeout, 0.5)
+        self.assertIn(self.script.id, handler.running_scripts)
+        retry_at, delay = handler._exit_retries[self.script.id]
+        self.assertEqual(delay, 1)
+
+        handler._exit_retries[self.script.id] = (0, delay)
+        with mock.patch(
+            'simo.automation.gateways.threading.Timer', autospec=True
+        ), mock.patch(
+            'simo.automation.gateways.get_component_logger', autospec=True,
+            return_value=mock.Mock(),
+        ):
+            handler.reap_scripts()
+        self.assertNotIn(self.script.id, handler.running_scripts)
+        self.assertNotIn(self.script.id, handler._exit_retries)
+
+    def test_terminating_script_sentinel_is_not_waited_on(self):
+        import os
+        import threading
+
+        handler = self.gw.handler
+        handler.logger = mock.Mock()
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        self.addCleanup(os.close, write_fd)
+        os.write(write_fd, b'x')
+        handler.running_scripts[self.script.id] = {
+            'proc': _ExitedProc(sentinel=read_fd), 'start_time': time.time(),
+        }
+        handler.terminating_scripts.add(self.script.id)
+        exit = threading.Event()
+
+        with mock.patch.object(
+            handler, 'reap_scripts', autospec=True,
+            side_effect=lambda: exit.set()
+        ), mock.patch(
+            'simo.automation.gateways.multiprocessing.connection.wait',
+            return_value=[],
+        ) as wait:
+            handler.supervise_scripts(exit)
+
+        self.assertNotIn(read_fd, wait.call_args.args[0])
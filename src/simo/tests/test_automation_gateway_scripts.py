@@ -303,3 +303,88 @@ class AutomationGatewayScriptsTests(BaseSimoTestCase):
         proc.kill.assert_called()
         self.assertNotIn(self.script.id, handler.running_scripts)
         self.assertNotIn(self.script.id, handler.terminating_scripts)
+
+
+class WarmScriptPoolTests(BaseSimoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.inst = mk_instance('inst-a', 'A')
+        self.zone = Zone.objects.create(instance=self.inst, name='Z', order=0)
+
+        from simo.automation.gateways import AutomationsGatewayHandler
+        from simo.automation.controllers import Script
+
+        self.gw, _ = Gateway.objects.get_or_create(type=AutomationsGatewayHandler.uid)
+        self.script = Component.objects.create(
+            name='S', zone=self.zone, category=None, gateway=self.gw,
+            base_type='script', controller_uid=Script.uid,
+            config={'code': 'print("x")'}, meta={}, value='stopped',
+        )
+
+    def test_start_script_uses_warm_worker_when_available(self):
+        from simo.automation import gateways as gw_mod
+
+        with mock.patch('simo.core.gateways.mqtt.Client', autospec=True, side_effect=FakeMqttClient):
+            handler = gw_mod.AutomationsGatewayHandler(self.gw)
+        handler.logger = mock.Mock()
+        worker = mock.Mock()
+        locked_on_refill = []
+        with (
+            mock.patch.object(handler.script_pool, 'claim', return_value=worker) as claim,
+            mock.patch.object(
+                handler.script_pool, 'refill',
+                side_effect=lambda: locked_on_refill.append(
+                    handler._scripts_lock._is_owned()
+                )
+            ),
+            mock.patch.object(gw_mod, 'ScriptRunHandler', autospec=True) as run_handler,
+        ):
+            handler.start_script(self.script)
+
+        claim.assert_called_once_with(self.script.id)
+        run_handler.assert_not_called()
+        self.assertIs(handler.running_scripts[self.script.id]['proc'], worker)
+        # new worker is forked only once scripts lock is released
+        self.assertEqual(locked_on_refill, [False])
+
+    def test_pool_claims_idle_worker_and_refills(self):
+        from simo.automation import gateways as gw_mod
+
+        pool = gw_mod.WarmScriptPool(1)
+        self.assertIsNone(pool.claim(self.script.id))
+
+        first, second = mock.Mock(), mock.Mock()
+        refilled = threading.Event()
+        second.start.side_effect = lambda: refilled.set()
+        with mock.patch.object(
+            gw_mod, 'WarmScriptRunHandler', side_effect=[first, second]
+        ):
+            pool.start()
+            self.addCleanup(pool.shutdown)
+            claimed = pool.claim(self.script.id)
+            # claiming alone never forks
+            self.assertEqual(pool._idle, [])
+            second.start.assert_not_called()
+            pool.refill()
+            self.assertTrue(refilled.wait(5))
+
+        self.assertIs(claimed, first)
+        first.claim.assert_called_once_with(self.script.id)
+        with pool._lock:
+            self.assertEqual(pool._idle, [second])
+
+    def test_warm_worker_runs_claimed_script(self):
+        from simo.automation import gateways as gw_mod
+
+        worker = gw_mod.WarmScriptRunHandler()
+        worker.claim(self.script.id)
+        with (
+            mock.patch.object(worker, 'warm_up', autospec=True),
+            mock.patch.object(gw_mod, 'db_connection') as db_conn,
+            mock.patch.object(worker, 'run_script', autospec=True) as run_script,
+        ):
+            db_conn.is_usable.return_value = True
+            worker.run()
+
+        run_script.assert_called_once()
+        self.assertEqual(worker.component_id, self.script.id)
@@ -0,0 +1,146 @@
+import queue
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from simo.core.models import Component, Gateway, Zone
+
+from .base import BaseSimoTestCase, mk_instance
+from .test_automation_gateway_scripts import FakeMqttClient
+
+
+class AutomationGatewayScriptHostTests(BaseSimoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.inst = mk_instance('inst-a', 'A')
+        self.zone = Zone.objects.create(instance=self.inst, name='Z', order=0)
+
+        from simo.automation.gateways import AutomationsGatewayHandler
+        from simo.automation.controllers import PresenceLighting, Script
+
+        self.gw, _ = Gateway.objects.get_or_create(type=AutomationsGatewayHandler.uid)
+        self.presence = Component.objects.create(
+            name='PL', zone=self.zone, category=None, gateway=self.gw,
+            base_type='script', controller_uid=PresenceLighting.uid,
+            config={'lights': []}, meta={}, value='stopped',
+        )
+        self.script = Component.objects.create(
+            name='S', zone=self.zone, category=None, gateway=self.gw,
+            base_type='script', controller_uid=Script.uid,
+            config={'code': 'print("x")'}, meta={}, value='stopped',
+        )
+
+    def _mk_gateway(self):
+        from simo.automation.gateways import AutomationsGatewayHandler
+
+        with mock.patch('simo.core.gateways.mqtt.Client', autospec=True, side_effect=FakeMqttClient):
+            handler = AutomationsGatewayHandler(self.gw)
+        handler.logger = mock.Mock()
+        return handler
+
+    @override_settings(SIMO_SCRIPT_HOST={'enabled': True})
+    def test_builtin_scripts_go_to_shared_host_user_code_to_own_process(self):
+        from simo.automation import gateways as gw_mod
+
+        handler = self._mk_gateway()
+        hosted = mock.Mock()
+        proc = mock.Mock()
+        with (
+            mock.patch.object(handler.script_host, 'start_script', return_value=hosted) as host_start,
+            mock.patch.object(gw_mod, 'ScriptRunHandler', autospec=True, return_value=proc),
+        ):
+            handler.start_script(self.presence)
+            handler.start_script(self.script)
+
+        host_start.assert_called_once_with(self.presence.id)
+        proc.start.assert_called_once()
+        self.assertIs(handler.running_scripts[self.presence.id]['proc'], hosted)
+        self.assertIs(handler.running_scripts[self.script.id]['proc'], proc)
+
+    def test_host_is_disabled_by_default(self):
+        from simo.automation import gateways as gw_mod
+
+        handler = self._mk_gateway()
+        proc = mock.Mock()
+        with (
+            mock.patch.object(handler.script_host, 'start_script') as host_start,
+            mock.patch.object(gw_mod, 'ScriptRunHandler', autospec=True, return_value=proc),
+        ):
+            handler.start_script(self.presence)
+
+        host_start.assert_not_called()
+        proc.start.assert_called_once()
+
+
+class ScriptHostTests(SimpleTestCase):
+    def test_run_script_binds_watchers_to_shared_hub_and_reports_exit(self):
+        from simo.automation.script_host import ScriptHost
+        from simo.core import events
+
+        seen = {}
+
+        def _run():
+            seen['stop_event'] = events.get_current_watcher_stop_event()
+            seen['shared_hub'] = events._watchers_share_hub()
+
+        component = mock.Mock()
+        component.zone.instance.timezone = 'UTC'
+        component.controller = SimpleNamespace(_run=_run)
+        logger = mock.Mock()
+
+        host = ScriptHost()
+        host.exits = queue.Queue()
+        exit_event = threading.Event()
+        with (
+            mock.patch('simo.automation.script_host.db_connection'),
+            mock.patch('simo.core.models.Component.objects.get', return_value=component),
+            mock.patch('simo.core.middleware.introduce_instance'),
+            mock.patch('simo.core.loggers.get_component_logger', return_value=logger),
+        ):
+            host.run_script(5, 7, exit_event)
+
+        self.assertIs(seen['stop_event'], exit_event)
+        self.assertTrue(seen['shared_hub'])
+        self.assertIsNone(events.get_current_watcher_stop_event())
+        self.assertEqual(host.exits.get_nowait(), (5, 7))
+        self.assertEqual(host.output_streams, {})
+        component.set.assert_has_calls([mock.call('running'), mock.call('finished')])
+
+    def test_output_is_routed_to_log_of_current_script(self):
+        import io
+        import logging
+        from simo.automation.script_host import ScriptHost, _ScriptOutputRouter
+        from simo.core import events
+        from simo.core.utils.logs import StreamToLogger
+
+        host = ScriptHost()
+        logger = mock.Mock()
+        exit_event = threading.Event()
+        host.output_streams[exit_event] = {
+            logging.INFO: StreamToLogger(logger, logging.INFO),
+        }
+        fallback = io.StringIO()
+        router = _ScriptOutputRouter(host, logging.INFO, fallback)
+
+        router.write("not a script\n")
+        events.set_current_watcher_stop_event(exit_event, shared_hub=True)
+        try:
+            router.write("hello from script\n")
+        finally:
+            events.clear_current_watcher_stop_event()
+
+        self.assertEqual(fallback.getvalue(), "not a script\n")
+        logger.log.assert_called_once_with(logging.INFO, "hello from script")
+
+    def test_stopping_hosted_script_sends_stop_of_that_run_only(self):
+        from simo.automation.script_host import HostedScript
+
+        host = mock.Mock()
+        script = HostedScript(host, 5, 7)
+        script.terminate()
+        script.exit_event.set()
+
+        host.stop_script.assert_called_once_with(5, 7)
+        self.assertTrue(script.exit_in_use.is_set())
@@ -0,0 +1,57 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .base import BaseSimoTestCase
+
+
+class LocalPreferencesTests(BaseSimoTestCase):
+    key = 'core__remote_conn_version'
+
+    def test_repeated_reads_do_not_touch_database(self):
+        from simo.conf import dynamic_settings
+
+        dynamic_settings[self.key] = 3
+        self.assertEqual(dynamic_settings[self.key], 3)
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(100):
+                self.assertEqual(dynamic_settings[self.key], 3)
+                self.assertEqual(dynamic_settings.get(self.key), 3)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_local_write_is_visible_right_away(self):
+        from simo.conf import dynamic_settings
+
+        dynamic_settings[self.key] = 1
+        self.assertEqual(dynamic_settings[self.key], 1)
+        dynamic_settings[self.key] = 2
+        self.assertEqual(dynamic_settings[self.key], 2)
+
+    def test_preference_change_bumps_shared_version(self):
+        from simo.conf import dynamic_settings
+
+        dynamic_settings[self.key]
+        version = cache.get(dynamic_settings.VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            dynamic_settings[self.key] = 5
+        self.assertNotEqual(cache.get(dynamic_settings.VERSION_KEY), version)
+
+    def test_change_made_by_other_process_seen_after_check_interval(self):
+        from dynamic_preferences.models import GlobalPreferenceModel
+        from simo.conf import dynamic_settings
+
+        dynamic_settings[self.key] = 1
+        self.assertEqual(dynamic_settings[self.key], 1)
+
+        # Another process: signals of this process never fire
+        GlobalPreferenceModel.objects.filter(
+            section='core', name='remote_conn_version'
+        ).update(raw_value='7')
+        cache.set(dynamic_settings.VERSION_KEY, 'other-process')
+        self.assertEqual(dynamic_settings[self.key], 1)
+
+        now = dynamic_settings._checked + dynamic_settings.CHECK_INTERVAL + 1
+        with mock.patch('simo.conf.time.monotonic', return_value=now):
+            self.assertEqual(dynamic_settings[self.key], 7)
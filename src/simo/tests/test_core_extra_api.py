@@ -10,7 +10,10 @@ from actstream import action
 from simo.core.models import Zone, Gateway, Component, ComponentHistory
 from simo.users.models import User, ComponentPermission
 
-from .base import BaseSimoTestCase, mk_instance, mk_user, mk_role, mk_instance_user
+from .base import (
+    BaseSimoTestCase, BaseSimoTransactionTestCase, mk_instance, mk_user,
+    mk_role, mk_instance_user
+)
 
 
 class ComponentControllerEndpointsTests(BaseSimoTestCase):
@@ -196,7 +199,7 @@ class ComponentControllerEndpointsTests(BaseSimoTestCase):
         self.assertEqual(resp.status_code, 200)
 
 
-class FleetConsumerServiceSuspensionTests(BaseSimoTestCase):
+class FleetConsumerServiceSuspensionTests(BaseSimoTransactionTestCase):
     def test_get_config_data_forces_controls_disabled(self):
         from simo.fleet.controllers import Switch
         from simo.fleet.gateways import FleetGatewayHandler
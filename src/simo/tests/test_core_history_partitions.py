@@ -0,0 +1,142 @@
+import datetime
+from unittest import mock
+
+from django.db import IntegrityError
+from django.test import SimpleTestCase
+
+from .base import BaseSimoTransactionTestCase, mk_instance
+
+
+UTC = datetime.timezone.utc
+
+
+class HistoryPartitionsTests(SimpleTestCase):
+    def test_months_are_utc_and_roll_over_year(self):
+        from simo.core import history_partitions as hp
+
+        local = datetime.timezone(datetime.timedelta(hours=3))
+        start = datetime.datetime(2026, 12, 1, 1, 30, tzinfo=local)
+
+        self.assertEqual(
+            list(hp.iter_months(start, hp.months_later(start, 2))), [
+                datetime.datetime(2026, 11, 1, tzinfo=UTC),
+                datetime.datetime(2026, 12, 1, tzinfo=UTC),
+                datetime.datetime(2027, 1, 1, tzinfo=UTC),
+            ]
+        )
+
+    def test_partition_name_round_trip(self):
+        from simo.core import history_partitions as hp
+
+        month = datetime.datetime(2026, 3, 1, tzinfo=UTC)
+        name = hp.partition_name(month)
+
+        self.assertEqual(name, 'core_componenthistory_p2026_03')
+        self.assertEqual(hp.parse_partition_name(name), month)
+        self.assertIsNone(hp.parse_partition_name('core_componenthistory_default'))
+
+    def test_only_months_entirely_before_cutoff_are_dropped(self):
+        from simo.core import history_partitions as hp
+
+        partitions = [
+            'core_componenthistory_p2026_01', 'core_componenthistory_p2026_02',
+            'core_componenthistory_p2026_03', 'core_componenthistory_default',
+        ]
+        with (
+            mock.patch.object(hp, 'get_partitions', return_value=partitions),
+            mock.patch.object(hp, 'connection') as connection,
+        ):
+            connection.ops.quote_name.side_effect = lambda name: f'"{name}"'
+            dropped = hp.drop_partitions_before(
+                datetime.datetime(2026, 3, 1, tzinfo=UTC)
+            )
+
+        self.assertEqual(dropped, partitions[:2])
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.execute.assert_has_calls([
+            mock.call('DROP TABLE IF EXISTS "core_componenthistory_p2026_01"'),
+            mock.call('DROP TABLE IF EXISTS "core_componenthistory_p2026_02"'),
+        ])
+
+
+class ConvertToPartitionedTests(BaseSimoTransactionTestCase):
+    """Runs the real table rebuild against the test database."""
+
+    def setUp(self):
+        from django.db import connection
+
+        if connection.vendor != 'postgresql':
+            self.skipTest('History partitioning requires PostgreSQL')
+        super().setUp()
+        self.addCleanup(self._restore_history_table)
+
+    def _restore_history_table(self):
+        from django.db import connection
+        from simo.core.models import ComponentHistory
+
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "DROP TABLE IF EXISTS %s CASCADE"
+                % qn(ComponentHistory._meta.db_table)
+            )
+        with connection.schema_editor() as schema_editor:
+            schema_editor.create_model(ComponentHistory)
+
+    def test_rows_ids_and_new_inserts_survive_conversion(self):
+        from simo.core import history_partitions as hp
+        from simo.core.models import Component, ComponentHistory, Gateway, Zone
+
+        inst = mk_instance('inst-a', 'A')
+        zone = Zone.objects.create(instance=inst, name='Z', order=0)
+        gw, _ = Gateway.objects.get_or_create(
+            type='simo.generic.gateways.GenericGatewayHandler'
+        )
+        comp = Component.objects.create(
+            name='C', zone=zone, category=None, gateway=gw,
+            base_type='switch', controller_uid='x', config={}, meta={},
+            value=False,
+        )
+        now = datetime.datetime.now(UTC)
+        dates = [
+            now - datetime.timedelta(days=days) for days in (400, 65, 3, 0)
+        ]
+        for i, date in enumerate(dates):
+            entry = ComponentHistory.objects.create(
+                component=comp, type='value', value=i
+            )
+            ComponentHistory.objects.filter(id=entry.id).update(date=date)
+        before = list(ComponentHistory.objects.order_by('id').values_list(
+            'id', 'date', 'value', 'component_id'
+        ))
+
+        hp.convert_to_partitioned()
+
+        self.assertTrue(hp.is_partitioned())
+        partitions = set(hp.get_partitions())
+        for month in hp.iter_months(dates[0], hp.months_later(now, 2)):
+            self.assertIn(hp.partition_name(month), partitions)
+        self.assertEqual(
+            list(ComponentHistory.objects.order_by('id').values_list(
+                'id', 'date', 'value', 'component_id'
+            )), before
+        )
+
+        new = ComponentHistory.objects.create(
+            component=comp, type='value', value='new'
+        )
+        self.assertGreater(new.id, before[-1][0])
+        self.assertEqual(ComponentHistory.objects.count(), len(before) + 1)
+
+        # Whole months past retention go away, the rest stays
+        hp.drop_partitions_before(hp.month_start(dates[1]))
+        self.assertEqual(
+            sorted(ComponentHistory.objects.values_list('value', flat=True)),
+            sorted([1, 2, 3, 'new'], key=str)
+        )
+
+        # Foreign keys are in place again
+        with self.assertRaises(IntegrityError):
+            ComponentHistory.objects.create(
+                component_id=comp.id + 1000, type='value'
+            )
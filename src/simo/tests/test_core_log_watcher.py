@@ -0,0 +1,99 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from simo.core.log_watcher import _LogWatcher
+
+
+class Collector:
+    def __init__(self):
+        self.lines = []
+        self.changed = threading.Event()
+
+    def __call__(self, lines):
+        self.lines.extend(lines)
+        self.changed.set()
+
+    def wait_for(self, count, timeout=2):
+        deadline = time.monotonic() + timeout
+        while len(self.lines) < count and time.monotonic() < deadline:
+            self.changed.wait(0.05)
+            self.changed.clear()
+        return self.lines
+
+
+class LogWatcherTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, '1.log')
+        with open(self.path, 'w') as f:
+            f.write('[INFO] one\n[INFO] unfinis')
+
+    def _append(self, text, path=None):
+        with open(path or self.path, 'a') as f:
+            f.write(text)
+
+    def _check_streaming(self, watcher):
+        first, second = Collector(), Collector()
+        token1, head1 = watcher.subscribe(self.path, first)
+        token2, head2 = watcher.subscribe(self.path, second)
+        self.assertEqual(head1, '[INFO] one\n')
+        self.assertEqual(head2, head1)
+        self.assertEqual(len(watcher._files), 1)
+
+        self._append('hed\n[INFO] two\n')
+        self.assertEqual(
+            first.wait_for(2), ['[INFO] unfinished\n', '[INFO] two\n']
+        )
+        self.assertEqual(second.wait_for(2), first.lines)
+
+        # Rotation, like RotatingFileHandler does
+        self._append('[INFO] last\n')
+        os.rename(self.path, self.path + '.1')
+        self._append('[INFO] rotated\n')
+        self.assertEqual(
+            first.wait_for(4)[2:], ['[INFO] last\n', '[INFO] rotated\n']
+        )
+
+        watcher.unsubscribe(token1)
+        self.assertEqual(len(watcher._files), 1)
+        watcher.unsubscribe(token2)
+        self.assertEqual(watcher._files, {})
+        self.assertEqual(watcher._dirs, {})
+
+    def test_streams_to_all_subscribers_with_inotify(self):
+        watcher = _LogWatcher()
+        if not watcher._inotify:
+            self.skipTest('inotify is not available')
+        self._check_streaming(watcher)
+
+    def test_streams_to_all_subscribers_by_polling(self):
+        with mock.patch(
+            'simo.core.log_watcher._Inotify', side_effect=OSError('nope')
+        ):
+            watcher = _LogWatcher()
+        self.assertIsNone(watcher._inotify)
+        self._check_streaming(watcher)
+
+    def test_idle_files_are_not_read(self):
+        watcher = _LogWatcher()
+        if not watcher._inotify:
+            self.skipTest('inotify is not available')
+        token, _ = watcher.subscribe(self.path, Collector())
+        watched = watcher._files[self.path]
+        with mock.patch.object(
+            watched, 'read_new', wraps=watched.read_new
+        ) as read_new:
+            time.sleep(0.5)
+            self.assertEqual(read_new.call_count, 0)
+            self._append('[INFO] two\n')
+            deadline = time.monotonic() + 2
+            while not read_new.call_count and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertGreater(read_new.call_count, 0)
+        watcher.unsubscribe(token)
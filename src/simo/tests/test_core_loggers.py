@@ -0,0 +1,122 @@
+import logging
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from simo.core.loggers import (
+    LogPipeline, NonBlockingHandler, add_file_handler, log_pipeline,
+)
+
+
+class SlowHandler(logging.Handler):
+    """Stands in for a file handler on a slow disk."""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+        self.messages = []
+
+    def emit(self, record):
+        time.sleep(self.delay)
+        self.messages.append(self.format(record))
+
+
+def _mk_logger(name, handler):
+    logger = logging.getLogger(name)
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    return logger
+
+
+class LogPipelineTests(SimpleTestCase):
+    def test_file_handler_writes_formatted_lines_off_thread(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'x.log')
+            logger = logging.getLogger('Test Logger [file]')
+            logger.handlers = []
+            logger.propagate = False
+            handler = add_file_handler(logger, path)
+            try:
+                try:
+                    raise ValueError('boom')
+                except ValueError:
+                    logger.exception('failed %s', 'here')
+                log_pipeline.flush()
+                with open(path, encoding='utf-8') as f:
+                    content = f.read()
+            finally:
+                logger.removeHandler(handler)
+                handler.close()
+
+        self.assertIn('[ERROR] failed here', content)
+        self.assertIn('ValueError: boom', content)
+        # Traceback is formatted once only
+        self.assertEqual(content.count('Traceback'), 1)
+
+    def test_child_process_writes_everything_before_it_exits(self):
+        import multiprocessing
+
+        def child(path):
+            logger = logging.getLogger('Test Logger [child]')
+            logger.handlers = []
+            logger.propagate = False
+            add_file_handler(logger, path, max_bytes=1024 * 1024)
+            for i in range(500):
+                logger.info('line %d', i)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'child.log')
+            process = multiprocessing.get_context('fork').Process(
+                target=child, args=(path,)
+            )
+            process.start()
+            process.join(10)
+            with open(path, encoding='utf-8') as f:
+                lines = f.read().splitlines()
+
+        self.assertEqual(process.exitcode, 0)
+        self.assertEqual(len(lines), 500)
+        self.assertTrue(lines[-1].endswith('line 499'))
+
+    def test_stop_writes_queued_records_and_restarts_on_demand(self):
+        target = SlowHandler(0.001)
+        pipeline = LogPipeline()
+        self.addCleanup(pipeline.stop)
+        with mock.patch('simo.core.loggers.log_pipeline', pipeline):
+            logger = _mk_logger('Test Logger [stop]', NonBlockingHandler(target))
+            for i in range(20):
+                logger.info(str(i))
+            listener = pipeline.listener
+            pipeline.stop()
+            self.assertIsNone(listener._thread)
+            self.assertEqual(target.messages, [str(i) for i in range(20)])
+
+            logger.info('again')
+            pipeline.flush()
+        self.assertIsNot(pipeline.listener, listener)
+        self.assertEqual(target.messages[-1], 'again')
+
+    def test_drop_policies(self):
+        target = SlowHandler(0)
+        for policy, expected in (('oldest', ['2', '3']), ('newest', ['0', '1'])):
+            pipeline = LogPipeline()
+            self.addCleanup(pipeline.stop)
+            with override_settings(SIMO_LOGGING={
+                'queue_size': 2, 'drop_policy': policy
+            }), mock.patch('simo.core.loggers.log_pipeline', pipeline):
+                pipeline._get_queue()
+                pipeline.listener.stop()
+                logger = _mk_logger(
+                    f'Test Logger [{policy}]', NonBlockingHandler(target)
+                )
+                for i in range(4):
+                    logger.info(str(i))
+                queued = []
+                while not pipeline.queue.empty():
+                    queued.append(pipeline.queue.get_nowait()[1].getMessage())
+            self.assertEqual(queued, expected, policy)
+            self.assertEqual(pipeline.dropped, 2, policy)
@@ -98,6 +98,61 @@ class TestMcpCoreToolsDb(BaseSimoTransactionTestCase):
             [f'#{lamp.id}|lamp-street|Virtuvės lempa'],
         )
 
+    def test_get_home_overview_served_from_snapshot_until_structure_changes(self):
+        import json
+        import time
+        from types import SimpleNamespace
+        from simo.core import mcp
+        from simo.core.home_overview import home_overview_snapshots
+        from simo.generic.controllers import MainState, SwitchGroup
+        from simo.generic.gateways import GenericGatewayHandler
+
+        inst = mk_instance('inst-overview-cache', 'Overview cache')
+        zone = Zone.objects.create(instance=inst, name='Bendra', order=0)
+        gw, _ = Gateway.objects.get_or_create(type=GenericGatewayHandler.uid)
+        main_state = Component.objects.create(
+            name='Režimas', zone=zone, category=None, gateway=gw,
+            base_type='state-select', controller_uid=MainState.uid,
+            config={'is_main': True, 'states': [{'slug': 'day'}, {'slug': 'night'}]},
+            meta={}, value='day',
+        )
+        lamp = Component.objects.create(
+            name='Lempa', zone=zone, category=None, gateway=gw,
+            base_type='switch', controller_uid=SwitchGroup.uid,
+            config={}, meta={}, value=False,
+        )
+
+        introduce_instance(inst)
+        with mock.patch(
+            'simo.core.mcp._build_overview_snapshot',
+            wraps=mcp._build_overview_snapshot,
+        ) as build:
+            asyncio.run(mcp.get_home_overview.fn())
+            asyncio.run(mcp.get_home_overview.fn())
+            self.assertEqual(build.call_count, 1)
+
+            home_overview_snapshots.on_mqtt_message(None, None, SimpleNamespace(
+                topic=f'SIMO/obj-state/{inst.uid}/Component/{main_state.id}',
+                payload=json.dumps({
+                    'value': 'night', 'alive': True,
+                    'timestamp': time.time() + 1,
+                }),
+                retain=False,
+            ))
+            out = asyncio.run(mcp.get_home_overview.fn())
+            self.assertEqual(build.call_count, 1)
+            self.assertEqual(out['main_house_state']['value'], 'night')
+
+            lamp.name = 'Virtuvės lempa'
+            lamp.save()
+            out = asyncio.run(mcp.get_home_overview.fn())
+            self.assertEqual(build.call_count, 2)
+
+        self.assertEqual(
+            out['zones'][0]['components']['switch'],
+            [f'#{lamp.id}||Virtuvės lempa'],
+        )
+
     def test_query_components_returns_actionable_contracts(self):
         from simo.core.mcp import query_components
         from simo.generic.controllers import DimmableLightsGroup, MainState
@@ -149,3 +149,24 @@ class TestMcpSimpleTools(SimpleTestCase):
 
         self.assertEqual(inst.ai_memory, 'hello')
         inst.save.assert_called_once()
+
+
+class TestMcpRunSync(SimpleTestCase):
+    def test_blocking_calls_do_not_serialize(self):
+        import threading
+        from simo.mcp_server.utils import run_sync
+
+        # Both calls must be inside of blocking code at the same time,
+        # otherwise barrier times out.
+        barrier = threading.Barrier(2, timeout=5)
+
+        def _blocking(value):
+            barrier.wait()
+            return value
+
+        async def _run():
+            return await asyncio.gather(
+                run_sync(_blocking, 1), run_sync(_blocking, 2)
+            )
+
+        self.assertEqual(asyncio.run(_run()), [1, 2])
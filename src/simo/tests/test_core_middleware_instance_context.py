@@ -84,3 +84,53 @@ class InstanceMiddlewareTests(BaseSimoTestCase):
 
         # Must not leak timezone/instance outside request.
         self.assertIsNone(get_current_instance())
+
+
+class InstanceCacheTests(BaseSimoTestCase):
+    def setUp(self):
+        super().setUp()
+        from rest_framework.test import APIClient
+        from simo.users.models import User
+
+        self.inst = mk_instance('inst-a', 'A')
+        user = mk_user('su@example.com', 'SU')
+        mk_instance_user(user, self.inst, mk_role(self.inst, is_superuser=True))
+        self.api = APIClient()
+        self.api.force_authenticate(user=User.objects.get(pk=user.pk))
+
+    def test_rest_endpoints_resolve_instance_without_sql(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        for path in ('core/info/', 'core/zones/', 'core/categories/', 'core/components/'):
+            url = f'/api/{self.inst.slug}/{path}'
+            self.assertEqual(self.api.get(url).status_code, 200)
+            with CaptureQueriesContext(connection) as ctx:
+                resp = self.api.get(url)
+            self.assertEqual(resp.status_code, 200)
+            instance_lookups = [
+                q['sql'] for q in ctx.captured_queries
+                if 'FROM "core_instance"' in q['sql']
+                and '"core_instance"."slug"' in q['sql']
+            ]
+            self.assertEqual(instance_lookups, [], path)
+
+    def test_instance_changes_invalidate_cache(self):
+        from simo.core.instance_cache import get_instance_by_slug
+
+        cached = get_instance_by_slug(self.inst.slug)
+        self.assertEqual(str(cached.tzinfo), 'UTC')
+        # Callers get their own copies
+        cached.name = 'Changed'
+        self.assertEqual(get_instance_by_slug(self.inst.slug).name, 'A')
+
+        self.inst.timezone = 'Europe/Vilnius'
+        self.inst.save(update_fields=['timezone'])
+        self.assertEqual(
+            str(get_instance_by_slug(self.inst.slug).tzinfo), 'Europe/Vilnius'
+        )
+
+        self.inst.is_active = False
+        self.inst.save(update_fields=['is_active'])
+        self.assertIsNone(get_instance_by_slug(self.inst.slug))
+        self.assertEqual(self.api.get(f'/api/{self.inst.slug}/core/zones/').status_code, 404)
@@ -239,6 +239,7 @@ class TestClearHistoryTask(SimpleTestCase):
 
         with (
             mock.patch.object(tasks.Instance.objects, 'all', return_value=[inst]),
+            mock.patch.object(tasks.history_partitions, 'is_partitioned', return_value=False),
             mock.patch.object(tasks, 'introduce_instance', autospec=True),
             mock.patch.object(tasks.ComponentHistory.objects, 'filter', side_effect=ch_filter_side_effect),
             mock.patch.object(tasks.HistoryAggregate.objects, 'filter', side_effect=ha_filter_side_effect),
@@ -256,3 +257,31 @@ class TestClearHistoryTask(SimpleTestCase):
         ch_qs_keep_delete.delete.assert_called_once()
         ha_qs_keep_delete.delete.assert_called_once()
         act_qs_keep_delete.delete.assert_called_once()
+
+    def test_clear_history_drops_partitions_past_longest_retention(self):
+        from simo.core import tasks
+
+        now = timezone.now()
+        instances = [
+            mock.Mock(id=1, history_days=30), mock.Mock(id=2, history_days=90)
+        ]
+        partitions = mock.Mock()
+        partitions.is_partitioned.return_value = True
+        partitions.drop_partitions_before.return_value = ['p2026_01']
+
+        with (
+            mock.patch.object(tasks.Instance.objects, 'all', return_value=instances),
+            mock.patch.object(tasks, 'history_partitions', partitions),
+            mock.patch.object(tasks, 'introduce_instance', autospec=True),
+            mock.patch.object(tasks.ComponentHistory.objects, 'filter', return_value=tasks.ComponentHistory.objects.none()),
+            mock.patch.object(tasks.HistoryAggregate.objects, 'filter', return_value=tasks.HistoryAggregate.objects.none()),
+            mock.patch.object(tasks.Action.objects, 'filter', return_value=tasks.Action.objects.none()),
+            mock.patch('simo.core.tasks.timezone.now', return_value=now),
+            mock.patch('builtins.print'),
+        ):
+            tasks.clear_history()
+
+        partitions.ensure_partitions.assert_called_once_with()
+        partitions.drop_partitions_before.assert_called_once_with(
+            now - datetime.timedelta(days=90)
+        )
@@ -50,3 +50,50 @@ class ThrottlingUnitTests(SimpleTestCase):
         ):
             self.assertEqual(check_throttle(request=req, scope='x'), 0)
 
+
+    def test_redis_cache_evaluates_all_windows_in_one_script_call(self):
+        from simo.core import throttling
+
+        req = throttling.SimpleRequest(
+            user=mock.Mock(is_authenticated=True, id=5), meta={}
+        )
+        script = mock.Mock(return_value=0)
+        client = mock.Mock()
+        client.register_script.return_value = script
+
+        with (
+            mock.patch.object(throttling, '_get_redis_client', autospec=True, return_value=client),
+            mock.patch.object(throttling, '_throttle_script', None),
+            mock.patch.object(throttling.cache, 'incr', autospec=True) as incr,
+            mock.patch('simo.core.throttling.time.time', autospec=True, return_value=100),
+        ):
+            self.assertEqual(throttling.check_throttle(request=req, scope='x'), 0)
+            script.return_value = 300
+            self.assertEqual(throttling.check_throttle(request=req, scope='x'), 300)
+
+        incr.assert_not_called()
+        client.register_script.assert_called_once_with(throttling.THROTTLE_SCRIPT)
+        self.assertEqual(script.call_count, 2)
+        rules = throttling._rules_global() + throttling._rules_for('x')
+        keys = script.call_args.kwargs['keys']
+        args = script.call_args.kwargs['args']
+        self.assertEqual(len(keys), 1 + len(rules))
+        self.assertIn('simo:ban:', keys[0])
+        self.assertEqual(args[:2], [100, throttling._ban_seconds()])
+        self.assertEqual(
+            args[2:],
+            [v for r in rules for v in (r.window_seconds, r.limit_authenticated)]
+        )
+
+    def test_redis_script_failure_fails_open(self):
+        from simo.core import throttling
+
+        req = throttling.SimpleRequest(user=mock.Mock(is_authenticated=False), meta={})
+        client = mock.Mock()
+        client.register_script.return_value = mock.Mock(side_effect=Exception('down'))
+
+        with (
+            mock.patch.object(throttling, '_get_redis_client', autospec=True, return_value=client),
+            mock.patch.object(throttling, '_throttle_script', None),
+        ):
+            self.assertEqual(throttling.check_throttle(request=req, scope='x'), 0)
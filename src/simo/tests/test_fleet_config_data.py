@@ -0,0 +1,177 @@
+import asyncio
+import threading
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+
+from simo.core.models import Component, Gateway, Zone
+from simo.fleet.gateways import FleetGatewayHandler
+from simo.fleet.models import Colonel
+
+from .base import BaseSimoTransactionTestCase, mk_instance
+
+
+class FleetConsumerConfigDataTests(BaseSimoTransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.inst = mk_instance('inst-a', 'A')
+        self.inst.refresh_from_db()
+        self.zone = Zone.objects.create(instance=self.inst, name='Z', order=0)
+        self.gw, _ = Gateway.objects.get_or_create(type=FleetGatewayHandler.uid)
+
+    def _mk_colonel(self, uid, switches=3):
+        from simo.fleet.controllers import Switch
+
+        colonel = Colonel.objects.create(
+            instance=self.inst, uid=uid, type='game-changer', name=uid,
+            enabled=True,
+        )
+        for i in range(switches):
+            Component.objects.create(
+                name=f'{uid}-{i}', zone=self.zone, category=None,
+                gateway=self.gw, base_type='switch', controller_uid=Switch.uid,
+                config={'colonel': colonel.id, 'output_pin_no': 110 + i},
+                meta={}, value=False,
+            )
+        colonel.refresh_from_db()
+        return colonel
+
+    def _mk_consumer(self, colonel):
+        from simo.fleet.socket_consumers import FleetConsumer
+
+        consumer = FleetConsumer()
+        consumer.colonel = colonel
+        consumer.instance = self.inst
+        return consumer
+
+    def test_device_configs_reused_until_config_version_changes(self):
+        from simo.fleet.socket_consumers import FleetConsumer
+
+        colonel = self._mk_colonel('c-1', switches=2)
+        consumer = self._mk_consumer(colonel)
+        build = mock.patch.object(
+            FleetConsumer, '_build_colonel_config', autospec=True,
+            side_effect=FleetConsumer._build_colonel_config,
+        )
+
+        with build as build_config:
+            first = async_to_sync(consumer.get_config_data)()
+            comp = colonel.components.first()
+            Component.objects.filter(id=comp.id).update(
+                value=True, meta={'options': {'custom_flag': 'kept'}}
+            )
+            second = async_to_sync(consumer.get_config_data)()
+            self.assertEqual(build_config.call_count, 1)
+
+            colonel.update_config()
+            async_to_sync(consumer.get_config_data)()
+            self.assertEqual(build_config.call_count, 2)
+
+        self.assertEqual(len(first['devices']), 2)
+        device = second['devices'][str(comp.id)]
+        self.assertEqual(device['val'], comp.controller._prepare_for_send(True))
+        self.assertEqual(device['options']['custom_flag'], 'kept')
+        self.assertEqual(
+            device['config'], first['devices'][str(comp.id)]['config']
+        )
+
+    def test_cache_holds_plain_device_configs(self):
+        from simo.fleet.socket_consumers import colonel_configs
+
+        colonel = self._mk_colonel('c-1', switches=2)
+        consumer = self._mk_consumer(colonel)
+        Colonel.objects.filter(id=colonel.id).update(name='renamed')
+        config = async_to_sync(consumer.get_config_data)()
+
+        self.assertIsNot(consumer.colonel, colonel)
+        self.assertEqual(consumer.colonel.name, 'renamed')
+        self.assertEqual(config['settings']['name'], 'renamed')
+        cached = colonel_configs[colonel.id]['devices']
+        self.assertEqual(len(cached), 2)
+        for id, device in cached.items():
+            self.assertEqual(
+                device['config'], config['devices'][str(id)]['config']
+            )
+            self.assertIsNot(
+                device['config'], config['devices'][str(id)]['config']
+            )
+            self.assertNotIn('val', device)
+
+    def test_config_follows_changes_bypassing_update_config(self):
+        from simo.fleet.controllers import Switch
+
+        colonel = self._mk_colonel('c-1', switches=2)
+        consumer = self._mk_consumer(colonel)
+        async_to_sync(consumer.get_config_data)()
+        comp, other = colonel.components.order_by('id')
+
+        # Several component types never reach update_config()
+        with mock.patch.object(Colonel, 'update_config', autospec=True):
+            comp.config = dict(comp.config, inverse=True)
+            comp.save()
+            new = Component.objects.create(
+                name='new', zone=self.zone, category=None, gateway=self.gw,
+                base_type='switch', controller_uid=Switch.uid,
+                config={'colonel': colonel.id, 'output_pin_no': 120},
+                meta={}, value=False,
+            )
+            config = async_to_sync(consumer.get_config_data)()
+            self.assertTrue(config['devices'][str(comp.id)]['config']['inverse'])
+            self.assertIn(str(new.id), config['devices'])
+
+            other.delete()
+            config = async_to_sync(consumer.get_config_data)()
+            self.assertNotIn(str(other.id), config['devices'])
+
+            comp.slaves.add(new)
+            config = async_to_sync(consumer.get_config_data)()
+            self.assertEqual(config['devices'][str(comp.id)]['slaves'], [new.id])
+
+            new.masters.clear()
+            config = async_to_sync(consumer.get_config_data)()
+            self.assertNotIn('slaves', config['devices'][str(comp.id)])
+
+    def test_configs_of_reconnecting_colonels_are_built_concurrently(self):
+        from simo.fleet.socket_consumers import FleetConsumer
+
+        consumers = [
+            self._mk_consumer(self._mk_colonel(f'c-{i}', switches=1))
+            for i in range(2)
+        ]
+        barrier = threading.Barrier(2, timeout=5)
+        build_config_data = FleetConsumer._build_config_data
+
+        def _build(consumer):
+            # Deadlocks (and breaks) if builds are serialized
+            barrier.wait()
+            return build_config_data(consumer)
+
+        async def storm():
+            return await asyncio.gather(*[
+                consumer.get_config_data() for consumer in consumers
+            ])
+
+        with mock.patch.object(
+            FleetConsumer, '_build_config_data', autospec=True,
+            side_effect=_build,
+        ):
+            configs = async_to_sync(storm)()
+
+        self.assertEqual([len(c['devices']) for c in configs], [1, 1])
+
+    def test_warm_configs_match_cold_ones(self):
+        consumers = [
+            self._mk_consumer(self._mk_colonel(f'c-{i}', switches=3))
+            for i in range(3)
+        ]
+
+        async def storm():
+            return await asyncio.gather(*[
+                consumer.get_config_data() for consumer in consumers
+            ])
+
+        configs = async_to_sync(storm)()
+        warm_configs = async_to_sync(storm)()
+
+        self.assertTrue(all(len(c['devices']) == 3 for c in configs))
+        self.assertEqual(configs, warm_configs)
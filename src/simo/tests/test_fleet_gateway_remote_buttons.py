@@ -1,3 +1,6 @@
+import json
+import time
+from types import SimpleNamespace
 from unittest import mock
 
 from simo.core.models import Component, Gateway, Zone
@@ -121,8 +124,7 @@ class FleetGatewayRemoteButtonTests(BaseSimoTestCase):
             ],
         )
 
-        with mock.patch('simo.core.events.OnChangeMixin.on_change', autospec=True) as on_change:
-            handler.watch_buttons()
+        handler.watch_buttons()
 
         self.assertEqual(
             handler.remote_button_targets,
@@ -133,12 +135,9 @@ class FleetGatewayRemoteButtonTests(BaseSimoTestCase):
             },
         )
         self.assertCountEqual(
-            [call.args[0].id for call in on_change.call_args_list],
+            handler.remote_button_watchers,
             [button_a.id, button_b.id, button_c.id],
         )
-        self.assertTrue(
-            all(call.args[1] == handler.on_remote_button_change for call in on_change.call_args_list)
-        )
 
     def test_watch_buttons_tracks_remote_controls_on_electric_strike_lock(self):
         handler = self._mk_handler()
@@ -156,8 +155,7 @@ class FleetGatewayRemoteButtonTests(BaseSimoTestCase):
             ],
         )
 
-        with mock.patch('simo.core.events.OnChangeMixin.on_change', autospec=True):
-            handler.watch_buttons()
+        handler.watch_buttons()
 
         self.assertEqual(
             handler.remote_button_targets,
@@ -194,8 +192,7 @@ class FleetGatewayRemoteButtonTests(BaseSimoTestCase):
             ],
         )
 
-        with mock.patch('simo.core.events.OnChangeMixin.on_change', autospec=True):
-            handler.watch_buttons()
+        handler.watch_buttons()
 
         with mock.patch('simo.fleet.controllers.BasicOutputMixin._ctrl', autospec=True) as ctrl:
             handler.on_remote_button_change(button_c)
@@ -229,8 +226,7 @@ class FleetGatewayRemoteButtonTests(BaseSimoTestCase):
             ],
         )
 
-        with mock.patch('simo.core.events.OnChangeMixin.on_change', autospec=True):
-            handler.watch_buttons()
+        handler.watch_buttons()
 
         with mock.patch('simo.fleet.controllers.BasicOutputMixin._ctrl', autospec=True) as ctrl:
             handler.on_remote_button_change(shared)
@@ -250,8 +246,7 @@ class FleetGatewayRemoteButtonTests(BaseSimoTestCase):
             [{'button': shared.id, 'method': 'momentary'}],
         )
 
-        with mock.patch('simo.core.events.OnChangeMixin.on_change', autospec=True):
-            handler.watch_buttons()
+        handler.watch_buttons()
 
         with (
             mock.patch('simo.core.service_suspension.dynamic_settings', {'core__service_suspended': True}),
@@ -270,12 +265,72 @@ class FleetGatewayRemoteButtonTests(BaseSimoTestCase):
             [{'input': f'button-{button.id}', 'button': button.id, 'method': 'momentary'}],
         )
 
-        with mock.patch('simo.core.events.OnChangeMixin.on_change', autospec=True) as on_change:
-            handler.watch_buttons()
-            switch.config['controls'] = []
-            switch.save(update_fields=['config'])
-            handler.watch_buttons()
+        handler.watch_buttons()
+        switch.config['controls'] = []
+        switch.save(update_fields=['config'])
+        handler.watch_buttons()
 
         self.assertEqual(handler.remote_button_targets, {})
         self.assertFalse(handler.remote_button_watchers)
-        self.assertIn((button.id, None), [(call.args[0].id, call.args[1]) for call in on_change.call_args_list])
+        self.assertEqual(handler.remote_button_dispatch, {})
+
+    def _mk_event(self, component, retain=False, **data):
+        from simo.core.events import ObjectChangeEvent
+
+        event = ObjectChangeEvent(self.inst, component, **data)
+        event.data['timestamp'] = time.time()
+        return SimpleNamespace(
+            topic=event.get_topic(), payload=json.dumps(event.data),
+            retain=retain,
+        )
+
+    def test_remote_button_press_makes_no_db_reads(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        handler = self._mk_handler()
+        button = self._make_button('B', 18, value='up')
+        self._make_switch('S1', 8, [{'button': button.id, 'method': 'toggle'}])
+        self._make_switch('S2', 9, [{'button': button.id, 'method': 'toggle'}])
+        handler.watch_buttons()
+
+        msg = self._mk_event(
+            button, value='down', dirty_fields={'value': 'up'}
+        )
+        with (
+            mock.patch('simo.core.service_suspension.dynamic_settings', {'core__service_suspended': False}),
+            mock.patch('simo.fleet.controllers.BasicOutputMixin._ctrl', autospec=True) as ctrl,
+            CaptureQueriesContext(connection) as ctx,
+        ):
+            handler.on_component_event(None, None, msg)
+
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(
+            [call.args[1:] for call in ctrl.call_args_list],
+            [(0, 'down', 'toggle'), (0, 'down', 'toggle')],
+        )
+
+    def test_config_change_event_rebuilds_dispatch_table(self):
+        handler = self._mk_handler()
+        button = self._make_button('B', 18)
+        switch = self._make_switch('S', 8, [])
+        handler.watch_buttons()
+        self.assertEqual(handler.remote_button_dispatch, {})
+
+        switch.config['controls'] = [{'button': button.id, 'method': 'momentary'}]
+        switch.save(update_fields=['config'])
+        handler.on_component_event(None, None, self._mk_event(
+            switch, dirty_fields={'config': {}}
+        ))
+
+        self.assertEqual(
+            [(comp.id, ctrl_no) for comp, ctrl_no in handler.remote_button_dispatch[button.id]],
+            [(switch.id, 0)],
+        )
+
+        # retained (replayed) events are not button presses
+        with mock.patch('simo.fleet.controllers.BasicOutputMixin._ctrl', autospec=True) as ctrl:
+            handler.on_component_event(None, None, self._mk_event(
+                button, retain=True, value='down', dirty_fields={'value': 'up'}
+            ))
+        ctrl.assert_not_called()
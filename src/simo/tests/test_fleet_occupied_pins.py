@@ -0,0 +1,92 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from simo.core.models import Component, Gateway, Zone
+from simo.fleet.gateways import FleetGatewayHandler
+from simo.fleet.models import Colonel, ColonelPin, Interface
+
+from .base import BaseSimoTestCase, mk_instance
+
+
+class ColonelRebuildOccupiedPinsTests(BaseSimoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.inst = mk_instance('inst-a', 'A')
+        self.zone = Zone.objects.create(instance=self.inst, name='Z', order=0)
+        self.gw, _ = Gateway.objects.get_or_create(type=FleetGatewayHandler.uid)
+        self.colonel = Colonel.objects.create(
+            instance=self.inst, uid='gc-1', type='game-changer', name='GC'
+        )
+
+    def _mk_switch(self, pin_no):
+        from simo.fleet.controllers import Switch
+
+        return Component.objects.create(
+            name=f'S{pin_no}', zone=self.zone, category=None,
+            gateway=self.gw, base_type='switch', controller_uid=Switch.uid,
+            config={'colonel': self.colonel.id, 'output_pin_no': pin_no},
+            meta={}, value=False,
+        )
+
+    def _occupant(self, no):
+        pin = ColonelPin.objects.get(colonel=self.colonel, no=no)
+        return pin.occupied_by
+
+    def test_rebuild_reassigns_component_and_interface_pins(self):
+        s1 = self._mk_switch(110)
+        s2 = self._mk_switch(111)
+        interface = Interface.objects.create(
+            colonel=self.colonel, no=1, type='i2c'
+        )
+        # Stale occupancy left behind by removed components
+        ColonelPin.objects.filter(colonel=self.colonel, no=110).update(
+            occupied_by_content_type=None, occupied_by_id=None
+        )
+        ColonelPin.objects.filter(colonel=self.colonel, no=120).update(
+            occupied_by_content_type=ContentType.objects.get_for_model(
+                Component
+            ),
+            occupied_by_id=s2.id,
+        )
+
+        self.colonel.rebuild_occupied_pins()
+
+        self.assertEqual(self._occupant(110), s1)
+        self.assertEqual(self._occupant(111), s2)
+        self.assertIsNone(self._occupant(120))
+        self.assertEqual(self._occupant(13), interface)
+        self.assertEqual(self._occupant(23), interface)
+
+    def test_rebuild_creates_missing_pins(self):
+        switch = self._mk_switch(190)
+        ColonelPin.objects.filter(colonel=self.colonel, no=190).delete()
+
+        self.colonel.rebuild_occupied_pins()
+
+        pin = ColonelPin.objects.get(colonel=self.colonel, no=190)
+        self.assertEqual(pin.occupied_by, switch)
+        self.assertEqual(pin.label, 'IO90')
+
+    def test_rebuild_query_count_does_not_grow_with_components(self):
+        def rebuild_queries():
+            ColonelPin.objects.filter(colonel=self.colonel).update(
+                occupied_by_content_type=None, occupied_by_id=None
+            )
+            with CaptureQueriesContext(connection) as ctx:
+                self.colonel.rebuild_occupied_pins()
+            return len(ctx.captured_queries)
+
+        self._mk_switch(110)
+        few = rebuild_queries()
+
+        for no in range(111, 131):
+            self._mk_switch(no)
+        many = rebuild_queries()
+
+        self.assertEqual(
+            ColonelPin.objects.filter(
+                colonel=self.colonel, occupied_by_id__isnull=False
+            ).count(), 21
+        )
+        self.assertEqual(few, many)
@@ -506,6 +506,138 @@ class FleetConsumerUnitMoreTests(BaseSimoTestCase):
         consumer.send_data.assert_called_once()
         self.assertEqual(consumer.send_data.call_args.args[0]['command'], 'set_config')
 
+    def test_push_config_sends_only_device_changes_to_opted_in_colonel(self):
+        from simo.fleet.socket_consumers import FleetConsumer
+        from simo.fleet.utils import get_config_state
+
+        config = {
+            'devices': {
+                '1': {'type': 'Switch', 'val': False, 'config': {'pin': 1}},
+                '2': {'type': 'Switch', 'val': True, 'config': {'pin': 2}},
+            },
+            'interfaces': {}, 'settings': {'name': 'C1'},
+        }
+        known = get_config_state(config)
+
+        consumer = FleetConsumer()
+        consumer.colonel = self.colonel
+        consumer.send_data = mock.AsyncMock()
+        consumer.get_config_data = mock.AsyncMock(return_value=config)
+        consumer.config_diffs = True
+
+        # values are not part of config hash
+        config['devices']['1']['val'] = True
+        async_to_sync(consumer.push_config)(known)
+        sent = consumer.send_data.call_args.args[0]
+        self.assertEqual(sent, {
+            'command': 'config_ok', 'hash': known['hash'], 'version': 0,
+            'values': {'1': True, '2': True},
+        })
+
+        config['devices'] = {
+            '1': {'type': 'Switch', 'val': True, 'config': {'pin': 5}},
+            '3': {'type': 'Button', 'val': False, 'config': {'pin': 3}},
+        }
+        async_to_sync(consumer.push_config)()
+        sent = consumer.send_data.call_args.args[0]
+        self.assertEqual(sent['command'], 'update_devices')
+        self.assertEqual(sent['base_hash'], known['hash'])
+        self.assertEqual(sent['hash'], get_config_state(config)['hash'])
+        self.assertEqual(sent['update'], {'1': config['devices']['1']})
+        self.assertEqual(sent['add'], {'3': config['devices']['3']})
+        self.assertEqual(sent['remove'], ['2'])
+        self.assertEqual(sent['values'], {})
+        self.assertNotIn('settings', sent)
+        self.assertNotIn('interfaces', sent)
+
+        async_to_sync(consumer.push_config)(full=True)
+        sent = consumer.send_data.call_args.args[0]
+        self.assertEqual(sent['command'], 'set_config')
+        self.assertEqual(sent['data'], config)
+
+    def test_push_config_diffs_against_confirmed_config_only(self):
+        from simo.fleet.socket_consumers import FleetConsumer
+        from simo.fleet.utils import get_config_state
+
+        config = {
+            'devices': {
+                '1': {'type': 'Switch', 'val': False, 'config': {'pin': 1}},
+            },
+            'interfaces': {}, 'settings': {'name': 'C1'},
+        }
+        known = get_config_state(config)
+
+        consumer = FleetConsumer()
+        consumer.colonel = self.colonel
+        consumer.send_data = mock.AsyncMock()
+        consumer.get_config_data = mock.AsyncMock(return_value=config)
+        consumer.config_diffs = True
+        async_to_sync(consumer.push_config)(known)
+
+        config['settings'] = {'name': 'C2'}
+        config['devices']['2'] = {
+            'type': 'Switch', 'val': False, 'config': {'pin': 2}
+        }
+        async_to_sync(consumer.push_config)()
+        sent = consumer.send_data.call_args.args[0]
+        self.assertEqual(sent['settings'], {'name': 'C2'})
+        self.assertNotIn('interfaces', sent)
+        self.assertEqual(sent['values'], {'1': False})
+        self.assertEqual(consumer.config_state, known)
+
+        # Not confirmed yet, so next update is still relative to known
+        config['devices']['3'] = {
+            'type': 'Switch', 'val': False, 'config': {'pin': 3}
+        }
+        async_to_sync(consumer.push_config)()
+        sent = consumer.send_data.call_args.args[0]
+        self.assertEqual(sent['base_hash'], known['hash'])
+        self.assertEqual(sorted(sent['add']), ['2', '3'])
+
+        consumer.config_applied(sent['hash'])
+        self.assertEqual(consumer.config_state['hash'], sent['hash'])
+        self.assertIsNone(consumer.pending_config_state)
+
+    def test_config_diff_includes_settings_only_when_changed(self):
+        from simo.fleet.utils import get_config_state, get_config_diff
+
+        config = {
+            'devices': {
+                '1': {'type': 'Switch', 'val': False, 'config': {'pin': 1}},
+            },
+            'interfaces': {'i2c-1': {'pin_a': 1, 'pin_b': 2}},
+            'settings': {'name': 'C1'},
+        }
+        old = get_config_state(config)
+        config['devices']['1']['config'] = {'pin': 5}
+        new = get_config_state(config)
+
+        # Colonel reporting device hashes only
+        reported = {'hash': old['hash'], 'devices': old['devices']}
+        diff = get_config_diff(reported, config, new)
+        self.assertEqual(list(diff['update']), ['1'])
+        self.assertNotIn('interfaces', diff)
+        self.assertNotIn('settings', diff)
+
+        config['settings'] = {'name': 'C2'}
+        new = get_config_state(config)
+        diff = get_config_diff(reported, config, new)
+        self.assertEqual(diff['settings'], {'name': 'C2'})
+        self.assertEqual(diff['interfaces'], config['interfaces'])
+
+        diff = get_config_diff(dict(reported, interfaces=old['interfaces'],
+                                    settings=old['settings']), config, new)
+        self.assertEqual(diff['settings'], {'name': 'C2'})
+        self.assertNotIn('interfaces', diff)
+
+    def test_update_config_bumps_colonel_config_version(self):
+        self.colonel.update_config()
+        self.colonel.update_config()
+        self.colonel.save()
+
+        self.colonel.refresh_from_db()
+        self.assertEqual(self.colonel.config_version, 2)
+
     def test_decode_device_audio_wrong_channel_returns_none(self):
         from simo.fleet.socket_consumers import FleetConsumer, SPK_CHANNEL_ID
 
@@ -0,0 +1,105 @@
+import datetime
+from unittest import mock
+
+from django.utils import timezone
+
+from simo.core.models import Component, ComponentHistory, Gateway, Zone
+from simo.fleet.models import Colonel
+
+from .base import BaseSimoTestCase, mk_instance
+
+
+class FleetLivenessSweepTests(BaseSimoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.inst = mk_instance('inst-a', 'A')
+        self.zone = Zone.objects.create(instance=self.inst, name='Z', order=0)
+        from simo.fleet.gateways import FleetGatewayHandler
+
+        self.gw, _ = Gateway.objects.get_or_create(type=FleetGatewayHandler.uid)
+        self.colonel = Colonel.objects.create(
+            instance=self.inst, uid='c-1', type='game-changer', name='C1'
+        )
+        Colonel.objects.filter(id=self.colonel.id).update(
+            socket_connected=True,
+            last_seen=timezone.now() - datetime.timedelta(minutes=5),
+        )
+
+    def _mk_components(self, count):
+        from simo.fleet.controllers import Switch
+
+        comps = []
+        for i in range(count):
+            comp = Component.objects.create(
+                name=f'S{i}', zone=self.zone, category=None,
+                gateway=self.gw, base_type='switch',
+                controller_uid=Switch.uid, config={}, meta={}, value=False,
+            )
+            self.colonel.components.add(comp)
+            comps.append(comp)
+        return comps
+
+    def test_components_of_lost_colonel_marked_offline_in_bulk(self):
+        from simo.fleet.tasks import check_colonel_components_alive
+
+        comps = self._mk_components(3)
+        dead = comps[2]
+        Component.objects.filter(id=dead.id).update(alive=False)
+
+        with mock.patch(
+            'simo.core.events.ObjectChangeEvent.publish', autospec=True
+        ) as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                check_colonel_components_alive()
+
+        self.assertFalse(
+            Component.objects.filter(colonel=self.colonel, alive=True).exists()
+        )
+        history = ComponentHistory.objects.filter(alive=False)
+        self.assertEqual(
+            set(history.values_list('component_id', flat=True)),
+            {comps[0].id, comps[1].id},
+        )
+        published = {
+            call.args[0].obj.id: call.args[0].data for call in publish.call_args_list
+        }
+        self.assertEqual(set(published), {comps[0].id, comps[1].id})
+        for data in published.values():
+            self.assertIs(data['alive'], False)
+            self.assertIs(data['dirty_fields']['alive'], False)
+
+    def test_sweep_query_count_does_not_grow_with_components(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from simo.fleet.tasks import check_colonel_components_alive
+
+        def sweep_queries():
+            with mock.patch(
+                'simo.core.events.ObjectChangeEvent.publish', autospec=True
+            ):
+                with self.captureOnCommitCallbacks(execute=False):
+                    with CaptureQueriesContext(connection) as ctx:
+                        check_colonel_components_alive()
+            return len(ctx.captured_queries)
+
+        self._mk_components(2)
+        few = sweep_queries()
+
+        Component.objects.update(alive=True)
+        self._mk_components(20)
+        many = sweep_queries()
+
+        self.assertFalse(Component.objects.filter(alive=True).exists())
+        self.assertEqual(few, many)
+
+    def test_lost_colonels_marked_disconnected_with_action(self):
+        from actstream.models import Action
+        from simo.fleet.tasks import check_colonels_connected
+
+        check_colonels_connected()
+
+        self.colonel.refresh_from_db()
+        self.assertFalse(self.colonel.socket_connected)
+        self.assertTrue(Action.objects.filter(
+            verb='disconnected', target_object_id=str(self.colonel.id),
+        ).exists())
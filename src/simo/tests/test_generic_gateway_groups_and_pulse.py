@@ -1,6 +1,11 @@
+import json
 import time
+from types import SimpleNamespace
 from unittest import mock
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
 from simo.core.models import Component, Gateway, Zone
 
 from .base import BaseSimoTestCase, mk_instance
@@ -60,11 +65,15 @@ class GenericGatewayGroupsAndPulseTests(BaseSimoTestCase):
             value=False,
         )
 
-        with mock.patch('simo.core.events.OnChangeMixin.on_change', autospec=True) as on_change:
-            handler.watch_groups()
+        handler.watch_groups()
 
         self.assertEqual(handler.group_buttons.get(btn.id), {group.id})
-        on_change.assert_called_once()
+        button, group_ids = handler.group_button_dispatch[btn.id]
+        self.assertEqual(button, btn)
+        self.assertEqual(group_ids, [group.id])
+        self._dummy_mqtt_hub.subscribe.assert_any_call(
+            'SIMO/obj-state/+/Component/+', handler.on_group_event
+        )
 
     def test_watch_group_button_click_calls_toggle(self):
         from simo.generic.controllers import SwitchGroup
@@ -93,7 +102,7 @@ class GenericGatewayGroupsAndPulseTests(BaseSimoTestCase):
             meta={},
             value=False,
         )
-        handler.group_buttons[btn.id] = {group.id}
+        handler.watch_groups()
 
         with mock.patch('simo.core.controllers.Switch.toggle', autospec=True) as toggle:
             handler.watch_group_button(btn)
@@ -126,7 +135,7 @@ class GenericGatewayGroupsAndPulseTests(BaseSimoTestCase):
             meta={},
             value=False,
         )
-        handler.group_buttons[btn.id] = {group.id}
+        handler.watch_groups()
 
         with mock.patch('simo.core.controllers.Switch.send', autospec=True) as send:
             handler.watch_group_button(btn)
@@ -160,12 +169,113 @@ class GenericGatewayGroupsAndPulseTests(BaseSimoTestCase):
             meta={},
             value=0,
         )
-        handler.group_buttons[btn.id] = {group.id}
+        handler.watch_groups()
 
         with mock.patch('simo.core.controllers.Dimmer.fade_down', autospec=True, return_value=None) as fade_down:
             handler.watch_group_button(btn)
         fade_down.assert_called_once()
 
+    def _mk_event(self, component, retain=False, **data):
+        from simo.core.events import ObjectChangeEvent
+
+        event = ObjectChangeEvent(self.inst, component, **data)
+        event.data['timestamp'] = time.time()
+        return SimpleNamespace(
+            topic=event.get_topic(), payload=json.dumps(event.data),
+            retain=retain,
+        )
+
+    def _mk_button(self, name, **kwargs):
+        return Component(
+            name=name, zone=self.zone, category=None, gateway=self.gw,
+            base_type='button', controller_uid='x', config={}, meta={},
+            value='up', **kwargs
+        )
+
+    def _mk_group(self, name, button_ids, **kwargs):
+        from simo.generic.controllers import SwitchGroup
+
+        return Component(
+            name=name, zone=self.zone, category=None, gateway=self.gw,
+            base_type='switch', controller_uid=SwitchGroup.uid,
+            config={'controls': [{'button': b_id} for b_id in button_ids]},
+            meta={}, value=False, **kwargs
+        )
+
+    def test_group_button_press_loads_groups_in_one_query(self):
+        handler = self._mk_handler()
+        btn = self._mk_button('B')
+        btn.save()
+        groups = [self._mk_group('G1', [btn.id]), self._mk_group('G2', [btn.id])]
+        for group in groups:
+            group.save()
+        handler.watch_groups()
+
+        msg = self._mk_event(btn, value='click', dirty_fields={'value': 'up'})
+        with (
+            mock.patch('simo.core.controllers.Switch.toggle', autospec=True) as toggle,
+            CaptureQueriesContext(connection) as ctx,
+        ):
+            handler.on_group_event(None, None, msg)
+
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(
+            [call.args[0].component for call in toggle.call_args_list], groups
+        )
+
+        # retained (replayed) events are not button presses
+        with mock.patch('simo.core.controllers.Switch.toggle', autospec=True) as toggle:
+            handler.on_group_event(None, None, self._mk_event(
+                btn, retain=True, value='click', dirty_fields={'value': 'up'}
+            ))
+        toggle.assert_not_called()
+
+    def test_config_change_event_rebuilds_dispatch_table(self):
+        handler = self._mk_handler()
+        btn = self._mk_button('B')
+        btn.save()
+        group = self._mk_group('G', [])
+        group.save()
+        handler.watch_groups()
+        self.assertEqual(handler.group_button_dispatch, {})
+
+        group.config['controls'] = [{'button': btn.id}]
+        group.save(update_fields=['config'])
+        handler.on_group_event(None, None, self._mk_event(
+            group, dirty_fields={'config': {}}
+        ))
+        self.assertEqual(handler.group_button_dispatch[btn.id][1], [group.id])
+
+        btn.config['btn_type'] = 'toggle'
+        btn.save(update_fields=['config'])
+        handler.on_group_event(None, None, self._mk_event(
+            btn, dirty_fields={'config': {}}
+        ))
+        self.assertEqual(
+            handler.group_button_dispatch[btn.id][0].config['btn_type'], 'toggle'
+        )
+
+    def test_group_button_toggles_current_group_value(self):
+        from simo.generic.controllers import SwitchGroup
+
+        handler = self._mk_handler()
+        btn = self._mk_button('B')
+        btn.save()
+        group = self._mk_group('G', [btn.id])
+        group.save()
+        handler.watch_groups()
+        msg = self._mk_event(btn, value='click', dirty_fields={'value': 'up'})
+
+        with mock.patch.object(SwitchGroup, 'send', autospec=True) as send:
+            handler.on_group_event(None, None, msg)
+            # Switched on from the app in the meantime
+            Component.objects.filter(id=group.id).update(value=True)
+            handler.on_group_event(None, None, msg)
+
+        self.assertEqual(
+            [call.args[1] for call in send.call_args_list], [True, False]
+        )
+
     def test_start_pulse_sends_true_and_tracks_switch(self):
         from simo.generic.controllers import SwitchGroup
 
@@ -326,6 +326,48 @@ class GenericGatewayPeriodicTests(BaseSimoTestCase):
         comp.refresh_from_db()
         self.assertGreater(comp.meta.get('last_battery_warning', 0), 0)
 
+    def test_generic_low_battery_notifications_digest_per_instance(self):
+        from simo.notifications.models import Notification, UserNotification
+
+        handler = self._mk_generic_handler()
+        role = mk_role(self.inst, is_owner=True, is_superuser=True)
+        mk_instance_user(mk_user('o3@example.com', 'O3'), self.inst, role)
+        mk_instance_user(mk_user('o4@example.com', 'O4'), self.inst, role)
+
+        comps = [
+            Component.objects.create(
+                name=f'B{i}',
+                zone=self.zone,
+                category=None,
+                gateway=self.generic_gw,
+                base_type='switch',
+                controller_uid='x',
+                config={},
+                meta={'keep': i},
+                value=False,
+                battery_level=10 + i,
+            ) for i in range(3)
+        ]
+
+        with (
+            mock.patch('simo.generic.gateways.timezone.localtime', autospec=True, return_value=SimpleNamespace(hour=8)),
+            mock.patch('simo.automation.helpers.be_or_not_to_be', autospec=True, return_value=True),
+            self.captureOnCommitCallbacks(execute=False),
+        ):
+            handler.low_battery_notifications()
+
+        notification = Notification.objects.get()
+        self.assertIsNone(notification.component)
+        for comp in comps:
+            self.assertIn(f'{comp}: {comp.battery_level}%', notification.body)
+        self.assertEqual(
+            UserNotification.objects.filter(notification=notification).count(), 2
+        )
+        for i, comp in enumerate(comps):
+            comp.refresh_from_db()
+            self.assertGreater(comp.meta.get('last_battery_warning', 0), 0)
+            self.assertEqual(comp.meta.get('keep'), i)
+
     def test_generic_watch_thermostats_calls_evaluate(self):
         from simo.generic.controllers import Thermostat
 
@@ -1,11 +1,17 @@
 import datetime
+import json
+import time
+from types import SimpleNamespace
 from unittest import mock
 
 import pytz
 
 from simo.core.models import Component, Gateway, Zone
 
-from .base import BaseSimoTestCase, mk_instance
+from .base import (
+    BaseSimoTestCase, mk_instance, mk_instance_user, mk_role, mk_user
+)
+from .test_generic_gateway_groups_and_pulse import FakeMqttClient
 
 
 class MainStateTests(BaseSimoTestCase):
@@ -76,3 +82,117 @@ class MainStateTests(BaseSimoTestCase):
             mock.patch('simo.generic.controllers.timezone.localtime', autospec=True, return_value=localtime),
         ):
             self.assertEqual(self.component.controller._get_day_evening_night_morning(), 'morning')
+
+    def _fake_sun(self, localtime):
+        vilnius = pytz.timezone('Europe/Vilnius')
+        fake_sun = mock.Mock()
+        fake_sun.get_sunrise_time.return_value = vilnius.localize(
+            datetime.datetime.combine(localtime.date(), datetime.time(8))
+        )
+        fake_sun.get_sunset_time.return_value = vilnius.localize(
+            datetime.datetime.combine(localtime.date(), datetime.time(16))
+        )
+        return fake_sun
+
+    def test_next_check_is_at_nearest_schedule_boundary(self):
+        vilnius = pytz.timezone('Europe/Vilnius')
+        localtime = vilnius.localize(datetime.datetime(2024, 1, 1, 15, 0, 0))
+        self.component.config['away_on_no_action'] = 30
+
+        with (
+            mock.patch('simo.automation.helpers.LocalSun', autospec=True, return_value=self._fake_sun(localtime)),
+            mock.patch('simo.generic.controllers.timezone.localtime', autospec=True, return_value=localtime),
+        ):
+            # sunset
+            self.assertEqual(
+                self.component.controller._get_next_check_time(),
+                vilnius.localize(datetime.datetime(2024, 1, 1, 16)).timestamp() + 1
+            )
+            # end of no action period comes first
+            last_action = localtime.timestamp() - 25 * 60
+            self.assertEqual(
+                self.component.controller._get_next_check_time(last_action),
+                last_action + 30 * 60 + 1
+            )
+
+    def _mk_handler(self):
+        from simo.generic.gateways import GenericGatewayHandler
+
+        with mock.patch('simo.core.gateways.mqtt.Client', autospec=True, return_value=FakeMqttClient()):
+            handler = GenericGatewayHandler(self.gateway)
+        handler.logger = mock.Mock()
+        return handler
+
+    def _mk_event(self, obj, **data):
+        from simo.core.events import ObjectChangeEvent
+
+        event = ObjectChangeEvent(self.inst, obj, **data)
+        event.data['timestamp'] = time.time()
+        return SimpleNamespace(
+            topic=event.get_topic(), payload=json.dumps(event.data, default=str),
+            retain=False,
+        )
+
+    def test_security_sensor_event_rechecks_main_state_of_its_instance(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        sensor = Component.objects.create(
+            name='Motion', zone=self.zone, category=None, gateway=self.gateway,
+            base_type='binary-sensor', alarm_category='security',
+            controller_uid='x', config={}, meta={}, value=False,
+        )
+        handler = self._mk_handler()
+        handler.build_main_states()
+        self._dummy_mqtt_hub.subscribe.assert_any_call(
+            'SIMO/obj-state/+/Component/+', handler.on_main_state_component_event
+        )
+        handler.main_state_due[self.component.id] = time.time() + 3600
+        handler.main_state_wakeup.clear()
+
+        with CaptureQueriesContext(connection) as ctx:
+            handler.on_main_state_component_event(None, None, self._mk_event(
+                sensor, value=True, dirty_fields={'value': False}
+            ))
+
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(handler.main_state_due[self.component.id], 0)
+        self.assertTrue(handler.main_state_wakeup.is_set())
+        self.assertAlmostEqual(
+            handler.last_sensor_actions[self.inst.id], time.time(), delta=5
+        )
+
+    def test_only_presence_changes_of_instance_users_recheck_main_state(self):
+        iuser = mk_instance_user(
+            mk_user('u@example.com', 'U'), self.inst, mk_role(self.inst)
+        )
+        handler = self._mk_handler()
+        handler.build_main_states()
+        handler.main_state_due[self.component.id] = time.time() + 3600
+
+        handler.on_main_state_iuser_event(None, None, self._mk_event(
+            iuser, last_seen=time.time(), dirty_fields={'last_seen': None}
+        ))
+        self.assertGreater(handler.main_state_due[self.component.id], 0)
+
+        handler.on_main_state_iuser_event(None, None, self._mk_event(
+            iuser, at_home=False, dirty_fields={'at_home': True}
+        ))
+        self.assertEqual(handler.main_state_due[self.component.id], 0)
+
+    def test_update_main_state_schedules_next_check(self):
+        from simo.generic.controllers import MainState
+
+        handler = self._mk_handler()
+        handler.build_main_states()
+        next_check = time.time() + 1234
+
+        with (
+            mock.patch.object(handler, 'watch_main_state', autospec=True) as watch,
+            mock.patch.object(MainState, '_get_next_check_time', autospec=True, return_value=next_check),
+        ):
+            handler.main_state_due[self.component.id] = time.time() + 60
+            handler.update_main_state(self.component.id)
+
+        watch.assert_called_once()
+        self.assertEqual(handler.main_state_due[self.component.id], next_check)
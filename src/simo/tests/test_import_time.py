@@ -0,0 +1,66 @@
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+
+# Seconds django.setup() together with gateway handlers may take to import
+# in a fresh process. Slow machines can raise it with SIMO_IMPORT_BUDGET.
+IMPORT_BUDGET = float(os.environ.get('SIMO_IMPORT_BUDGET', 5))
+
+# Must only be imported once they are actually needed
+LAZY_PACKAGES = ('librosa', 'pydub', 'lameenc', 'websockets')
+
+GATEWAY_PROCESS_CODE = """
+import time
+started = time.perf_counter()
+import django
+django.setup()
+import simo.generic.gateways, simo.fleet.gateways, simo.automation.gateways
+print(time.perf_counter() - started)
+"""
+
+IMPORT_TIME_LINE = re.compile(
+    r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)'
+)
+
+
+class ImportTimeBudgetTests(SimpleTestCase):
+    def _run_gateway_process_imports(self):
+        env = dict(os.environ)
+        env['DJANGO_SETTINGS_MODULE'] = settings.SETTINGS_MODULE
+        env['PYTHONPATH'] = os.pathsep.join(p for p in sys.path if p)
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', GATEWAY_PROCESS_CODE],
+            env=env, capture_output=True, text=True, timeout=120,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+        imports = {}
+        for line in result.stderr.splitlines():
+            match = IMPORT_TIME_LINE.match(line)
+            if match:
+                imports[match.group(4)] = int(match.group(2))
+        return float(result.stdout.strip().splitlines()[-1]), imports
+
+    def test_gateway_process_startup_within_budget(self):
+        took, imports = self._run_gateway_process_imports()
+        top_level = {
+            name: cumulative for name, cumulative in imports.items()
+            if '.' not in name
+        }
+        slowest = sorted(top_level.items(), key=lambda i: -i[1])[:10]
+
+        loaded = sorted({
+            name.split('.')[0] for name in imports
+        } & set(LAZY_PACKAGES))
+        self.assertEqual(loaded, [])
+        self.assertLess(
+            took, IMPORT_BUDGET,
+            f"django.setup() with gateway handlers took {took:.2f}s, "
+            "slowest imports: " + ', '.join(
+                f"{name} {us / 1000:.0f}ms" for name, us in slowest
+            )
+        )
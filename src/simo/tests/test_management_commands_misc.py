@@ -126,3 +126,61 @@ class OnHttpStartCommandTests(BaseSimoTestCase):
             call_command('on_http_start')
 
         self.assertFalse(Gateway.objects.filter(type='x.H2').exists())
+
+
+class BenchmarkLoadCommandTests(BaseSimoTestCase):
+    def test_summarize_reports_milliseconds(self):
+        from simo.core.management.commands.benchmark_load import summarize
+
+        self.assertIsNone(summarize([]))
+        report = summarize([i / 1000 for i in range(1, 101)])
+        self.assertEqual(report['p50'], 51)
+        self.assertEqual(report['p99'], 100)
+        self.assertEqual(report['max'], 100)
+        self.assertEqual(report['mean'], 50.5)
+
+    def test_read_cpu_seconds(self):
+        import os
+        from simo.core.management.commands.benchmark_load import (
+            read_cpu_seconds,
+        )
+
+        if not os.path.exists('/proc/self/stat'):
+            self.skipTest('procfs is not available')
+        self.assertGreaterEqual(read_cpu_seconds(os.getpid()), 0)
+        self.assertIsNone(read_cpu_seconds(-1))
+
+    def test_call_stats_wrap(self):
+        from simo.core.management.commands.benchmark_load import CallStats
+
+        stats = CallStats()
+        wrapped = stats.wrap(lambda x: x * 2)
+        self.assertEqual(wrapped(2), 4)
+        self.assertEqual(wrapped(3), 6)
+        self.assertEqual(stats.report()['calls'], 2)
+        stats.reset()
+        self.assertIsNone(stats.report())
+
+    def test_fixture_is_created_and_removed(self):
+        from simo.core.management.commands.benchmark_load import Fixture
+        from simo.core.models import Instance
+        from simo.fleet.models import Colonel
+        from simo.users.models import User
+
+        fixture = Fixture(colonels=2, components=5, app_users=3)
+        fixture.create()
+        self.assertEqual(
+            Colonel.objects.filter(instance=fixture.instance).count(), 2
+        )
+        self.assertEqual(
+            sorted(c.config['colonel'] for c in fixture.components),
+            sorted([fixture.colonels[0].id] * 3 + [fixture.colonels[1].id] * 2)
+        )
+        headers = dict(fixture.get_colonel_headers(fixture.colonels[0]))
+        self.assertEqual(headers[b'instance-secret'], fixture.secret.encode())
+
+        fixture.delete()
+        self.assertFalse(Instance.objects.filter(uid=fixture.uid).exists())
+        self.assertFalse(
+            User.objects.filter(email__startswith=fixture.uid).exists()
+        )
@@ -21,18 +21,21 @@ class NotificationDispatchTests(BaseSimoTestCase):
         n = Notification.objects.create(instance=inst, severity='info', title='T')
         un = UserNotification.objects.create(user=user, notification=n)
 
-        import simo.notifications.models as notif_models
+        from simo.notifications.delivery import PostmasterClient
 
-        resp = mock.Mock()
+        resp = mock.Mock(status_code=200)
         resp.json.return_value = {'status': 'success'}
 
-        notif_models.requests.post.reset_mock()
-        notif_models.requests.post.return_value = resp
+        PostmasterClient._send.reset_mock()
+        PostmasterClient._send.return_value = resp
 
-        with mock.patch('simo.notifications.models.dynamic_settings', {'core__hub_secret': 'hs'}):
+        with mock.patch('simo.notifications.delivery.dynamic_settings', {'core__hub_secret': 'hs'}):
             n.dispatch()
 
-        notif_models.requests.post.assert_called_once()
+        PostmasterClient._send.assert_called_once()
+        payload = PostmasterClient._send.call_args.args[1]
+        self.assertEqual(payload['to_tokens'], ['ios--t1'])
+        self.assertEqual(payload['hub_secret'], 'hs')
         un.refresh_from_db()
         self.assertIsNotNone(un.sent)
 
@@ -45,16 +48,283 @@ class NotificationDispatchTests(BaseSimoTestCase):
         n = Notification.objects.create(instance=inst, severity='info', title='T')
         un = UserNotification.objects.create(user=user, notification=n)
 
-        import simo.notifications.models as notif_models
+        device = UserDevice.objects.create(os='ios', token='t1', is_primary=True)
+        device.users.add(user)
 
-        resp = mock.Mock()
+        from simo.notifications.delivery import PostmasterClient
+
+        resp = mock.Mock(status_code=200)
         resp.json.return_value = {'status': 'error'}
 
-        notif_models.requests.post.reset_mock()
-        notif_models.requests.post.return_value = resp
+        PostmasterClient._send.reset_mock()
+        PostmasterClient._send.return_value = resp
 
-        with mock.patch('simo.notifications.models.dynamic_settings', {'core__hub_secret': 'hs'}):
+        with mock.patch('simo.notifications.delivery.dynamic_settings', {'core__hub_secret': 'hs'}):
             n.dispatch()
 
+        PostmasterClient._send.assert_called_once()
+
         un.refresh_from_db()
         self.assertIsNone(un.sent)
+
+
+from simo.notifications.delivery import PostmasterClient
+
+# Captured at import time, before BaseSimoTestCase patches it out.
+_real_send = PostmasterClient._send
+
+
+class _StubPostmaster:
+    """Local postmaster stub recording received payloads."""
+
+    def __init__(self, responses):
+        import json
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.received = []
+        self.connections = set()
+        responses = list(responses)
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                stub.received.append(json.loads(self.rfile.read(length)))
+                stub.connections.add(self.client_address)
+                status, body = responses.pop(0) if len(responses) > 1 \
+                    else responses[0]
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:%d/postmaster/' % self.server.server_port
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class NotificationDeliveryStubServerTests(BaseSimoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.inst = mk_instance('inst-a', 'A')
+        role = mk_role(self.inst, is_superuser=True)
+        self.users = []
+        for i in range(3):
+            user = mk_user(f'u{i}@example.com', f'U{i}')
+            mk_instance_user(user, self.inst, role, is_active=True)
+            device = UserDevice.objects.create(
+                os='android', token=f't{i}', is_primary=True
+            )
+            device.users.add(user)
+            self.users.append(user)
+
+    def _mk_notifications(self, count):
+        notifications = []
+        for i in range(count):
+            n = Notification.objects.create(
+                instance=self.inst, severity='alarm', title=f'N{i}'
+            )
+            for user in self.users:
+                UserNotification.objects.create(user=user, notification=n)
+            notifications.append(n)
+        return notifications
+
+    def _run(self, stub, notifications, dispatch=None, send=_real_send,
+             **config):
+        from django.test import override_settings
+        from simo.notifications.delivery import (
+            dispatch_notifications, get_postmaster_client
+        )
+
+        config = {'postmaster_url': stub.url, 'backoff_seconds': 0, **config}
+        get_postmaster_client().batch_supported = True
+        with override_settings(SIMO_NOTIFICATIONS=config), \
+        mock.patch.object(PostmasterClient, '_send', send), \
+        mock.patch(
+            'simo.notifications.delivery.dynamic_settings',
+            {'core__hub_secret': 'hs'}
+        ):
+            return (dispatch or dispatch_notifications)(notifications)
+
+    def test_connection_is_reused_and_tokens_resolved_in_one_query(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        stub = _StubPostmaster([(200, {'status': 'success'})])
+        self.addCleanup(stub.close)
+        notifications = self._mk_notifications(5)
+
+        with CaptureQueriesContext(connection) as ctx:
+            delivered = self._run(stub, notifications)
+
+        self.assertEqual(delivered, 5)
+        self.assertEqual(len(stub.received), 5)
+        self.assertEqual(len(stub.connections), 1)
+        self.assertEqual(
+            sorted(stub.received[0]['to_tokens']),
+            ['android--t0', 'android--t1', 'android--t2'],
+        )
+        self.assertFalse(
+            UserNotification.objects.filter(sent__isnull=True).exists()
+        )
+        # user notifications, device tokens and one bulk "sent" update
+        self.assertLessEqual(len(ctx.captured_queries), 3 + len(notifications))
+
+    def test_pending_notifications_are_batched(self):
+        stub = _StubPostmaster([(200, {'status': 'success'})])
+        self.addCleanup(stub.close)
+        notifications = self._mk_notifications(4)
+
+        delivered = self._run(stub, notifications, batch=True)
+
+        self.assertEqual(delivered, 4)
+        self.assertEqual(len(stub.received), 1)
+        self.assertEqual(
+            [n['notification_id'] for n in stub.received[0]['notifications']],
+            [n.id for n in notifications],
+        )
+
+    def test_dispatch_task_collects_undelivered_notifications(self):
+        from simo.notifications.utils import dispatch_notification_now
+
+        stub = _StubPostmaster([(200, {'status': 'success'})])
+        self.addCleanup(stub.close)
+        notifications = self._mk_notifications(3)
+        pending = self._mk_notifications(1)[0]
+        Notification.objects.filter(id=pending.id).update(is_pending=True)
+        cancelled = self._mk_notifications(1)[0]
+        Notification.objects.filter(id=cancelled.id).update(
+            cancelled=timezone.now()
+        )
+
+        self._run(
+            stub, notifications[-1].id, dispatch=dispatch_notification_now,
+            batch=True,
+        )
+
+        self.assertEqual(len(stub.received), 1)
+        self.assertEqual(
+            [n['notification_id'] for n in stub.received[0]['notifications']],
+            [notifications[-1].id, notifications[0].id, notifications[1].id],
+        )
+        self.assertEqual(
+            set(UserNotification.objects.filter(
+                sent__isnull=True
+            ).values_list('notification_id', flat=True)),
+            {pending.id, cancelled.id}
+        )
+
+        # Nothing left to deliver for already batched notifications
+        self._run(
+            stub, notifications[0].id, dispatch=dispatch_notification_now,
+            batch=True,
+        )
+        self.assertEqual(len(stub.received), 1)
+
+    def test_notifications_claimed_by_other_worker_are_left_alone(self):
+        import datetime
+        from simo.notifications.utils import dispatch_notification_now
+
+        stub = _StubPostmaster([(200, {'status': 'success'})])
+        self.addCleanup(stub.close)
+        notifications = self._mk_notifications(3)
+        claimed = notifications[1]
+        Notification.objects.filter(id=claimed.id).update(
+            delivering=timezone.now()
+        )
+
+        self._run(
+            stub, notifications[0].id, dispatch=dispatch_notification_now,
+            batch=True,
+        )
+        self.assertEqual(
+            [n['notification_id'] for n in stub.received[0]['notifications']],
+            [notifications[0].id, notifications[2].id],
+        )
+        self.assertEqual(
+            list(Notification.objects.filter(
+                delivering__isnull=False
+            ).values_list('id', flat=True)),
+            [claimed.id]
+        )
+
+        self._run(
+            stub, claimed.id, dispatch=dispatch_notification_now, batch=True,
+        )
+        self.assertEqual(len(stub.received), 1)
+
+        # Claim of a worker that never finished expires
+        Notification.objects.filter(id=claimed.id).update(
+            delivering=timezone.now() - datetime.timedelta(hours=1)
+        )
+        self._run(
+            stub, claimed.id, dispatch=dispatch_notification_now, batch=True,
+        )
+        self.assertEqual(len(stub.received), 2)
+        self.assertEqual(stub.received[1]['notification_id'], claimed.id)
+        self.assertFalse(Notification.objects.filter(
+            delivering__isnull=False
+        ).exists())
+
+    def test_batching_falls_back_when_not_supported(self):
+        stub = _StubPostmaster([
+            (404, {'detail': 'not found'}), (200, {'status': 'success'})
+        ])
+        self.addCleanup(stub.close)
+
+        delivered = self._run(stub, self._mk_notifications(2), batch=True)
+
+        self.assertEqual(delivered, 2)
+        self.assertEqual(len(stub.received), 3)
+
+    def test_temporary_failures_are_retried(self):
+        from simo.notifications.delivery import delivery_stats
+
+        stub = _StubPostmaster([
+            (503, {}), (503, {}), (200, {'status': 'success'})
+        ])
+        self.addCleanup(stub.close)
+        delivery_stats.reset()
+
+        delivered = self._run(stub, self._mk_notifications(1))
+
+        self.assertEqual(delivered, 1)
+        self.assertEqual(len(stub.received), 3)
+        stats = delivery_stats.as_dict()
+        self.assertEqual(stats['retries'], 2)
+        self.assertEqual(stats['delivered'], 1)
+        self.assertIsNotNone(stats['latency_avg_ms'])
+
+    def test_read_timeouts_are_retried(self):
+        import requests
+
+        stub = _StubPostmaster([(200, {'status': 'success'})])
+        self.addCleanup(stub.close)
+        attempts = []
+
+        def _send(client, payload, config):
+            attempts.append(payload)
+            if len(attempts) == 1:
+                raise requests.ReadTimeout('read timed out')
+            return _real_send(client, payload, config)
+
+        delivered = self._run(stub, self._mk_notifications(1), send=_send)
+
+        self.assertEqual(delivered, 1)
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(len(stub.received), 1)
@@ -89,3 +89,84 @@ class NotifyUsersTests(BaseSimoTestCase):
         # Instance context is restored.
         self.assertIsNotNone(get_current_instance())
         self.assertEqual(get_current_instance().id, self.inst.id)
+
+    def test_recipients_created_in_bulk(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from simo.notifications.utils import create_notification
+
+        role = mk_role(self.inst, is_superuser=True)
+        for i in range(2):
+            mk_instance_user(mk_user(f'a{i}@example.com', f'A{i}'), self.inst, role)
+
+        with CaptureQueriesContext(connection) as few:
+            create_notification(
+                'info', 'T', component=self.comp, instance=self.inst,
+                dispatch=False,
+            )
+
+        for i in range(10):
+            mk_instance_user(mk_user(f'b{i}@example.com', f'B{i}'), self.inst, role)
+
+        with CaptureQueriesContext(connection) as many:
+            create_notification(
+                'info', 'T', component=self.comp, instance=self.inst,
+                dispatch=False,
+            )
+
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+        self.assertEqual(
+            UserNotification.objects.filter(
+                notification=Notification.objects.order_by('-id').first()
+            ).count(),
+            12,
+        )
+
+    def test_recipients_follow_component_permissions(self):
+        from simo.notifications.utils import create_notification
+        from simo.users.models import ComponentPermission, InstanceUser
+
+        other = Component.objects.create(
+            name='O', zone=self.zone, category=None, gateway=self.gw,
+            base_type='switch', controller_uid='x', config={}, meta={},
+            value=False,
+        )
+        reader_role = mk_role(self.inst)
+        ComponentPermission.objects.create(
+            role=reader_role, component=self.comp, read=True
+        )
+        writer_role = mk_role(self.inst)
+        ComponentPermission.objects.create(
+            role=writer_role, component=other, write=True
+        )
+        reader = mk_instance_user(
+            mk_user('r@example.com', 'R'), self.inst, reader_role
+        )
+        writer = mk_instance_user(
+            mk_user('w@example.com', 'W'), self.inst, writer_role
+        )
+        master = mk_instance_user(
+            mk_user('m@example.com', 'M', is_master=True), self.inst,
+            mk_role(self.inst)
+        )
+
+        with self.assertNumQueries(1):
+            readable = InstanceUser.get_readable_components(
+                [reader, writer, master], [self.comp, other]
+            )
+        self.assertEqual(readable[reader], [self.comp])
+        self.assertEqual(readable[writer], [other])
+        self.assertEqual(readable[master], [self.comp, other])
+        self.assertTrue(reader.can_read(self.comp))
+        self.assertFalse(reader.can_read(other))
+
+        notification = create_notification(
+            'info', 'T', component=self.comp, instance=self.inst,
+            dispatch=False,
+        )
+        self.assertEqual(
+            set(notification.user_notifications.values_list(
+                'user_id', flat=True
+            )),
+            {reader.user_id, master.user_id}
+        )
@@ -1,3 +1,4 @@
+import os
 from unittest import mock
 
 from asgiref.sync import async_to_sync
@@ -175,3 +176,56 @@ class WebsocketConsumersTests(BaseSimoTransactionTestCase):
             with mock.patch('simo.core.socket_consumers.get_log_file_path', autospec=True, return_value=tmp.name), \
                     mock.patch('simo.core.socket_consumers.asyncio.create_task', side_effect=_discard_task):
                 async_to_sync(run)()
+
+    def test_log_consumers_share_watcher_and_get_new_lines(self):
+        from simo.core.log_watcher import get_log_watcher
+        from simo.core.socket_consumers import LogConsumer
+        from simo.generic.controllers import SwitchGroup
+        from django.contrib.contenttypes.models import ContentType
+
+        gw, _ = Gateway.objects.get_or_create(type='simo.generic.gateways.GenericGatewayHandler')
+        comp = Component.objects.create(
+            name='C', zone=self.zone_a, category=None, gateway=gw,
+            base_type='switch', controller_uid=SwitchGroup.uid,
+            config={}, meta={}, value=False,
+        )
+        user = mk_user('su@example.com', 'SU')
+        mk_instance_user(user, self.inst_a, mk_role(self.inst_a, is_superuser=True))
+        user = User.objects.get(pk=user.pk)
+        ct = ContentType.objects.get_for_model(Component)
+
+        import tempfile
+
+        tmp = tempfile.NamedTemporaryFile(mode='w+', delete=False)
+        self.addCleanup(os.remove, tmp.name)
+        tmp.write('[INFO] hello\n')
+        tmp.flush()
+
+        async def run():
+            communicators = []
+            for _ in range(2):
+                communicator = WebsocketCommunicator(
+                    LogConsumer.as_asgi(), '/ws/log/%d/%d/' % (ct.id, comp.id)
+                )
+                communicator.scope['url_route'] = {
+                    'kwargs': {'ct_id': str(ct.id), 'object_pk': str(comp.id)}
+                }
+                communicator.scope['user'] = user
+                connected, _ = await communicator.connect()
+                self.assertTrue(connected)
+                self.assertIn('hello', await communicator.receive_from(timeout=1))
+                communicators.append(communicator)
+
+            self.assertEqual(len(get_log_watcher()._files), 1)
+            tmp.write('[ERROR] boom\n')
+            tmp.flush()
+            for communicator in communicators:
+                msg = await communicator.receive_from(timeout=2)
+                self.assertIn('code-error', msg)
+                self.assertIn('boom', msg)
+                await communicator.disconnect()
+            self.assertEqual(get_log_watcher()._files, {})
+
+        with mock.patch('simo.core.socket_consumers.get_log_file_path', autospec=True, return_value=tmp.name):
+            async_to_sync(run)()
+        tmp.close()
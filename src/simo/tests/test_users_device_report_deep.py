@@ -1,6 +1,7 @@
 import datetime
 from unittest import mock
 
+from django.test import override_settings
 from django.utils import timezone
 from rest_framework.test import APIClient
 
@@ -9,6 +10,7 @@ from simo.users.models import User, UserDeviceReportLog
 from .base import BaseSimoTestCase, mk_instance, mk_user, mk_role, mk_instance_user
 
 
+@override_settings(SIMO_DEVICE_REPORTS={'log_flush_interval': 0})
 class DeviceReportDeepTests(BaseSimoTestCase):
     def setUp(self):
         super().setUp()
@@ -62,3 +64,130 @@ class DeviceReportDeepTests(BaseSimoTestCase):
             )
             self.assertEqual(resp.status_code, 200)
             self.assertEqual(UserDeviceReportLog.objects.count(), 1)
+
+    def _report(self, at, **data):
+        payload = {
+            'device_token': 'dev1', 'os': 'ios', 'location': '54.1,25.1',
+            'speed': 0, 'app_open': False, 'is_charging': False,
+        }
+        payload.update(data)
+        with mock.patch('simo.users.api.timezone.now', autospec=True, return_value=at):
+            resp = self.api.post(
+                f'/api/{self.inst.slug}/users/device-report/',
+                data=payload, format='json', HTTP_HOST='relay.simo.io',
+            )
+        self.assertEqual(resp.status_code, 200)
+
+    def test_average_speed_comes_from_rolling_window(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from simo.users.models import InstanceUser
+
+        t0 = timezone.now()
+        with mock.patch('simo.automation.helpers.haversine_distance', autospec=True, return_value=1500), \
+                mock.patch('simo.users.api.dynamic_settings', {'users__at_home_radius': 1000}), \
+                CaptureQueriesContext(connection) as ctx:
+            for i, speed in enumerate((10, 20, 30, 40)):
+                self._report(
+                    t0 + datetime.timedelta(seconds=20 * i),
+                    location=f'54.{i},25.0', speed=speed,
+                )
+
+        self.assertFalse([
+            q for q in ctx.captured_queries
+            if q['sql'].startswith('SELECT') and 'userdevicereportlog' in q['sql']
+        ])
+        self.assertEqual(UserDeviceReportLog.objects.count(), 4)
+        self.assertEqual(UserDeviceReportLog.objects.first().avg_speed_kmh, 90)
+        iu = InstanceUser.objects.get(user=self.user, instance=self.inst)
+        self.assertEqual(iu.last_seen_speed_kmh, 90)
+        self.assertFalse(iu.at_home)
+
+    def test_instance_user_is_saved_only_on_changes(self):
+        from simo.users.models import InstanceUser
+
+        t0 = timezone.now()
+        with mock.patch('simo.automation.helpers.haversine_distance', autospec=True, return_value=0), \
+                mock.patch('simo.users.api.dynamic_settings', {'users__at_home_radius': 1000}), \
+                mock.patch.object(InstanceUser, 'save', autospec=True, side_effect=InstanceUser.save) as save:
+            self._report(t0)
+            self.assertEqual(save.call_count, 1)
+            # nothing has changed
+            self._report(t0 + datetime.timedelta(seconds=25))
+            self.assertEqual(save.call_count, 1)
+            self._report(t0 + datetime.timedelta(seconds=50), is_charging=True)
+            self.assertEqual(save.call_count, 2)
+            # last_seen is kept reasonably fresh
+            self._report(t0 + datetime.timedelta(seconds=120), is_charging=True)
+            self.assertEqual(save.call_count, 3)
+
+        self.assertEqual(UserDeviceReportLog.objects.count(), 4)
+        iu = InstanceUser.objects.get(user=self.user, instance=self.inst)
+        self.assertTrue(iu.phone_on_charge)
+        self.assertEqual(iu.last_seen, t0 + datetime.timedelta(seconds=120))
+
+
+class ReportLogWriterTests(BaseSimoTestCase):
+    def test_logs_are_written_in_batches(self):
+        from simo.users.device_reports import ReportLogWriter
+        from simo.users.models import UserDevice
+
+        inst = mk_instance('inst-a', 'A')
+        device = UserDevice.objects.create(os='ios', token='dev1')
+        writer = ReportLogWriter()
+        with mock.patch.object(writer, '_ensure_thread') as ensure_thread:
+            for i in range(3):
+                writer.add(
+                    user_device=device, instance=inst,
+                    location=f'54.{i},25.0', speed_kmh=i,
+                )
+            self.assertEqual(UserDeviceReportLog.objects.count(), 0)
+            ensure_thread.assert_called()
+
+        self.assertEqual(writer.flush(), 3)
+        self.assertEqual(
+            sorted(UserDeviceReportLog.objects.values_list('speed_kmh', flat=True)),
+            [0, 1, 2],
+        )
+
+
+class ReportWindowTests(BaseSimoTestCase):
+    def _point(self, ts, location='54.0,25.0', **data):
+        point = {
+            'ts': ts, 'location': location, 'speed_kmh': 0,
+            'app_open': False, 'relay': 'relay.simo.io',
+            'phone_on_charge': False, 'at_home': False,
+        }
+        point.update(data)
+        return point
+
+    def test_reports_are_compared_to_oldest_similar_one(self):
+        from simo.users.device_reports import ReportWindow
+
+        now = timezone.now().timestamp()
+        window = ReportWindow(1, 1)
+        window.add(self._point(now - 30, '54.0,25.0'))
+        window.add(self._point(now - 15, '54.1,25.0'))
+        window.add(self._point(now - 10, '54.2,25.0', app_open=True))
+        window.add(self._point(now - 5, '54.3,25.0'))
+
+        similar = window.get_last_similar(
+            now, '54.4,25.0', False, 'relay.simo.io', False, False
+        )
+        self.assertEqual(similar['location'], '54.1,25.0')
+
+    def test_concurrent_reports_do_not_drop_points(self):
+        from simo.users.device_reports import ReportWindow
+
+        now = timezone.now().timestamp()
+        first, second = ReportWindow(1, 1), ReportWindow(1, 1)
+        first.users.add(10)
+        first.add(self._point(now - 2))
+        second.users.add(20)
+        second.add(self._point(now - 1))
+        second.save()
+        first.save()
+
+        window = ReportWindow(1, 1)
+        self.assertEqual([p['ts'] for p in window.points], [now - 2, now - 1])
+        self.assertEqual(window.users, {10, 20})
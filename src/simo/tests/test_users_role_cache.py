@@ -0,0 +1,109 @@
+from unittest import mock
+
+from django.core.cache import cache
+
+from simo.core.models import Component, Gateway, Zone
+
+from .base import (
+    BaseSimoTestCase, mk_instance, mk_instance_user, mk_role, mk_user
+)
+
+
+class RoleCacheInvalidationTests(BaseSimoTestCase):
+    def setUp(self):
+        super().setUp()
+        from simo.generic.gateways import GenericGatewayHandler
+
+        self.inst = mk_instance('inst-a', 'A')
+        self.zone = Zone.objects.create(instance=self.inst, name='Z', order=0)
+        self.gw, _ = Gateway.objects.get_or_create(type=GenericGatewayHandler.uid)
+        self.role = mk_role(self.inst, is_owner=True)
+
+    def _mk_component(self, name):
+        return Component.objects.create(
+            name=name, zone=self.zone, category=None, gateway=self.gw,
+            base_type='switch', controller_uid='x', config={}, meta={},
+            value=False,
+        )
+
+    def _mk_users(self, count, start=0):
+        from simo.users.models import User
+
+        for i in range(start, start + count):
+            mk_instance_user(
+                mk_user(f'u{i}@example.com', f'U{i}'), self.inst, self.role
+            )
+        return list(User.objects.all())
+
+    def _cached_role(self, user):
+        from simo.users.models import User
+
+        # fresh object, so only shared cache is in play
+        return User.objects.get(pk=user.pk).get_role(self.inst)
+
+    def test_new_component_drops_cached_roles_of_its_instance(self):
+        user = self._mk_users(1)[0]
+        role = self._cached_role(user)
+        self.assertEqual(list(role.component_permissions.all()), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            comp = self._mk_component('S')
+
+        role = self._cached_role(user)
+        self.assertEqual(
+            [p.component_id for p in role.component_permissions.all()],
+            [comp.id]
+        )
+
+    def test_component_creation_cache_cost_does_not_grow_with_users(self):
+        def cache_calls(users, components):
+            for user in users:
+                self._cached_role(user)
+            with (
+                mock.patch.object(cache, 'delete', wraps=cache.delete) as delete,
+                mock.patch.object(cache, 'incr', wraps=cache.incr) as incr,
+                self.captureOnCommitCallbacks(execute=True),
+            ):
+                for i in range(components):
+                    self._mk_component(f'S{i}')
+            return delete.call_count + incr.call_count
+
+        few = cache_calls(self._mk_users(2), 3)
+        many = cache_calls(self._mk_users(40, start=2), 3)
+
+        self.assertEqual(few, many)
+
+    def test_cached_role_is_a_single_cache_round_trip(self):
+        user = self._mk_users(1)[0]
+        self._cached_role(user)
+
+        with (
+            mock.patch.object(cache, 'get', wraps=cache.get) as get,
+            mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many,
+        ):
+            role = self._cached_role(user)
+
+        self.assertEqual(role, self.role)
+        self.assertEqual(get.call_count + get_many.call_count, 1)
+
+    def test_lost_version_is_seeded_again_on_bump(self):
+        from simo.users.models import (
+            _roles_cache_version_key, bump_roles_cache_version,
+            get_cached_role,
+        )
+
+        user = self._mk_users(1)[0]
+        self._cached_role(user)
+        key = _roles_cache_version_key(self.inst.id)
+        version = cache.get(key)
+        cache.delete(key)
+
+        with mock.patch('simo.users.models.time.time', return_value=10 ** 7):
+            bump_roles_cache_version(self.inst.id)
+
+        self.assertEqual(cache.get(key), 10 ** 10)
+        self.assertNotEqual(cache.get(key), version)
+        # role cached with the lost version is not used anymore
+        self.assertEqual(
+            get_cached_role(user.id, self.inst.id), (None, 10 ** 10)
+        )
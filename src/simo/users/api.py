@@ -1,6 +1,5 @@
 import sys
 import pytz
-import datetime
 from django.db.models import Q
 from django.conf import settings
 from rest_framework import viewsets, mixins, status
@@ -14,9 +13,12 @@ from simo.conf import dynamic_settings
 from simo.core.api import InstanceMixin
 from simo.core.middleware import drop_current_instance
 from .models import (
-    User, UserDevice, UserDeviceReportLog, PermissionsRole, InstanceInvitation,
+    User, UserDevice, PermissionsRole, InstanceInvitation,
     Fingerprint, ComponentPermission, InstanceUser
 )
+from .device_reports import (
+    ReportWindow, report_log_writer, is_last_seen_stale
+)
 from .serializers import (
     UserSerializer, PermissionsRoleSerializer, InstanceInvitationSerializer,
     FingerprintSerializer, ComponentPermissionSerializer, InstanceUserSDKSerializer
@@ -244,9 +246,13 @@ class UserDeviceReport(InstanceMixin, viewsets.GenericViewSet):
             token=request.data['device_token'],
             defaults=defaults
         )
-        user_device.users.add(request.user)
+        window = ReportWindow(user_device.id, self.instance.id)
+        if request.user.id not in window.users:
+            user_device.users.add(request.user)
+            window.users.add(request.user.id)
 
         log_datetime = timezone.now()
+        ts = log_datetime.timestamp()
 
         relay = None
         if request.META.get('HTTP_HOST', '').endswith('.simo.io'):
@@ -266,30 +272,22 @@ class UserDeviceReport(InstanceMixin, viewsets.GenericViewSet):
             location = request.data.get('location')
             if 'null' in location:
                 location = None
-            sum = 0
-            no_of_points = 0
-            for speed in UserDeviceReportLog.objects.filter(
-                user_device=user_device, instance=self.instance,
-                datetime__lt=log_datetime - datetime.timedelta(seconds=3),
-                datetime__gt=log_datetime - datetime.timedelta(seconds=120),
-                at_home=False, location__isnull=False
-            ).values('speed_kmh',):
-                sum += speed['speed_kmh']
-                no_of_points += 1
-            if no_of_points > 2:
-                sum += speed_kmh
-                avg_speed_kmh = round(sum / (no_of_points + 1))
+            avg_speed_kmh = window.get_avg_speed(ts, speed_kmh)
         else:
             location = self.instance.location
 
-        user_device.last_seen = timezone.now()
-
+        device_changed = new
         if request.data.get('app_open', False) == True:
-            user_device.is_primary = True
-            UserDevice.objects.filter(
-                users=request.user
-            ).exclude(id=user_device.id).update(is_primary=False)
-        user_device.save()
+            if new or not user_device.is_primary:
+                user_device.is_primary = True
+                device_changed = True
+                UserDevice.objects.filter(
+                    users=request.user
+                ).exclude(id=user_device.id).update(is_primary=False)
+        if device_changed or is_last_seen_stale(
+            user_device.last_seen, log_datetime
+        ):
+            user_device.save()
 
         phone_on_charge = False
         if request.data.get('is_charging') == True:
@@ -306,9 +304,10 @@ class UserDeviceReport(InstanceMixin, viewsets.GenericViewSet):
         app_open = request.data.get('app_open', False)
 
         if self.reject_location_report(
-            log_datetime, user_device, location, app_open, relay,
+            log_datetime, window, location, app_open, relay,
             phone_on_charge, at_home, speed_kmh
         ):
+            window.save()
             # We respond with success status, so that the device dos not try to
             # report this data point again.
             return RESTResponse({'status': 'success'})
@@ -317,17 +316,25 @@ class UserDeviceReport(InstanceMixin, viewsets.GenericViewSet):
             #     status=status.HTTP_400_BAD_REQUEST
             # )
 
-        UserDeviceReportLog.objects.create(
+        report_log_writer.add(
             user_device=user_device, instance=self.instance,
             app_open=app_open,
             location=location, datetime=log_datetime,
             relay=relay, speed_kmh=speed_kmh, avg_speed_kmh=avg_speed_kmh,
             phone_on_charge=phone_on_charge, at_home=at_home
         )
+        window.add({
+            'ts': ts, 'location': location, 'speed_kmh': speed_kmh,
+            'app_open': app_open, 'relay': relay,
+            'phone_on_charge': phone_on_charge, 'at_home': at_home,
+        })
+        window.save()
 
         drop_current_instance()
 
-        for iu in request.user.instance_roles.filter(is_active=True):
+        for iu in request.user.instance_roles.filter(
+            is_active=True
+        ).select_related('role', 'instance'):
             if not relay:
                 iu.at_home = True
             elif location:
@@ -335,18 +342,24 @@ class UserDeviceReport(InstanceMixin, viewsets.GenericViewSet):
                     iu.instance.location, location
                 ) < dynamic_settings['users__at_home_radius']
 
-            iu.last_seen = user_device.last_seen
             if location:
                 iu.last_seen_location = location
             iu.last_seen_speed_kmh = avg_speed_kmh
             iu.phone_on_charge = phone_on_charge
+            # Only real changes are worth a write and change event,
+            # last_seen alone is refreshed every once in a while.
+            if not iu.is_dirty() and not is_last_seen_stale(
+                iu.last_seen, log_datetime
+            ):
+                continue
+            iu.last_seen = log_datetime
             iu.save()
 
         return RESTResponse({'status': 'success'})
 
 
     def reject_location_report(
-        self, log_datetime, user_device, location, app_open, relay,
+        self, log_datetime, window, location, app_open, relay,
         phone_on_charge, at_home, speed_kmh
     ):
         # Phone's App location repoorting is not always as reliable as we would like to
@@ -354,28 +367,23 @@ class UserDeviceReport(InstanceMixin, viewsets.GenericViewSet):
         # It has been observer that sometimes an app reports locations that are
         # way from past, therefore locations might jump out of the usual pattern,
         # so we try to filter out these anomalies to.
-        q = UserDeviceReportLog.objects.filter(
-            user_device=user_device, instance=self.instance,
-            app_open=app_open,
-            datetime__gt=log_datetime - datetime.timedelta(seconds=20),
-            relay=relay, phone_on_charge=phone_on_charge, at_home=at_home
+        ts = log_datetime.timestamp()
+        last_similar_report = window.get_last_similar(
+            ts, location, app_open, relay, phone_on_charge, at_home
         )
-        if location:
-            q = q.filter(location__isnull=False)
-        last_similar_report = q.last()
 
         if not last_similar_report:
             return False
 
-        if location == last_similar_report.location:
+        if location == last_similar_report['location']:
             # This looks like 100% duplicate
             return True
 
         from simo.automation.helpers import haversine_distance
-        distance = haversine_distance(location, last_similar_report.location)
-        seconds_passed = (
-            log_datetime - last_similar_report.datetime
-        ).total_seconds()
+        distance = haversine_distance(location, last_similar_report['location'])
+        seconds_passed = ts - last_similar_report['ts']
+        if not seconds_passed:
+            return True
         if speed_kmh < 100 and distance / seconds_passed * 3.6 > 300:
             return True
 
@@ -0,0 +1,198 @@
+"""Rolling window of recent mobile device location reports.
+
+Phones in motion report every few seconds. Average speed and duplicate
+report detection only need the last couple of minutes of reports, so
+those are kept in a per device ring buffer in shared cache instead of
+being queried from UserDeviceReportLog on every report.
+
+Report log rows themselves are only history, so they are written in
+batches by a background thread.
+"""
+import atexit
+import datetime
+import logging
+import queue
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULTS = {
+    # How far back reports are kept in a rolling window of a device.
+    'window_seconds': 120,
+    # Report logs are written at least this often (seconds).
+    # 0 writes every log right away.
+    'log_flush_interval': 5,
+    'log_batch_size': 100,
+    # InstanceUser.last_seen is refreshed at least this often even if
+    # nothing else has changed.
+    'last_seen_interval': 60,
+}
+
+
+def get_device_reports_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'SIMO_DEVICE_REPORTS', None) or {})
+    return config
+
+
+# Used instead of cache locks by cache backends that have none (tests)
+_local_lock = threading.Lock()
+
+
+def _get_lock(key):
+    lock = getattr(cache, 'lock', None)
+    if callable(lock):
+        # Expires by itself if holder dies
+        return lock(key, timeout=5)
+    return _local_lock
+
+
+class ReportWindow:
+    """
+    Recent accepted reports of a single device on a single instance,
+    oldest first. Every point is a dict of: ts, location, speed_kmh,
+    app_open, relay, phone_on_charge and at_home.
+    """
+
+    def __init__(self, user_device_id, instance_id):
+        self.key = f'device-report-window-{user_device_id}-{instance_id}'
+        data = cache.get(self.key) or {}
+        self.points = data.get('points', [])
+        # users already known to be linked to this device
+        self.users = set(data.get('users', []))
+        self.added = []
+
+    def save(self):
+        """
+        Merge points added since window was loaded into the one in cache,
+        so that concurrent reports of the same device do not overwrite
+        each other.
+        """
+        config = get_device_reports_config()
+        # A point older than the window is never needed again
+        since = time.time() - config['window_seconds']
+        with _get_lock(f'{self.key}-lock'):
+            data = cache.get(self.key) or {}
+            points = data.get('points', []) + self.added
+            self.points = sorted(
+                (p for p in points if p['ts'] > since),
+                key=lambda p: p['ts']
+            )
+            self.users.update(data.get('users', []))
+            cache.set(self.key, {
+                'points': self.points, 'users': list(self.users)
+            }, config['window_seconds'] * 10)
+        self.added = []
+
+    def add(self, point):
+        self.points.append(point)
+        self.added.append(point)
+
+    def get_avg_speed(self, ts, speed_kmh):
+        """
+        Average speed of device while it is away, including current report.
+        Is 0 until there are enough recent points to tell.
+        """
+        window_seconds = get_device_reports_config()['window_seconds']
+        speeds = [
+            p['speed_kmh'] for p in self.points
+            if ts - window_seconds < p['ts'] < ts - 3
+            and not p['at_home'] and p['location']
+        ]
+        if len(speeds) <= 2:
+            return 0
+        return round((sum(speeds) + speed_kmh) / (len(speeds) + 1))
+
+    def get_last_similar(
+        self, ts, location, app_open, relay, phone_on_charge, at_home
+    ):
+        """
+        Oldest similar point of the last 20 seconds.
+        """
+        for point in self.points:
+            if point['ts'] <= ts - 20:
+                continue
+            if (point['app_open'], point['relay'], point['phone_on_charge'],
+                point['at_home']) != (app_open, relay, phone_on_charge, at_home):
+                continue
+            if location and not point['location']:
+                continue
+            return point
+
+
+class ReportLogWriter:
+    """Batches UserDeviceReportLog inserts of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def add(self, **log):
+        from .models import UserDeviceReportLog
+        config = get_device_reports_config()
+        entry = UserDeviceReportLog(**log)
+        if not config['log_flush_interval']:
+            entry.save()
+            return
+        self._queue.put(entry)
+        self._ensure_thread()
+        if self._queue.qsize() >= config['log_batch_size']:
+            self._wakeup.set()
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='device-report-logs', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(get_device_reports_config()['log_flush_interval'])
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to write device report logs")
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        from .models import UserDeviceReportLog
+        entries = []
+        while True:
+            try:
+                entries.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if entries:
+            UserDeviceReportLog.objects.bulk_create(entries)
+        return len(entries)
+
+
+report_log_writer = ReportLogWriter()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        report_log_writer.flush()
+    except Exception:
+        pass
+
+
+def is_last_seen_stale(last_seen, now):
+    return not last_seen or now - last_seen > datetime.timedelta(
+        seconds=get_device_reports_config()['last_seen_interval']
+    )
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.10 on 2026-10-19 11:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0047_lowercase_user_emails'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userdevicereportlog',
+            name='datetime',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -33,7 +33,51 @@ from .utils import get_current_user, rebuild_authorized_keys
 from .managers import ActiveInstanceManager
 
 
- 
+def _roles_cache_version_key(instance_id):
+    return f'instance-{instance_id}-roles-cache-version'
+
+
+def _seed_roles_cache_version(instance_id):
+    key = _roles_cache_version_key(instance_id)
+    # Starting from current time never reuses a version of a lost key
+    cache.add(key, int(time.time() * 1000), None)
+    return cache.get(key)
+
+
+def get_role_cache_key(user_id, instance_id):
+    """
+    Cached role is stored together with roles cache version of its
+    instance, so all of them are dropped at once by
+    bump_roles_cache_version().
+    """
+    return f'user-{user_id}_instance-{instance_id}_role'
+
+
+def get_cached_role(user_id, instance_id):
+    """
+    Fetches cached role together with current roles cache version
+    in a single cache round trip.
+    :return: (role or None if it is not cached or stale, version)
+    """
+    cache_key = get_role_cache_key(user_id, instance_id)
+    version_key = _roles_cache_version_key(instance_id)
+    cached = cache.get_many([cache_key, version_key])
+    version = cached.get(version_key)
+    if version is None:
+        return None, _seed_roles_cache_version(instance_id)
+    entry = cached.get(cache_key)
+    if not entry or entry[0] != version:
+        return None, version
+    return entry[1], version
+
+
+def bump_roles_cache_version(instance_id):
+    try:
+        cache.incr(_roles_cache_version_key(instance_id))
+    except ValueError:
+        # Version is lost (or nothing is cached yet), a new one is
+        # different from whatever roles might still be cached with.
+        _seed_roles_cache_version(instance_id)
 
 
 class PermissionsRole(models.Model):
@@ -146,14 +190,36 @@ class InstanceUser(DirtyFieldsMixin, models.Model, OnChangeMixin):
         return self.instance
 
     def can_read(self, component):
-        if self.user.is_master:
-            return True
-        if self.role.is_superuser:
-            return True
-        return bool(
-            self.role.component_permissions.filter(component=component).filter(
+        return bool(self.get_readable_components([self], [component])[self])
+
+    @staticmethod
+    def get_readable_components(instance_users, components):
+        """
+        can_read() of many instance users and components at once,
+        using a single query at most.
+        :return: {instance user: [components it can read]}
+        """
+        readable = {}
+        limited = []
+        for iuser in instance_users:
+            if iuser.user.is_master or iuser.role.is_superuser:
+                readable[iuser] = list(components)
+            else:
+                limited.append(iuser)
+        if not limited:
+            return readable
+        permitted = set(ComponentPermission.objects.filter(
+            role__in={iuser.role_id for iuser in limited},
+            component__in=components,
+        ).filter(
             Q(read=True) | Q(write=True)
-        ).count())
+        ).values_list('role_id', 'component_id'))
+        for iuser in limited:
+            readable[iuser] = [
+                comp for comp in components
+                if (iuser.role_id, comp.id) in permitted
+            ]
+        return readable
 
     def can_write(self, component):
         if self.user.is_master:
@@ -212,7 +278,7 @@ def post_instance_user_save(sender, instance, created, **kwargs):
             # Invalidate cached role lookups
             try:
                 cache.delete(f'user-{instance.user.id}_instance-{instance.instance.id}-role-id')
-                cache.delete(f'user-{instance.user.id}_instance-{instance.instance.id}_role')
+                cache.delete(get_role_cache_key(instance.user.id, instance.instance.id))
             except Exception:
                 pass
         transaction.on_commit(post_update)
@@ -222,7 +288,7 @@ def post_instance_user_save(sender, instance, created, **kwargs):
         cache.delete(f'user-{instance.user.id}_instances')
         cache.delete(f'user-{instance.user.id}_is_active')
         cache.delete(f'user-{instance.user.id}_instance-{instance.instance.id}-role-id')
-        cache.delete(f'user-{instance.user.id}_instance-{instance.instance.id}_role')
+        cache.delete(get_role_cache_key(instance.user.id, instance.instance.id))
     except Exception:
         pass
     # Rebuild ACLs if user became active/inactive due to this role change
@@ -239,7 +305,7 @@ def post_instance_user_delete(sender, instance, **kwargs):
         cache.delete(f'user-{instance.user.id}_instances')
         cache.delete(f'user-{instance.user.id}_is_active')
         cache.delete(f'user-{instance.user.id}_instance-{instance.instance.id}-role-id')
-        cache.delete(f'user-{instance.user.id}_instance-{instance.instance.id}_role')
+        cache.delete(get_role_cache_key(instance.user.id, instance.instance.id))
     except Exception:
         pass
     try:
@@ -357,8 +423,7 @@ class User(AbstractBaseUser, SimoAdminMixin):
     def get_role(self, instance):
         if instance.id in self._instance_roles:
             return self._instance_roles[instance.id]
-        cache_key = f'user-{self.id}_instance-{instance.id}_role'
-        role = cache.get(cache_key)
+        role, version = get_cached_role(self.id, instance.id)
         if role is None:
             role = self.roles.filter(
                 instance=instance
@@ -366,7 +431,10 @@ class User(AbstractBaseUser, SimoAdminMixin):
                 'component_permissions', 'component_permissions__component'
             ).first()
             if role:
-                cache.set(cache_key, role, 60)
+                cache.set(
+                    get_role_cache_key(self.id, instance.id),
+                    (version, role), 60
+                )
         self._instance_roles[instance.id] = role
         return self._instance_roles[instance.id]
 
@@ -564,7 +632,7 @@ class UserDeviceReportLog(models.Model):
     instance = models.ForeignKey(
         'core.Instance', null=True, on_delete=models.CASCADE
     )
-    datetime = models.DateTimeField(auto_now_add=True, db_index=True)
+    datetime = models.DateTimeField(default=timezone.now, db_index=True)
     app_open = models.BooleanField(
         default=False, help_text="Sent while using app or by background process."
     )
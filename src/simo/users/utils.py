@@ -3,7 +3,6 @@ import math
 import traceback
 import subprocess
 import datetime
-import numpy as np
 from contextlib import contextmanager
 from contextvars import ContextVar
 from django.core.cache import cache